@@ -4,25 +4,40 @@ Flask backend que serve a página e executa a pipeline de análise quando um ví
 """
 
 import os
+import json
+import math
 import uuid
 import time
-from flask import Flask, request, jsonify, render_template, send_from_directory
+import shutil
+from urllib.parse import urlparse
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
-from src.detect import SpermDetector
+from src.detect import SpermDetector, MODELS, video_frame_count
 from src.track import SpermTracker
-from src.motility import distance_pixels, velocity_um_s, linearity
-from src.vigor import vigor_index, vigor_class
-from src.concentration import estimate_concentration
-from src.report import generate_report_json, generate_markdown_report, plot_velocity_histogram
+from src.trackers import TRACKER_BACKENDS
+from src.inference import INFERENCE_BACKENDS
+from src.pipeline import analyze_video, analyze_track_table
+from src.shard import track_video_sharded
 from src.visualize import draw_tracks_on_video
-
-import pandas as pd
+from src import encoder
+from src.report import write_reports
+from src.jobs import JobManager, QueueFull, FINISHED_STATES, QUEUED, RUNNING
+from src.cache import ResultCache, file_sha256, weights_fingerprint
+from src.profiling import Profiler, METRICS, peak_rss_bytes
+from src import live
+from src.prewarm import Prewarm
+from src.history import HistoryIndex
 
 UPLOAD_FOLDER = "uploads"
 REPORTS_FOLDER = "reports"
+DEFAULT_WEIGHTS = os.environ.get("SPERMAI_WEIGHTS", "models/yolo/yolov8n.pt")
+# backend de inferência padrão (ver src/inference.py); "onnx" em servidores sem GPU
+DEFAULT_BACKEND = os.environ.get("SPERMAI_BACKEND", "torch")
 ALLOWED_EXT = {"mp4", "mov", "avi", "mkv", "mpg", "mpeg", "jpg", "jpeg", "png"}
+# esquemas aceitos como fonte do modo ao vivo (além do índice de uma câmera)
+LIVE_SCHEMES = ("rtsp", "rtsps", "http", "https")
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(REPORTS_FOLDER, exist_ok=True)
@@ -33,10 +48,81 @@ CORS(app)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["REPORTS_FOLDER"] = REPORTS_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 2 * 1024 * 1024 * 1024  # 2GB
+# análises simultâneas e quantas podem esperar na fila
+app.config["MAX_CONCURRENT_JOBS"] = int(os.environ.get("SPERMAI_MAX_JOBS", 2))
+app.config["MAX_QUEUED_JOBS"] = int(os.environ.get("SPERMAI_MAX_QUEUED_JOBS", 16))
+# análise por shards: processos por análise (padrão: min(shards, núcleos)) e frames sobrepostos
+app.config["SHARD_WORKERS"] = int(os.environ["SPERMAI_SHARD_WORKERS"]) if os.environ.get("SPERMAI_SHARD_WORKERS") else None
+app.config["SHARD_OVERLAP"] = int(os.environ.get("SPERMAI_SHARD_OVERLAP", 50))
+
+# cache de detecção + rastreio por conteúdo do vídeo (ver src/cache.py)
+app.config["CACHE_FOLDER"] = os.environ.get("SPERMAI_CACHE_DIR", "cache")
+app.config["CACHE_MAX_BYTES"] = float(os.environ.get("SPERMAI_CACHE_MAX_GB", 5)) * 1024 ** 3
+
+# análises ao vivo simultâneas (cada uma ocupa o modelo continuamente)
+app.config["MAX_LIVE_SESSIONS"] = int(os.environ.get("SPERMAI_MAX_LIVE", 1))
+
+# aquecimento em segundo plano na subida (bibliotecas pesadas + modelo padrão); "0" desliga
+app.config["PREWARM"] = os.environ.get("SPERMAI_PREWARM", "1") != "0"
+# índice SQLite do histórico de amostras (ver src/history.py)
+app.config["HISTORY_DB"] = os.environ.get("SPERMAI_HISTORY_DB", os.path.join(REPORTS_FOLDER, "history.sqlite"))
+
+jobs = JobManager(max_workers=app.config["MAX_CONCURRENT_JOBS"], max_queued=app.config["MAX_QUEUED_JOBS"])
+LIVE_SESSIONS = live.LiveSessionRegistry(max_running=app.config["MAX_LIVE_SESSIONS"])
+RESULTS = ResultCache(root=app.config["CACHE_FOLDER"], max_bytes=app.config["CACHE_MAX_BYTES"])
+PREWARM = Prewarm(DEFAULT_WEIGHTS, backend=DEFAULT_BACKEND)
+HISTORY = HistoryIndex(app.config["HISTORY_DB"])
+
+def start_prewarm():
+    """Inicia o aquecimento (uma vez por processo) se app.config["PREWARM"]; o servidor não espera por ele."""
+    if not app.config["PREWARM"] or PREWARM.started:
+        return
+    if not os.path.exists(DEFAULT_WEIGHTS):
+        print(f"Aviso: pesos padrão não encontrados ({DEFAULT_WEIGHTS}); só as bibliotecas serão aquecidas.")
+    PREWARM.start()
+
+@app.before_request
+def prewarm_on_first_request():
+    # vale para flask run e servidores WSGI; o processo pai do reloader nunca atende
+    # requisições, então não aquece à toa
+    start_prewarm()
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXT
 
+def allowed_live_source(source):
+    """Índice de câmera ou URL de stream (LIVE_SCHEMES) com host; caminhos e file:// são recusados."""
+    if source.isascii() and source.isdigit():
+        return True
+    try:
+        url = urlparse(source)
+        return url.scheme.lower() in LIVE_SCHEMES and bool(url.hostname)
+    except ValueError:
+        return False
+
+def form_number(name, default=None, cast=float, minimum=None, maximum=None, positive=False):
+    """
+    Campo numérico de request.form; ausente ou vazio -> default.
+    ValueError (respondido com 400) se não é um número finito ou está fora do intervalo.
+    """
+    raw = request.form.get(name, "").strip()
+    if raw == "":
+        return default
+    kind = "um inteiro" if cast is int else "um número"
+    try:
+        value = cast(raw)
+    except ValueError:
+        raise ValueError(f"{name} deve ser {kind} (recebido: {raw!r}).") from None
+    if not math.isfinite(value):
+        raise ValueError(f"{name} deve ser {kind} finito (recebido: {raw!r}).")
+    if positive and value <= 0:
+        raise ValueError(f"{name} deve ser maior que zero (recebido: {raw!r}).")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{name} deve ser no mínimo {minimum} (recebido: {raw!r}).")
+    if maximum is not None and value > maximum:
+        raise ValueError(f"{name} deve ser no máximo {maximum} (recebido: {raw!r}).")
+    return value
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -45,6 +131,37 @@ def index():
 def reports_files(filename):
     return send_from_directory(app.config["REPORTS_FOLDER"], filename)
 
+@app.route("/metrics/models")
+def metrics_models():
+    """Cache de modelos: tempo de carga, aquecimento e acertos por modelo; estado do aquecimento."""
+    return jsonify(dict(MODELS.stats(), prewarm=PREWARM.to_dict()))
+
+@app.route("/metrics")
+def metrics():
+    """Contadores e histogramas das análises + estado dos caches e da fila, no formato do Prometheus."""
+    models = MODELS.stats()
+    cache = RESULTS.stats()
+    counters = {
+        "model_cache_hits_total": models["hits"],
+        "model_cache_misses_total": models["misses"],
+        "model_cache_evictions_total": models["evictions"],
+        "model_cache_load_seconds_total": models["load_seconds_total"],
+        "result_cache_hits_total": cache["hits"],
+        "result_cache_misses_total": cache["misses"],
+    }
+    gauges = {
+        "models_loaded": len(models["models"]),
+        "jobs_running": jobs.count(RUNNING),
+        "jobs_queued": jobs.count(QUEUED),
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+    return Response(METRICS.render(gauges, counters=counters), mimetype="text/plain; version=0.0.4")
+
+@app.route("/metrics/cache")
+def metrics_cache():
+    """Cache de resultados: acertos e falhas."""
+    return jsonify(RESULTS.stats())
+
 @app.route("/upload_example")
 def upload_example():
     # Placeholder route if quiser servir um exemplo
@@ -53,8 +170,18 @@ def upload_example():
 @app.route("/analyze", methods=["POST"])
 def analyze():
     """
-    Recebe: file (vídeo/imagem), microns_per_pixel, fps, drop_volume_ul, conf
-    Retorna: JSON com paths para report, markdown e vídeo processado
+    Recebe: file (vídeo/imagem), microns_per_pixel, fps, drop_volume_ul, conf, batch_size, tracker,
+    backend (torch, onnx, onnx-fp16, onnx-int8),
+    trail_length (pontos por trilha no vídeo), trail_fade (frames para apagar trilhas encerradas),
+    preview_width (largura máxima do vídeo processado, em px; codificação mais barata),
+    shards (divide o vídeo em N trechos processados em processos paralelos),
+    tile_size / tile_overlap (inferência em blocos para vídeos de alta resolução),
+    skip_frames (infere 1 a cada N + 1 frames) ou adaptive=1 (infere conforme o movimento
+    observado, com motion_threshold e max_skip); as trilhas são interpoladas nos frames pulados
+    e VCL, VAP, linearidade, vigor e motilidade progressiva não são calculados (não seriam comparáveis)
+    Retorna (202): job_id e URLs para acompanhar o job; o resultado final
+    (paths para report, markdown e vídeo processado) fica em /jobs/<job_id>; com ffmpeg
+    no servidor, o vídeo pode ser assistido durante a análise em /jobs/<job_id>/video
     """
     if "file" not in request.files:
         return jsonify({"error": "Nenhum arquivo enviado (campo 'file')."}), 400
@@ -65,20 +192,65 @@ def analyze():
     if not allowed_file(f.filename):
         return jsonify({"error": "Extensão não permitida."}), 400
 
-    # parâmetros
-    microns_per_pixel = float(request.form.get("microns_per_pixel", 0.5))
-    fps = float(request.form.get("fps", 25.0))
-    drop_volume_ul = float(request.form.get("drop_volume_ul", 2.0))
-    conf = float(request.form.get("conf", 0.25))
-    weights = request.form.get("weights", "models/yolo/yolov8n.pt")
-    max_frames = request.form.get("max_frames")
-    max_frames = int(max_frames) if max_frames else None
+    # parâmetros (valores inválidos: 400 antes de gravar o upload)
+    try:
+        params = {
+            "weights": request.form.get("weights", DEFAULT_WEIGHTS),
+            "backend": request.form.get("backend") or DEFAULT_BACKEND,
+            "tracker": request.form.get("tracker", "deepsort"),
+            "conf": form_number("conf", 0.25, minimum=0, maximum=1),
+            "microns_per_pixel": form_number("microns_per_pixel", 0.5, positive=True),
+            "fps": form_number("fps", 25.0, positive=True),
+            "drop_volume_ul": form_number("drop_volume_ul", 2.0, positive=True),
+        }
+        # opções de execução (não mudam o resultado, só como ele é calculado/desenhado)
+        options = {
+            "max_frames": form_number("max_frames", cast=int, minimum=1),
+            "batch_size": form_number("batch_size", 1, cast=int, minimum=1),
+            "shards": form_number("shards", 1, cast=int, minimum=1),
+            "tiling": {
+                "tile_size": form_number("tile_size", cast=int, minimum=32),
+                "tile_overlap": form_number("tile_overlap", 64, cast=int, minimum=0),
+            },
+            "sampling": {
+                "skip_frames": form_number("skip_frames", 0, cast=int, minimum=0),
+                "adaptive": request.form.get("adaptive", "").lower() in ("1", "true", "on", "yes"),
+                "motion_threshold": form_number("motion_threshold", 0.25, minimum=0),
+                "max_skip": form_number("max_skip", 8, cast=int, minimum=0),
+            },
+            "overlay": {
+                "max_trail": form_number("trail_length", cast=int, minimum=1),
+                "fade_frames": form_number("trail_fade", 0, cast=int, minimum=0),
+                "preview_width": form_number("preview_width", cast=int, minimum=16),
+            },
+        }
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if params["tracker"] not in TRACKER_BACKENDS:
+        return jsonify({"error": f"Rastreador desconhecido: {params['tracker']}"}), 400
+    if params["backend"] not in INFERENCE_BACKENDS:
+        return jsonify({"error": f"Backend de inferência desconhecido: {params['backend']}"}), 400
 
     uid = str(int(time.time())) + "_" + uuid.uuid4().hex[:6]
     filename = secure_filename(f.filename)
     in_path = os.path.join(app.config["UPLOAD_FOLDER"], f"{uid}_{filename}")
     f.save(in_path)
 
+    try:
+        job = jobs.submit(run_analysis, uid, in_path, params, options)
+    except QueueFull as e:
+        os.remove(in_path)
+        return jsonify({"error": str(e)}), 503
+
+    return jsonify({
+        "status": job.status,
+        "job_id": job.id,
+        "job_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+    }), 202
+
+def run_analysis(job, uid, in_path, params, options):
+    """Executa a pipeline completa dentro de um job; retorna o JSON de resposta."""
     # criar diretório do relatório
     out_base = os.path.join(app.config["REPORTS_FOLDER"], uid)
     os.makedirs(out_base, exist_ok=True)
@@ -86,86 +258,316 @@ def analyze():
     out_md_path = os.path.join(out_base, "report.md")
     out_hist = os.path.join(out_base, "vel_hist.png")
     out_video = os.path.join(out_base, "processed.mp4")
+    base_url = "/reports/" + uid + "/"
 
-    # Run pipeline (bloqueante) - para uso local é aceitável; para produção usar fila/worker
-    try:
-        detector = SpermDetector(weights=weights, conf=conf)
-        detections = detector.detect_video(in_path, max_frames=max_frames)
-        tracker = SpermTracker()
-        tracks = tracker.run(detections)
-
-        # Calcular métricas por track
-        rows = []
-        velocities = []
-        counts_per_frame = {}
-        for tid, traj in tracks.items():
-            traj_sorted = sorted(traj, key=lambda x: x[0])
-            dist_px = distance_pixels(traj_sorted)
-            vel = velocity_um_s(traj_sorted, fps=fps, microns_per_pixel=microns_per_pixel)
-            lin = linearity(traj_sorted)
-            vigor_idx = vigor_index(vel, lin)
-            vclass = vigor_class(vigor_idx)
-            rows.append({
-                "track_id": int(tid),
-                "n_points": len(traj_sorted),
-                "distance_px": dist_px,
-                "velocity_um_s": vel,
-                "linearity": lin,
-                "vigor_index": vigor_idx,
-                "vigor_class": vclass
-            })
-            velocities.append(vel)
-            for fr, cx, cy in traj_sorted:
-                counts_per_frame.setdefault(fr, set()).add(tid)
-
-        counts_list = [len(s) for s in counts_per_frame.values()] if counts_per_frame else []
-        conc = estimate_concentration(counts_list, drop_volume_ul)
-
-        df = pd.DataFrame(rows)
-        summary = {}
-        if not df.empty:
-            summary["motilidade_progressiva_%"] = float((df[(df.velocity_um_s > 25) & (df.linearity > 0.6)].shape[0] / df.shape[0]) * 100)
-            summary["vigor_medio"] = float(df["vigor_index"].mean())
-            summary["n_trajetorias"] = int(df.shape[0])
+    def publish_video():
+        # MP4 fragmentado: o navegador já pode tocar o vídeo enquanto ele é gravado
+        if encoder.streamable():
+            job.publish(processed_video=base_url + os.path.basename(out_video),
+                        video_stream=f"/jobs/{job.id}/video")
+
+    profiler = Profiler()
+    # detecção e rastreio não dependem da calibração: reanálises do mesmo vídeo vêm do cache
+    job.report(stage="hash")
+    with profiler.stage("hash"):
+        content_hash = file_sha256(in_path)
+    key = ResultCache.make_key(content_hash, weights=weights_fingerprint(params["weights"]), backend=params["backend"],
+                               conf=params["conf"], max_frames=options["max_frames"], tracker=params["tracker"],
+                               tiling=options["tiling"], sampling=options["sampling"])
+    calibration = {"fps": params["fps"], "microns_per_pixel": params["microns_per_pixel"],
+                   "drop_volume_ul": params["drop_volume_ul"]}
+    with profiler.stage("cache"):
+        hit = RESULTS.get(key)
+    cache_meta = {"weights": params["weights"], "backend": params["backend"], "conf": params["conf"],
+                  "tracker": params["tracker"], "max_frames": options["max_frames"], "overlay": options["overlay"],
+                  **options["tiling"], **options["sampling"]}
+    if hit is not None:
+        result = analyze_track_table(hit["tracks"], **calibration, profiler=profiler, sampling=options["sampling"])
+        if hit["overlay_path"] and hit["meta"].get("overlay") == options["overlay"]:
+            shutil.copyfile(hit["overlay_path"], out_video)
         else:
-            summary["motilidade_progressiva_%"] = 0.0
-            summary["vigor_medio"] = 0.0
-            summary["n_trajetorias"] = 0
+            job.report(stage="render", frame=0)
+            publish_video()
+            with profiler.stage("overlay"):
+                draw_tracks_on_video(in_path, hit["tracks"], out_video, progress=job.report, **options["overlay"])
+    elif options["shards"] > 1:
+        # shards em processos paralelos; o vídeo processado é desenhado depois, a partir das trilhas
+        # (as etapas dentro dos processos filhos não são detalhadas: contam como "shards")
+        with profiler.stage("shards"):
+            table, detections = track_video_sharded(
+                in_path, options["shards"], overlap=app.config["SHARD_OVERLAP"],
+                workers=app.config["SHARD_WORKERS"], max_frames=options["max_frames"],
+                detector_options={"weights": params["weights"], "backend": params["backend"], "conf": params["conf"],
+                                  "batch_size": options["batch_size"], **options["tiling"],
+                                  **options["sampling"]},
+                tracker_options={"backend": params["tracker"]}, progress=job.report)
+        profiler.count(frames=video_frame_count(in_path, options["max_frames"]) or 0, detections=len(detections))
+        result = analyze_track_table(table, **calibration, profiler=profiler, sampling=options["sampling"])
+        job.report(stage="render", frame=0)
+        publish_video()
+        with profiler.stage("overlay"):
+            draw_tracks_on_video(in_path, table, out_video, progress=job.report, **options["overlay"])
+        with profiler.stage("cache"):
+            RESULTS.put(key, table, detections, overlay_path=out_video, meta=cache_meta)
+    else:
+        job.report(stage="load_model")
+        with profiler.stage("load_model"):
+            detector = SpermDetector(weights=params["weights"], backend=params["backend"], conf=params["conf"],
+                                     batch_size=options["batch_size"], **options["tiling"],
+                                     **options["sampling"])
+        tracker = SpermTracker(backend=params["tracker"])
+        publish_video()
+        # detecção, rastreio, métricas e vídeo processado numa única leitura do vídeo;
+        # detecções e trilhas vão direto para a entrada do cache, sem ficar em memória
+        entry = RESULTS.writer(key, meta=cache_meta)
+        try:
+            result = analyze_video(detector, tracker, in_path, **calibration, max_frames=options["max_frames"],
+                                   progress=job.report, overlay_path=out_video, overlay_options=options["overlay"],
+                                   profiler=profiler, sink=entry)
+        except BaseException:
+            entry.abort()
+            raise
+        with profiler.stage("cache"):
+            entry.commit(overlay_path=out_video)
 
-        params = {
-            "weights": weights,
-            "conf": conf,
-            "microns_per_pixel": microns_per_pixel,
-            "fps": fps,
-            "drop_volume_ul": drop_volume_ul
-        }
+    # gerar outputs
+    job.report(stage="report")
+    plots, timings = write_reports(out_json_path, out_md_path, out_hist, result, params, profiler=profiler,
+                                   history=HISTORY, sample=os.path.basename(in_path)[len(uid) + 1:])
+    METRICS.record(timings)
+    if hit is not None:
+        METRICS.inc("cache_hits_total", help="Análises servidas pelo cache de resultados")
 
-        # gerar outputs
-        generate_report_json(out_json_path, summary, df.to_dict(orient="records"), conc, params)
-        plots = []
-        if velocities:
-            plot_velocity_histogram(velocities, out_hist)
-            plots.append(out_hist)
-
-        # gerar markdown
-        generate_markdown_report(out_md_path, summary, df, conc, params, plots=plots)
-
-        # gerar vídeo processado com trilhas desenhadas
-        draw_tracks_on_video(in_path, tracks, out_video)
-
-        # responder com links relativos
-        base_url = "/reports/" + uid + "/"
-        response = {
-            "status": "done",
-            "report_json": base_url + "report.json",
-            "report_md": base_url + "report.md",
-            "histogram": base_url + os.path.basename(out_hist) if plots else None,
-            "processed_video": base_url + os.path.basename(out_video),
-            "summary": summary
-        }
-        return jsonify(response)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # responder com links relativos
+    return {
+        "status": "done",
+        "report_json": base_url + "report.json",
+        "report_md": base_url + "report.md",
+        "histogram": base_url + os.path.basename(out_hist) if plots else None,
+        "processed_video": base_url + os.path.basename(out_video),
+        "summary": result["summary"],
+        "cached": hit is not None,
+        "timings": timings,
+    }
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado."}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def job_cancel(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado."}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-Sent Events com o estado do job a cada mudança (no máximo ~4 por segundo)."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado."}), 404
+
+    def stream():
+        version = -1
+        while True:
+            version = job.wait_for_change(version, timeout=15)
+            state = job.to_dict()
+            yield f"data: {json.dumps(state)}\n\n"
+            if state["status"] in FINISHED_STATES:
+                break
+            time.sleep(0.25)
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/jobs/<job_id>/video")
+def job_video(job_id):
+    """
+    Vídeo processado enquanto é gravado (MP4 fragmentado, ver src/encoder.py): o arquivo
+    é enviado à medida que cresce, até o fim do job. Terminado o job, o link
+    processed_video do resultado serve o mesmo arquivo com suporte a seek.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado."}), 404
+    url = job.outputs.get("processed_video")
+    if url is None:
+        return jsonify({"error": "O vídeo deste job não está disponível durante a análise."}), 404
+    path = os.path.join(app.config["REPORTS_FOLDER"], url[len("/reports/"):])
+
+    def stream():
+        while not os.path.exists(path):
+            if job.status in FINISHED_STATES:
+                return
+            time.sleep(0.25)
+        with open(path, "rb") as f:
+            while True:
+                finished = job.status in FINISHED_STATES
+                chunk = f.read(256 * 1024)
+                if chunk:
+                    yield chunk
+                elif finished:
+                    break
+                else:
+                    time.sleep(0.25)
+
+    return Response(stream_with_context(stream()), mimetype="video/mp4",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _history_filters():
+    """Filtros comuns de /history e /history/trend (query string)."""
+    args = request.args
+
+    def number(name, cast=float):
+        value = args.get(name)
+        return cast(value) if value not in (None, "") else None
+
+    return {
+        "since": args.get("since"),
+        "until": args.get("until"),
+        "sample": args.get("sample"),
+        "tracker": args.get("tracker"),
+        "backend": args.get("backend"),
+        "min_motility": number("min_motility"),
+        "max_motility": number("max_motility"),
+        "min_tracks": number("min_tracks", int),
+    }
+
+def _report_url(report_path):
+    rel = os.path.relpath(report_path, os.path.abspath(app.config["REPORTS_FOLDER"]))
+    return None if rel.startswith("..") else "/reports/" + rel.replace(os.sep, "/")
+
+@app.route("/history")
+def history():
+    """
+    Amostras analisadas, do índice do histórico. Filtros: since / until (AAAA-MM-DD ou epoch),
+    sample (trecho do nome), tracker, backend, min_motility / max_motility, min_tracks.
+    Ordenação: sort (created_at, sample, progressive_motility, ...) e order (asc/desc).
+    Paginação: limit (até 500) e offset. Retorna total e items.
+    """
+    try:
+        page = HISTORY.query(sort=request.args.get("sort", "created_at"), order=request.args.get("order", "desc"),
+                             limit=int(request.args.get("limit", 50)), offset=int(request.args.get("offset", 0)),
+                             **_history_filters())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    for item in page["items"]:
+        item["report_json"] = _report_url(item.pop("report_path"))
+    return jsonify(page)
+
+@app.route("/history/trend")
+def history_trend():
+    """Médias por bucket (day, week, month) das amostras que passam nos filtros de /history."""
+    try:
+        return jsonify(HISTORY.trend(request.args.get("bucket", "day"), **_history_filters()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/live", methods=["POST"])
+def live_start():
+    """
+    Inicia uma análise ao vivo. Recebe: source (índice da câmera ou URL RTSP/HTTP) ou
+    file (vídeo reproduzido no fps nativo, para testes), microns_per_pixel, drop_volume_ul,
+    fps (opcional; padrão o da fonte), conf, backend, tracker, latency_budget_ms, window_s.
+    Retorna (202): id e URLs; as métricas móveis chegam por /live/<id>/events.
+    """
+    # checagem prévia, antes de gravar o upload; LIVE_SESSIONS.start confere de novo sob o lock
+    if LIVE_SESSIONS.full():
+        return jsonify({"error": "Já há uma análise ao vivo em andamento; pare-a antes de iniciar outra."}), 503
+
+    uid = str(int(time.time())) + "_" + uuid.uuid4().hex[:6]
+    source = request.form.get("source", "").strip()
+    realtime = False
+    f = request.files.get("file")
+    if f is not None and f.filename:
+        if not allowed_file(f.filename):
+            return jsonify({"error": "Extensão não permitida."}), 400
+        source = os.path.join(app.config["UPLOAD_FOLDER"], f"{uid}_{secure_filename(f.filename)}")
+        f.save(source)
+        realtime = True
+    elif not source:
+        return jsonify({"error": "Informe source (câmera/URL) ou envie um arquivo (campo 'file')."}), 400
+    elif not allowed_live_source(source):
+        # caminhos do servidor não são aceitos: arquivos chegam por upload
+        return jsonify({"error": f"source deve ser o índice de uma câmera ou uma URL "
+                                 f"({', '.join(LIVE_SCHEMES)})."}), 400
+
+    backend = request.form.get("backend") or DEFAULT_BACKEND
+    tracker_name = request.form.get("tracker", "centroid")
+    if backend not in INFERENCE_BACKENDS:
+        return jsonify({"error": f"Backend de inferência desconhecido: {backend}"}), 400
+    if tracker_name not in TRACKER_BACKENDS:
+        return jsonify({"error": f"Rastreador desconhecido: {tracker_name}"}), 400
+    try:
+        detector = SpermDetector(weights=request.form.get("weights", DEFAULT_WEIGHTS), backend=backend,
+                                 conf=form_number("conf", 0.25, minimum=0, maximum=1))
+        session = live.LiveSession(
+            detector, SpermTracker(backend=tracker_name), source,
+            microns_per_pixel=form_number("microns_per_pixel", 0.5, positive=True),
+            drop_volume_ul=form_number("drop_volume_ul", 2.0, positive=True),
+            fps=form_number("fps", positive=True), realtime=realtime,
+            latency_budget_ms=form_number("latency_budget_ms", 200, positive=True),
+            window_s=form_number("window_s", 10, positive=True), session_id=uid)
+    except ValueError as e:
+        if realtime:
+            os.remove(source)
+        return jsonify({"error": str(e)}), 400
+    try:
+        LIVE_SESSIONS.start(session)
+    except live.SessionLimit as e:
+        # outra requisição iniciou uma sessão depois da checagem prévia
+        if realtime:
+            os.remove(source)
+        return jsonify({"error": str(e)}), 503
+    return jsonify({
+        "id": uid,
+        "status_url": f"/live/{uid}",
+        "events_url": f"/live/{uid}/events",
+        "stop_url": f"/live/{uid}/stop",
+    }), 202
+
+@app.route("/live/<session_id>")
+def live_status(session_id):
+    session = LIVE_SESSIONS.get(session_id)
+    if session is None:
+        return jsonify({"error": "Sessão ao vivo não encontrada."}), 404
+    return jsonify(session.to_dict())
+
+@app.route("/live/<session_id>/stop", methods=["POST"])
+def live_stop(session_id):
+    session = LIVE_SESSIONS.get(session_id)
+    if session is None:
+        return jsonify({"error": "Sessão ao vivo não encontrada."}), 404
+    session.stop()
+    session.join(timeout=5)
+    return jsonify(session.to_dict())
+
+@app.route("/live/<session_id>/events")
+def live_events(session_id):
+    """Server-Sent Events com as métricas móveis, a cada publicação da sessão."""
+    session = LIVE_SESSIONS.get(session_id)
+    if session is None:
+        return jsonify({"error": "Sessão ao vivo não encontrada."}), 404
+
+    def stream():
+        version = -1
+        while True:
+            version = session.wait_for_change(version, timeout=15)
+            state = session.to_dict()
+            yield f"data: {json.dumps(state)}\n\n"
+            if state["status"] in live.FINISHED_STATES:
+                break
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 if __name__ == "__main__":
+    # aquece já na subida, sem esperar a primeira requisição; com o reloader do debug,
+    # só no processo filho (o que atende), para não aquecer duas vezes (ver /metrics/models -> prewarm)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_prewarm()
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
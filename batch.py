@@ -0,0 +1,251 @@
+"""
+batch.py
+Análise em lote de um diretório de vídeos ou de um manifesto CSV, num único processo:
+o modelo é carregado uma vez (cache MODELS) e compartilhado por N workers (threads);
+a inferência é serializada pelo lock do modelo, enquanto decodificação, rastreio,
+métricas e relatórios de amostras diferentes rodam em paralelo.
+
+Saída em --output:
+- <amostra>/report.json, report.md, vel_hist.png e artifacts/ (ver src/artifacts.py)
+- summary.csv: uma linha por amostra (parâmetros, resumo, concentração, tempos, status)
+- progress.jsonl: registro de cada amostra concluída; numa nova execução com o
+  mesmo --output, as amostras já concluídas são puladas (retomada após interrupção)
+- com --history, cada relatório também é registrado no índice SQLite do histórico
+
+Uso:
+python batch.py --input data/raw_videos --output reports/lote_2024_05_10 --workers 4
+python batch.py --manifest coleta.csv --output reports/coleta --tracker centroid
+O manifesto tem as colunas file, microns_per_pixel, fps, drop_volume_ul; colunas
+vazias usam os valores da linha de comando e caminhos relativos partem do diretório do CSV.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.detect import SpermDetector, MODELS
+from src.track import SpermTracker
+from src.trackers import TRACKER_BACKENDS
+from src.inference import INFERENCE_BACKENDS
+from src.pipeline import analyze_video
+from src.artifacts import ArtifactWriter
+from src.profiling import Profiler
+from src.report import write_reports
+from src.history import HistoryIndex
+
+VIDEO_EXT = {"mp4", "mov", "avi", "mkv", "mpg", "mpeg"}
+CALIBRATION = ("microns_per_pixel", "fps", "drop_volume_ul")
+SUMMARY_COLUMNS = ["sample", "file", "status", "microns_per_pixel", "fps", "drop_volume_ul",
+                   "motilidade_progressiva_%", "vigor_medio", "n_trajetorias", "concentration_sptz_ml",
+                   "n_detections", "wall_s", "frames_per_s", "error"]
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Análise em lote de vídeos")
+    source = p.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Diretório com os vídeos")
+    source.add_argument("--manifest", help="CSV com file, microns_per_pixel, fps, drop_volume_ul")
+    p.add_argument("--output", required=True, help="Diretório de saída do lote")
+    p.add_argument("--weights", default="models/yolo/yolov8n.pt", help="Pesos YOLOv8")
+    p.add_argument("--conf", type=float, default=0.25)
+    p.add_argument("--microns_per_pixel", type=float, default=0.5)
+    p.add_argument("--fps", type=float, default=25.0)
+    p.add_argument("--drop_volume_ul", type=float, default=2.0, help="Volume da gota correspondente ao campo em µL")
+    p.add_argument("--max_frames", type=int, default=None)
+    p.add_argument("--tracker", default="deepsort", choices=sorted(TRACKER_BACKENDS))
+    p.add_argument("--backend", default="torch", choices=sorted(INFERENCE_BACKENDS), help="Backend de inferência")
+    p.add_argument("--batch_size", type=int, default=1, help="Frames por inferência do YOLO")
+    p.add_argument("--tile_size", type=int, default=None, help="Infere em blocos de N px (alta resolução)")
+    p.add_argument("--tile_overlap", type=int, default=64, help="Sobreposição entre blocos (px)")
+    p.add_argument("--roi_mask", default=None, help="Imagem com a região de interesse, comum a todas as amostras")
+    p.add_argument("--skip_frames", type=int, default=0, help="Infere 1 a cada N + 1 frames (trilhas interpoladas; sem VCL/linearidade)")
+    p.add_argument("--adaptive", action="store_true", help="Infere só quando há movimento entre frames")
+    p.add_argument("--motion_threshold", type=float, default=0.25, help="Fração da área das células alterada (--adaptive)")
+    p.add_argument("--max_skip", type=int, default=8, help="Máximo de frames seguidos sem inferência (--adaptive)")
+    p.add_argument("--workers", type=int, default=2, help="Amostras processadas ao mesmo tempo")
+    p.add_argument("--no_artifacts", action="store_true", help="Não grava detecções/trilhas brutas")
+    p.add_argument("--history", default=None, help="Índice SQLite do histórico (ex.: reports/history.sqlite)")
+    p.add_argument("--retry_failed", action="store_true", help="Reprocessa amostras que falharam antes")
+    return p.parse_args(argv)
+
+
+def list_samples(args):
+    """Retorna [{"sample", "file", microns_per_pixel, fps, drop_volume_ul}, ...] na ordem de entrada."""
+    defaults = {k: getattr(args, k) for k in CALIBRATION}
+    rows = []
+    if args.input:
+        for name in sorted(os.listdir(args.input)):
+            if "." in name and name.rsplit(".", 1)[1].lower() in VIDEO_EXT:
+                rows.append(dict(defaults, file=os.path.join(args.input, name)))
+    else:
+        base = os.path.dirname(os.path.abspath(args.manifest))
+        with open(args.manifest, newline="", encoding="utf-8-sig") as f:
+            for i, row in enumerate(csv.DictReader(f), start=2):
+                path = (row.get("file") or "").strip()
+                if not path:
+                    raise ValueError(f"{args.manifest}, linha {i}: coluna 'file' vazia.")
+                sample = dict(defaults, file=path if os.path.isabs(path) else os.path.join(base, path))
+                for k in CALIBRATION:
+                    value = (row.get(k) or "").strip()
+                    if value:
+                        sample[k] = float(value)
+                rows.append(sample)
+
+    # nome da amostra = nome do arquivo sem extensão, desambiguado se repetido
+    seen = {}
+    for row in rows:
+        stem = os.path.splitext(os.path.basename(row["file"]))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        row["sample"] = stem if seen[stem] == 1 else f"{stem}_{seen[stem]}"
+    return rows
+
+
+class Progress:
+    """progress.jsonl: uma linha JSON por amostra concluída (ou com erro), escrita ao final dela."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, "rb+") as f:
+                data = f.read()
+                # última linha truncada por uma interrupção: descartada, senão o próximo registro cola nela
+                end = data.rfind(b"\n") + 1
+                if end < len(data):
+                    f.truncate(end)
+            for line in data[:end].decode("utf-8").splitlines():
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                self.records[rec["sample"]] = rec
+
+    def done(self, sample, retry_failed=False):
+        rec = self.records.get(sample)
+        return rec is not None and (rec["status"] == "done" or not retry_failed)
+
+    def add(self, rec):
+        with self._lock:
+            self.records[rec["sample"]] = rec
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def run_sample(sample, args, history=None):
+    """Analisa uma amostra e grava os relatórios em <output>/<amostra>/; retorna a linha do resumo."""
+    if not os.path.isfile(sample["file"]):
+        raise FileNotFoundError(f"Vídeo não encontrado: {sample['file']}")
+    out_dir = os.path.join(args.output, sample["sample"])
+    os.makedirs(out_dir, exist_ok=True)
+    profiler = Profiler()
+    calibration = {k: sample[k] for k in CALIBRATION}
+    sampling = dict(skip_frames=args.skip_frames, adaptive=args.adaptive,
+                    motion_threshold=args.motion_threshold, max_skip=args.max_skip)
+    detector = SpermDetector(weights=args.weights, conf=args.conf, batch_size=args.batch_size, backend=args.backend,
+                             tile_size=args.tile_size, tile_overlap=args.tile_overlap, roi_mask=args.roi_mask,
+                             **sampling)
+    tracker = SpermTracker(backend=args.tracker)
+    params = dict(weights=args.weights, backend=args.backend, tracker=args.tracker, conf=args.conf, **calibration)
+    # trilhas e detecções vão direto para os artefatos, lote a lote, sem ficar na memória
+    writer = None if args.no_artifacts else ArtifactWriter(os.path.join(out_dir, "artifacts"))
+    try:
+        result = analyze_video(detector, tracker, sample["file"], **calibration, max_frames=args.max_frames,
+                               profiler=profiler, sink=writer)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        with profiler.stage("artifacts"):
+            writer.close(dict(params, input=sample["file"], max_frames=args.max_frames, tile_size=args.tile_size,
+                              tile_overlap=args.tile_overlap, roi_mask=args.roi_mask, **sampling))
+    _, timings = write_reports(os.path.join(out_dir, "report.json"), os.path.join(out_dir, "report.md"),
+                               os.path.join(out_dir, "vel_hist.png"), result, params, profiler=profiler,
+                               history=history, sample=sample["sample"])
+    summary = result["summary"]
+    return {
+        "motilidade_progressiva_%": summary["motilidade_progressiva_%"],
+        "vigor_medio": summary["vigor_medio"],
+        "n_trajetorias": summary["n_trajetorias"],
+        "concentration_sptz_ml": result["concentration"],
+        "n_detections": result["n_detections"],
+        "wall_s": timings["wall_s"],
+        "frames_per_s": timings["fps"],
+    }
+
+
+def write_summary(path, samples, progress):
+    """summary.csv na ordem de entrada, com as amostras que já têm registro."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for sample in samples:
+            rec = progress.records.get(sample["sample"])
+            if rec is not None:
+                writer.writerow(rec)
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    samples = list_samples(args)
+    os.makedirs(args.output, exist_ok=True)
+    progress = Progress(os.path.join(args.output, "progress.jsonl"))
+    summary_path = os.path.join(args.output, "summary.csv")
+
+    pending = [s for s in samples if not progress.done(s["sample"], args.retry_failed)]
+    print(f"{len(samples)} amostras, {len(samples) - len(pending)} já concluídas, {len(pending)} a processar.")
+    if not pending:
+        write_summary(summary_path, samples, progress)
+        print(f"Resumo: {summary_path}")
+        return 0
+
+    # carrega (e aquece) o modelo uma única vez; os workers o encontram no cache MODELS
+    entry = MODELS.warmup(args.weights, backend=args.backend)
+    print(f"Modelo carregado em {entry.load_seconds:.2f}s")
+    history = HistoryIndex(args.history) if args.history else None
+
+    def work(sample):
+        t0 = time.perf_counter()
+        rec = {"sample": sample["sample"], "file": sample["file"], **{k: sample[k] for k in CALIBRATION}}
+        try:
+            rec.update(run_sample(sample, args, history=history), status="done")
+        except Exception as e:
+            rec.update(status="error", error=str(e), wall_s=round(time.perf_counter() - t0, 3))
+        progress.add(rec)
+        return rec
+
+    failed = 0
+    pool = ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="sample")
+    try:
+        futures = [pool.submit(work, s) for s in pending]
+        for i, fut in enumerate(as_completed(futures), start=1):
+            rec = fut.result()
+            if rec["status"] == "done":
+                print(f"[{i}/{len(pending)}] {rec['sample']}: ok ({rec['wall_s']:.1f}s)")
+            else:
+                failed += 1
+                print(f"[{i}/{len(pending)}] {rec['sample']}: erro: {rec['error']}")
+    except KeyboardInterrupt:
+        print("Interrompido; aguardando as amostras em andamento (as demais ficam para a próxima execução)...")
+        pool.shutdown(wait=True, cancel_futures=True)
+        write_summary(summary_path, samples, progress)
+        return 130
+    finally:
+        pool.shutdown(wait=True)
+    write_summary(summary_path, samples, progress)
+    print(f"Resumo: {summary_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+evaluate.py
+Acurácia do rastreamento contra a ground truth dos vídeos sintéticos.
+Em cada frame, os pontos das trilhas são associados às células da ground truth
+(mais próximas, até max_distance px). A partir dessa associação:
+- id_switches: quantas vezes a trilha que acompanha uma célula muda de id
+- fragments: nº médio de trilhas distintas por célula
+- coverage: fração de (célula, frame) com alguma trilha associada
+- length_error: erro relativo médio do nº de frames da trilha principal de cada
+  célula (a que a acompanha por mais frames) em relação à duração do vídeo
+- path_length_error: idem para o comprimento percorrido em px
+"""
+
+import numpy as np
+
+from src.trackers import candidate_pairs, greedy_match
+
+
+def match_to_truth(tracks, truth, max_distance=3.0):
+    """Retorna arrays (frame, índice da célula, track_id, índice do ponto em tracks) associados."""
+    table = tracks.by_frame()
+    n_frames = len(truth.positions)
+    bounds = np.searchsorted(table.frame, np.arange(n_frames + 1))
+    frames, cells, tids, rows = [], [], [], []
+    for f in range(n_frames):
+        lo, hi = bounds[f], bounds[f + 1]
+        if lo == hi:
+            continue
+        pts = np.column_stack([table.cx[lo:hi], table.cy[lo:hi]])
+        ci, pi, dist = candidate_pairs(truth.positions[f], pts, max_distance)
+        if len(ci) == 0:
+            continue
+        ci, pi = greedy_match(ci, pi, dist)
+        frames.append(np.full(len(ci), f))
+        cells.append(ci)
+        tids.append(table.track_id[lo:hi][pi])
+        rows.append(lo + pi)
+    if not frames:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    return tuple(np.concatenate(a) for a in (frames, cells, tids, rows))
+
+
+def tracking_accuracy(tracks, truth, max_distance=3.0):
+    n_frames, n_cells = truth.positions.shape[:2]
+    frames, cells, tids, rows = match_to_truth(tracks, truth, max_distance)
+    if len(frames) == 0:
+        return {"id_switches": 0, "fragments": 0.0, "coverage": 0.0,
+                "length_error": 1.0, "path_length_error": 1.0, "n_tracks": 0}
+
+    order = np.lexsort((frames, cells))
+    cells, tids = cells[order], tids[order]
+    same_cell = cells[1:] == cells[:-1]
+    id_switches = int(np.count_nonzero(same_cell & (tids[1:] != tids[:-1])))
+
+    # trilha principal de cada célula: o par (célula, trilha) com mais frames associados
+    pairs, counts = np.unique(np.column_stack([cells, tids]), axis=0, return_counts=True)
+    fragments = np.bincount(pairs[:, 0], minlength=n_cells)
+    best = np.lexsort((-counts, pairs[:, 0]))
+    first = np.r_[True, pairs[best][1:, 0] != pairs[best][:-1, 0]]
+    main = pairs[best][first]
+
+    # duração e comprimento da trilha principal inteira (não só os frames associados)
+    table = tracks.sorted()
+    tids_all, points, offsets = table.groups()
+    idx = np.searchsorted(tids_all, main[:, 1])
+    track_len = (offsets[idx + 1] - offsets[idx]).astype(np.float64)
+    steps = np.diff(points[:, 1:], axis=0)
+    step_len = np.r_[0.0, np.hypot(steps[:, 0], steps[:, 1])]
+    step_len[offsets[:-1]] = 0.0  # o primeiro ponto de cada trilha não tem segmento
+    path = np.add.reduceat(step_len, offsets[:-1])[idx] if len(step_len) else np.zeros(len(idx))
+
+    length_error = np.ones(n_cells)
+    length_error[main[:, 0]] = np.abs(track_len - n_frames) / n_frames
+    true_path = truth.path_lengths()
+    path_error = np.ones(n_cells)
+    path_error[main[:, 0]] = np.abs(path - true_path[main[:, 0]]) / np.maximum(true_path[main[:, 0]], 1e-9)
+
+    return {
+        "id_switches": id_switches,
+        "fragments": round(float(fragments.mean()), 3),
+        "coverage": round(len(frames) / float(n_frames * n_cells), 4),
+        "length_error": round(float(length_error.mean()), 4),
+        "path_length_error": round(float(path_error.mean()), 4),
+        "n_tracks": int(len(tids_all)),
+    }
@@ -0,0 +1,131 @@
+"""
+import_time.py
+Benchmark do tempo de subida: importa cada ponto de entrada (app, main, batch, ...)
+num interpretador novo e mede o tempo de import (python -X importtime) e o tempo
+total do processo, além de quais bibliotecas pesadas foram carregadas.
+
+Uso (a partir da raiz do repositório):
+python -m benchmarks.import_time --output imports.json
+python -m benchmarks.import_time --baseline imports.json     # compara com um resultado salvo
+
+Sai com código 1 se algum módulo carregar uma biblioteca pesada na subida (elas
+devem ser importadas no primeiro uso, ver src/prewarm.py) ou, com --baseline, se
+o import ficou mais lento que a tolerância.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+FORMAT_VERSION = 1
+# módulos de entrada medidos por padrão
+TARGETS = ("app", "main", "batch", "src.pipeline", "src.detect", "src.live")
+# bibliotecas que não podem ser carregadas na subida
+HEAVY = ("ultralytics", "torch", "onnxruntime", "onnx", "deep_sort_realtime", "pandas", "matplotlib", "scipy")
+# diferenças abaixo disso (ms) são ruído de medição, mesmo que a razão seja grande
+MIN_DELTA_MS = 30.0
+
+# -X importtime só registra imports feitos pela instrução import (não por importlib)
+_PROBE = ("import {target}; import json, sys; "
+          "print(json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)))")
+
+
+def measure(target, repeat=3, cwd=None):
+    """Importa `target` `repeat` vezes (processos novos) e fica com a execução mais rápida."""
+    best = None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE.format(target=target, heavy=HEAVY)],
+                              capture_output=True, text=True, cwd=cwd)
+        process_ms = (time.perf_counter() - t0) * 1000
+        if proc.returncode != 0:
+            raise RuntimeError(f"Falha ao importar {target}:\n{proc.stderr[-2000:]}")
+        import_ms = None
+        for line in proc.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            parts = line.split("|")
+            if line.startswith("import time:") and len(parts) == 3 and parts[2].strip() == target:
+                import_ms = int(parts[1]) / 1000.0
+        run = {
+            "import_ms": round(import_ms, 1) if import_ms is not None else None,
+            "process_ms": round(process_ms, 1),
+            "heavy_loaded": json.loads(proc.stdout.strip().splitlines()[-1]),
+        }
+        if best is None or run["process_ms"] < best["process_ms"]:
+            best = run
+    return best
+
+
+def compare(current, baseline, tolerance=0.2):
+    """Retorna {"targets": {nome: {...}}, "regressions": [texto, ...]}."""
+    out, regressions = {}, []
+    for name, cur in current["targets"].items():
+        base = baseline.get("targets", {}).get(name)
+        if base is None or not cur["import_ms"] or not base["import_ms"]:
+            continue
+        ratio = cur["import_ms"] / base["import_ms"]
+        out[name] = {"import_ms": cur["import_ms"], "baseline_import_ms": base["import_ms"], "ratio": round(ratio, 3)}
+        if ratio > 1 + tolerance and cur["import_ms"] - base["import_ms"] > MIN_DELTA_MS:
+            regressions.append(f"{name}: import {ratio:.2f}x mais lento "
+                               f"({base['import_ms']:.0f}ms -> {cur['import_ms']:.0f}ms)")
+    return {"tolerance": tolerance, "targets": out, "regressions": regressions}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Tempo de import dos pontos de entrada")
+    p.add_argument("--targets", nargs="+", default=list(TARGETS), help="Módulos a importar")
+    p.add_argument("--repeat", type=int, default=3, help="Repetições por módulo (fica a mais rápida)")
+    p.add_argument("--output", default=None, help="Arquivo JSON com os resultados")
+    p.add_argument("--baseline", default=None, help="JSON de uma execução anterior para comparar")
+    p.add_argument("--tolerance", type=float, default=0.2, help="Piora relativa tolerada por módulo")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # os módulos do repositório são importados a partir da raiz
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {
+        "version": FORMAT_VERSION,
+        "created_at": time.time(),
+        "env": {"python": platform.python_version(), "platform": platform.platform()},
+        "targets": {},
+    }
+    status = 0
+    for target in args.targets:
+        r = measure(target, repeat=args.repeat, cwd=root)
+        results["targets"][target] = r
+        print(f"{target}: import {r['import_ms']}ms, processo {r['process_ms']}ms"
+              + (f", carregou {', '.join(r['heavy_loaded'])}" if r["heavy_loaded"] else ""))
+        if r["heavy_loaded"]:
+            status = 1
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        results["comparison"] = compare(results, baseline, tolerance=args.tolerance)
+        regressions = results["comparison"]["regressions"]
+        if regressions:
+            print("Regressões em relação ao baseline:")
+            for line in regressions:
+                print("  " + line)
+            status = 1
+        else:
+            print("Sem regressões em relação ao baseline.")
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Resultados: {args.output}")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
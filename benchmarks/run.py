@@ -0,0 +1,218 @@
+"""
+run.py
+Benchmark reproduzível da pipeline (decode -> rastreio -> métricas -> vídeo -> relatório)
+sobre vídeos sintéticos com ground truth. O detector é o SpermDetector real com o
+backend de inferência simulado de stub_detector.py (sem pesos do YOLO).
+
+Uso (a partir da raiz do repositório):
+python -m benchmarks.run --cells 50 200 --speed 2 5 --resolution 640x480 --frames 300 --output bench.json
+python -m benchmarks.run ... --baseline bench.json      # compara com um resultado salvo
+
+Para cada cenário (produto cartesiano dos parâmetros) o JSON traz os tempos por
+etapa (Profiler), a vazão em frames/s por etapa e a acurácia do rastreamento
+(ver evaluate.py). As bibliotecas importadas só no primeiro uso (pandas,
+matplotlib) são carregadas antes de medir (warm_imports), para não pesarem no
+primeiro cenário. No modo de comparação, etapas que ficaram mais lentas que a
+tolerância ou piora na acurácia são listadas em "regressions" e o processo sai
+com código 1.
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.evaluate import tracking_accuracy
+from benchmarks.stub_detector import BACKEND as STUB_BACKEND, write_stub_weights
+from benchmarks.synthetic import Scenario, render_video, simulate
+from src.detect import SpermDetector
+from src.pipeline import analyze_video
+from src.prewarm import HEAVY_MODULES
+from src.profiling import Profiler
+from src.report import write_reports
+from src.track import SpermTracker
+
+FORMAT_VERSION = 1
+# diferenças abaixo disso (s) são ruído de medição, mesmo que a razão seja grande
+MIN_DELTA_S = 0.02
+
+
+def warm_imports():
+    """
+    Importa as bibliotecas que a pipeline só carrega no primeiro uso (pandas,
+    matplotlib; ver src/prewarm.py). Sem isso, a primeira execução do processo paga
+    esses imports (~0,3 s) dentro das etapas metrics e report.
+    """
+    for module in HEAVY_MODULES:
+        importlib.import_module(module)
+
+
+def run_scenario(scenario, workdir, tracker="centroid", overlay=True, repeat=1, jitter=0.5, miss_rate=0.0,
+                 sampling=None, detector_options=None):
+    """
+    Roda o cenário `repeat` vezes e fica com a execução mais rápida.
+    sampling: opções de subamostragem do detector (skip_frames, adaptive, motion_threshold, max_skip)
+    detector_options: outras opções do SpermDetector (batch_size, tile_size, ...)
+    """
+    t0 = time.perf_counter()
+    truth = simulate(scenario)
+    video = render_video(scenario, truth, os.path.join(workdir, scenario.name + ".mp4"))
+    synth_s = time.perf_counter() - t0
+
+    weights = write_stub_weights(workdir, jitter=jitter, miss_rate=miss_rate, seed=scenario.seed)
+    warm_imports()
+    best = None
+    for _ in range(max(1, repeat)):
+        profiler = Profiler()
+        detector = SpermDetector(weights=weights, backend=STUB_BACKEND, **(sampling or {}),
+                                 **(detector_options or {}))
+        result = analyze_video(detector, SpermTracker(backend=tracker), video, fps=scenario.fps,
+                               microns_per_pixel=0.5, drop_volume_ul=2.0, keep_tracks=True,
+                               overlay_path=os.path.join(workdir, scenario.name + "_overlay.mp4") if overlay else None,
+                               profiler=profiler)
+        out_base = os.path.join(workdir, scenario.name)
+        _, timings = write_reports(out_base + ".json", out_base + ".md", out_base + "_hist.png", result, {},
+                                   profiler=profiler)
+        if best is None or timings["wall_s"] < best[0]["wall_s"]:
+            best = (timings, result)
+
+    timings, result = best
+    throughput = {stage: round(timings["frames"] / s["wall_s"], 1) if s["wall_s"] > 0 else None
+                  for stage, s in timings["stages"].items()}
+    return {
+        "scenario": scenario.to_dict(),
+        "synthesize_s": round(synth_s, 3),
+        "timings": timings,
+        "throughput_fps": throughput,
+        "accuracy": tracking_accuracy(result["tracks"], truth),
+    }
+
+
+def compare(current, baseline, tolerance=0.2):
+    """
+    Compara dois resultados do benchmark, cenário a cenário.
+    Retorna {"scenarios": {nome: {...}}, "regressions": [texto, ...]}.
+    """
+    out, regressions = {}, []
+    for name, cur in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        stages = {}
+        for stage, s in cur["timings"]["stages"].items():
+            b = base["timings"]["stages"].get(stage)
+            if b is None:
+                continue
+            ratio = s["wall_s"] / b["wall_s"] if b["wall_s"] > 0 else None
+            stages[stage] = {"wall_s": s["wall_s"], "baseline_wall_s": b["wall_s"],
+                             "ratio": round(ratio, 3) if ratio is not None else None}
+            if ratio is not None and ratio > 1 + tolerance and s["wall_s"] - b["wall_s"] > MIN_DELTA_S:
+                regressions.append(f"{name}: etapa {stage} {ratio:.2f}x mais lenta "
+                                   f"({b['wall_s']:.3f}s -> {s['wall_s']:.3f}s)")
+        acc, base_acc = cur["accuracy"], base["accuracy"]
+        if acc["id_switches"] > base_acc["id_switches"]:
+            regressions.append(f"{name}: id_switches {base_acc['id_switches']} -> {acc['id_switches']}")
+        for key in ("length_error", "path_length_error"):
+            if acc[key] > base_acc[key] + 0.01:
+                regressions.append(f"{name}: {key} {base_acc[key]} -> {acc[key]}")
+        out[name] = {
+            "stages": stages,
+            "fps": {"current": cur["timings"]["fps"], "baseline": base["timings"]["fps"]},
+            "accuracy": {"current": acc, "baseline": base_acc},
+        }
+    return {"tolerance": tolerance, "scenarios": out, "regressions": regressions}
+
+
+def _resolution(text):
+    try:
+        w, h = text.lower().split("x")
+        return int(w), int(h)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"resolução inválida: {text!r} (use LxA, ex.: 640x480)")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark da pipeline com vídeos sintéticos")
+    p.add_argument("--cells", type=int, nargs="+", default=[100], help="Nº de células por vídeo")
+    p.add_argument("--speed", type=float, nargs="+", default=[3.0], help="Velocidade média (px/frame)")
+    p.add_argument("--resolution", type=_resolution, nargs="+", default=[(640, 480)], help="LxA, ex.: 640x480")
+    p.add_argument("--frames", type=int, nargs="+", default=[300], help="Duração em frames")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--tracker", default="centroid", help="Backend de rastreamento")
+    p.add_argument("--jitter", type=float, default=0.5, help="Ruído (px) nas caixas do detector simulado")
+    p.add_argument("--miss_rate", type=float, default=0.0, help="Fração de detecções perdidas")
+    p.add_argument("--skip_frames", type=int, default=0, help="Infere 1 a cada N + 1 frames")
+    p.add_argument("--adaptive", action="store_true", help="Subamostragem adaptativa por diferença entre frames")
+    p.add_argument("--batch_size", type=int, default=1, help="Frames por chamada ao detector")
+    p.add_argument("--tile_size", type=int, default=None, help="Infere em tiles desse tamanho (px)")
+    p.add_argument("--no_overlay", action="store_true", help="Não grava o vídeo com as trilhas")
+    p.add_argument("--repeat", type=int, default=1, help="Repetições por cenário (fica a mais rápida)")
+    p.add_argument("--workdir", default=None, help="Onde gravar vídeos e relatórios (padrão: temporário)")
+    p.add_argument("--output", default=None, help="Arquivo JSON com os resultados")
+    p.add_argument("--baseline", default=None, help="JSON de uma execução anterior para comparar")
+    p.add_argument("--tolerance", type=float, default=0.2, help="Piora relativa tolerada por etapa")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="spermai_bench_")
+    os.makedirs(workdir, exist_ok=True)
+
+    results = {
+        "version": FORMAT_VERSION,
+        "created_at": time.time(),
+        "env": {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__,
+                "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "tracker": args.tracker,
+        "sampling": {"skip_frames": args.skip_frames, "adaptive": args.adaptive},
+        "detector": {"batch_size": args.batch_size, "tile_size": args.tile_size},
+        "scenarios": {},
+    }
+    for cells, speed, (w, h), frames in itertools.product(args.cells, args.speed, args.resolution, args.frames):
+        scenario = Scenario(n_cells=cells, speed=speed, width=w, height=h, n_frames=frames, seed=args.seed)
+        print(f"{scenario.name}...", flush=True)
+        r = run_scenario(scenario, workdir, tracker=args.tracker, overlay=not args.no_overlay,
+                         repeat=args.repeat, jitter=args.jitter, miss_rate=args.miss_rate,
+                         sampling=results["sampling"], detector_options=results["detector"])
+        results["scenarios"][scenario.name] = r
+        acc = r["accuracy"]
+        print(f"  {r['timings']['fps']} frames/s, {r['timings']['inferred_frames']} frames inferidos, id_switches={acc['id_switches']}, "
+              f"length_error={acc['length_error']}, path_length_error={acc['path_length_error']}")
+        for stage, fps in r["throughput_fps"].items():
+            print(f"  {stage}: {r['timings']['stages'][stage]['wall_s']:.3f}s ({fps} frames/s)")
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        results["comparison"] = compare(results, baseline, tolerance=args.tolerance)
+        regressions = results["comparison"]["regressions"]
+        if regressions:
+            print("Regressões em relação ao baseline:")
+            for line in regressions:
+                print("  " + line)
+            status = 1
+        else:
+            print("Sem regressões em relação ao baseline.")
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Resultados: {args.output}")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+stub_detector.py
+Backend de inferência simulado para benchmarks e testes (sem pesos do YOLO).
+StubBackend segue a interface de src/inference.py e entra no SpermDetector real
+pelo make_inference_backend (backend=BACKEND): decodificação, lotes, prefetch,
+tiles, ROI e subamostragem (MotionGate) são os de produção; só o modelo é trocado.
+
+A "inferência" acha as cabeças das células nos frames de synthetic.py por limiar
+de brilho (componentes conexas) e devolve caixas do tamanho das da ground truth,
+com ruído e falhas opcionais. O ruído depende só do conteúdo da imagem e do seed:
+o mesmo frame gera as mesmas caixas, em qualquer ordem, lote ou processo.
+
+As opções ficam num JSON que faz o papel dos pesos (write_stub_weights), para que
+processos filhos (shard.py) construam o mesmo backend:
+    weights = write_stub_weights(workdir, jitter=0.5, seed=0)
+    detector = SpermDetector(weights=weights, backend=BACKEND, conf=0.25)
+"""
+
+import json
+import os
+import zlib
+
+import cv2
+import numpy as np
+
+# nome do backend para SpermDetector(backend=...) / make_inference_backend
+BACKEND = "benchmarks.stub_detector:StubBackend"
+
+
+def write_stub_weights(directory, jitter=0.5, miss_rate=0.0, score=0.9, seed=0, threshold=190, half_size=5.0):
+    """
+    Grava as opções do StubBackend em <directory>/stub_*.json e retorna o caminho.
+    jitter: desvio padrão (px) do ruído nas caixas
+    miss_rate: fração de detecções perdidas por imagem
+    threshold: nível de cinza a partir do qual um pixel é cabeça (fundo ~60, cauda ~150, cabeça ~230)
+    half_size: meia largura/altura das caixas (a mesma da ground truth)
+    """
+    options = {"jitter": float(jitter), "miss_rate": float(miss_rate), "score": float(score), "seed": int(seed),
+               "threshold": int(threshold), "half_size": float(half_size)}
+    # um arquivo por conjunto de opções: MODELS guarda o backend pelo caminho dos pesos
+    name = "stub_" + "_".join(f"{k}{v:g}" for k, v in options.items()) + ".json"
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(options, f)
+    return path
+
+
+class StubBackend:
+    """
+    weights: JSON gravado por write_stub_weights
+    device: ignorado
+    min_area: componentes menores que isso (px) são descartados
+    """
+
+    def __init__(self, weights, device=None, min_area=3):
+        with open(weights, encoding="utf-8") as f:
+            options = json.load(f)
+        self.jitter = float(options.get("jitter", 0.5))
+        self.miss_rate = float(options.get("miss_rate", 0.0))
+        self.score = float(options.get("score", 0.9))
+        self.seed = int(options.get("seed", 0))
+        self.threshold = int(options.get("threshold", 190))
+        self.half_size = float(options.get("half_size", 5.0))
+        self.min_area = int(min_area)
+
+    def __call__(self, images, conf=0.25):
+        return [self._detect(np.ascontiguousarray(image), conf) for image in images]
+
+    def warmup(self):
+        pass
+
+    def _detect(self, image, conf):
+        if self.score < conf:
+            return np.empty((0, 5), dtype=np.float32)
+        # os frames sintéticos são cinza gravados em BGR: um canal basta
+        gray = image[..., 0] if image.ndim == 3 else image
+        _, _, stats, centroids = cv2.connectedComponentsWithStats((gray >= self.threshold).astype(np.uint8),
+                                                                  connectivity=8)
+        centers = centroids[1:][stats[1:, cv2.CC_STAT_AREA] >= self.min_area]
+        rng = np.random.default_rng([self.seed, zlib.crc32(image)])
+        if self.jitter > 0:
+            centers = centers + rng.normal(0, self.jitter, size=centers.shape)
+        if self.miss_rate > 0:
+            centers = centers[rng.random(len(centers)) >= self.miss_rate]
+        out = np.empty((len(centers), 5), dtype=np.float32)
+        out[:, :2] = centers - self.half_size
+        out[:, 2:4] = centers + self.half_size
+        out[:, 4] = self.score
+        return out
@@ -2,28 +2,33 @@
 main.py
 Pipeline everything-in-one:
 1) Detect via YOLOv8
-2) Track via DeepSORT
+2) Track via DeepSORT (ou rastreador só de movimento, --tracker centroid)
 3) Calcular motilidade, vigor
 4) Estimar concentração
 5) Gerar relatório (JSON + Markdown + PNG)
 Uso:
 python main.py --input data/raw_videos/sample.mp4 --output reports/sample_report.json --microns_per_pixel 0.5 --fps 25 --drop_volume_ul 2.0
+As detecções e trilhas brutas ficam em <output>_artifacts/ (ver src/artifacts.py); para
+refazer métricas e relatório sem reprocessar o vídeo (ex.: outra calibração):
+python main.py --from-artifacts reports/sample_report_artifacts --output reports/sample_report_v2.json --microns_per_pixel 0.6
 """
 
 import argparse
 import os
-from src.detect import SpermDetector
+from src.detect import SpermDetector, video_frame_count
 from src.track import SpermTracker
-from src.motility import distance_pixels, velocity_um_s, linearity
-from src.vigor import vigor_index, vigor_class
-from src.concentration import estimate_concentration
-from src.report import generate_report_json, generate_markdown_report, plot_velocity_histogram
-import pandas as pd
-from tqdm import tqdm
+from src.trackers import TRACKER_BACKENDS
+from src.inference import INFERENCE_BACKENDS
+from src.pipeline import analyze_video, analyze_track_table
+from src.shard import track_video_sharded
+from src.artifacts import ArtifactWriter, read_artifacts, write_artifacts
+from src.profiling import Profiler
+from src.report import write_reports
+from src.history import HistoryIndex
 
 def parse_args():
     p = argparse.ArgumentParser()
-    p.add_argument("--input", required=True, help="Vídeo de entrada")
+    p.add_argument("--input", help="Vídeo de entrada")
     p.add_argument("--output", required=True, help="Arquivo JSON de saída do relatório")
     p.add_argument("--weights", default="models/yolo/yolov8n.pt", help="Pesos YOLOv8")
     p.add_argument("--conf", type=float, default=0.25)
@@ -31,80 +36,119 @@ def parse_args():
     p.add_argument("--fps", type=float, default=25.0)
     p.add_argument("--drop_volume_ul", type=float, default=2.0, help="Volume da gota correspondente ao campo em µL")
     p.add_argument("--max_frames", type=int, default=None)
-    return p.parse_args()
+    p.add_argument("--tracker", default="deepsort", choices=sorted(TRACKER_BACKENDS),
+                   help="Backend de rastreamento (centroid: só movimento, mais rápido em amostras densas)")
+    p.add_argument("--shards", type=int, default=1, help="Divide o vídeo em N trechos processados em paralelo")
+    p.add_argument("--shard_overlap", type=int, default=50, help="Frames sobrepostos entre trechos (para costurar as trilhas)")
+    p.add_argument("--workers", type=int, default=None, help="Processos para os shards (padrão: min(shards, núcleos))")
+    p.add_argument("--backend", default="torch", choices=sorted(INFERENCE_BACKENDS),
+                   help="Backend de inferência; onnx* roda o modelo exportado no ONNX Runtime (CPU)")
+    p.add_argument("--batch_size", type=int, default=1, help="Frames por inferência do YOLO (>1 ativa decodificação em paralelo)")
+    p.add_argument("--tile_size", type=int, default=None,
+                   help="Infere em blocos de N px (vídeos de alta resolução; use o tamanho de entrada do modelo, ex.: 640)")
+    p.add_argument("--tile_overlap", type=int, default=64, help="Sobreposição entre blocos (px), maior que uma célula")
+    p.add_argument("--roi_mask", default=None, help="Imagem com a região de interesse (pixels != 0); o resto é ignorado")
+    p.add_argument("--skip_frames", type=int, default=0, help="Infere 1 a cada N + 1 frames (trilhas interpoladas; sem VCL/linearidade)")
+    p.add_argument("--adaptive", action="store_true",
+                   help="Infere só quando há movimento (diferença entre frames); trilhas interpoladas, sem VCL/linearidade")
+    p.add_argument("--motion_threshold", type=float, default=0.25,
+                   help="Fração da área das células alterada que exige nova inferência (--adaptive)")
+    p.add_argument("--max_skip", type=int, default=8, help="Máximo de frames seguidos sem inferência (--adaptive)")
+    p.add_argument("--artifacts", default=None,
+                   help="Diretório para gravar detecções e trilhas (padrão: <output>_artifacts)")
+    p.add_argument("--history", default=None,
+                   help="Índice SQLite do histórico onde o relatório é registrado (ex.: reports/history.sqlite)")
+    p.add_argument("--from_artifacts", "--from-artifacts", default=None,
+                   help="Recalcula métricas e relatório a partir de um diretório de artefatos, sem o vídeo")
+    args = p.parse_args()
+    if not args.input and not args.from_artifacts:
+        p.error("informe --input ou --from-artifacts")
+    return args
 
 def main():
     args = parse_args()
-    detector = SpermDetector(weights=args.weights, conf=args.conf)
-    print("Detectando...")
-    detections = detector.detect_video(args.input, max_frames=args.max_frames)
-    print(f"Detecções totais: {len(detections)}")
-
-    tracker = SpermTracker()
-    print("Rastreando...")
-    tracks = tracker.run(detections)
-
-    # Calcular por track
-    rows = []
-    velocities = []
-    counts_per_frame = {}
-    for tid, traj in tracks.items():
-        # traj é [(frame_id, cx, cy), ...] ; ordenar por frame
-        traj_sorted = sorted(traj, key=lambda x: x[0])
-        dist_px = distance_pixels(traj_sorted)
-        vel = velocity_um_s(traj_sorted, fps=args.fps, microns_per_pixel=args.microns_per_pixel)
-        lin = linearity(traj_sorted)
-        vigor_idx = vigor_index(vel, lin)
-        vclass = vigor_class(vigor_idx)
-        rows.append({
-            "track_id": int(tid),
-            "n_points": len(traj_sorted),
-            "distance_px": dist_px,
-            "velocity_um_s": vel,
-            "linearity": lin,
-            "vigor_index": vigor_idx,
-            "vigor_class": vclass
-        })
-        velocities.append(vel)
-        # contar por frame para concentração
-        for fr, cx, cy in traj_sorted:
-            counts_per_frame.setdefault(fr, set()).add(tid)
-
-    counts_list = [len(s) for s in counts_per_frame.values()] if counts_per_frame else []
-    conc = estimate_concentration(counts_list, args.drop_volume_ul)
-
-    df = pd.DataFrame(rows)
-    summary = {}
-    if not df.empty:
-        summary["motilidade_progressiva_%"] = float((df[(df.velocity_um_s > 25) & (df.linearity > 0.6)].shape[0] / df.shape[0]) * 100)
-        summary["vigor_medio"] = df["vigor_index"].mean()
-        summary["n_trajetorias"] = int(df.shape[0])
+    calibration = {"fps": args.fps, "microns_per_pixel": args.microns_per_pixel,
+                   "drop_volume_ul": args.drop_volume_ul}
+    profiler = Profiler()
+    detector_options = {"weights": args.weights, "conf": args.conf, "batch_size": args.batch_size,
+                        "backend": args.backend,
+                        "tile_size": args.tile_size, "tile_overlap": args.tile_overlap, "roi_mask": args.roi_mask,
+                        "skip_frames": args.skip_frames, "adaptive": args.adaptive,
+                        "motion_threshold": args.motion_threshold, "max_skip": args.max_skip}
+    artifacts_dir = args.artifacts or os.path.splitext(args.output)[0] + "_artifacts"
+    artifacts_meta = {"input": args.input, "weights": args.weights, "backend": args.backend, "tracker": args.tracker,
+                      "conf": args.conf, "max_frames": args.max_frames, "tile_size": args.tile_size,
+                      "tile_overlap": args.tile_overlap, "roi_mask": args.roi_mask,
+                      "skip_frames": args.skip_frames, "adaptive": args.adaptive,
+                      "motion_threshold": args.motion_threshold, "max_skip": args.max_skip}
+    if args.from_artifacts:
+        artifacts = read_artifacts(args.from_artifacts)
+        print(f"Recalculando a partir de {args.from_artifacts}...")
+        result = analyze_track_table(artifacts.tracks, **calibration, profiler=profiler, sampling=artifacts.meta)
+        result["n_detections"] = artifacts.manifest["n_detections"]
+        # pesos/conf/rastreador usados de fato são os da análise original
+        for k in ("weights", "backend", "tracker", "conf"):
+            if k in artifacts.meta:
+                setattr(args, k, artifacts.meta[k])
+    elif args.shards > 1:
+        # detecção + rastreio em processos paralelos, um por trecho do vídeo
+        print(f"Detectando e rastreando em {args.shards} shards...")
+        with profiler.stage("shards"):
+            table, detections = track_video_sharded(
+                args.input, args.shards, overlap=args.shard_overlap, workers=args.workers,
+                max_frames=args.max_frames,
+                detector_options=detector_options,
+                tracker_options={"backend": args.tracker})
+        profiler.count(frames=video_frame_count(args.input, args.max_frames) or 0, detections=len(detections))
+        result = analyze_track_table(table, **calibration, profiler=profiler, sampling=detector_options)
+        result["n_detections"] = len(detections)
+        with profiler.stage("artifacts"):
+            write_artifacts(artifacts_dir, table, detections, meta=artifacts_meta)
     else:
-        summary["motilidade_progressiva_%"] = 0.0
-        summary["vigor_medio"] = 0.0
-        summary["n_trajetorias"] = 0
+        with profiler.stage("load_model"):
+            detector = SpermDetector(**detector_options)
+        tracker = SpermTracker(backend=args.tracker)
+        print("Detectando e rastreando...")
+        # detecção, rastreio e métricas em streaming; trilhas e detecções vão direto para os artefatos
+        writer = ArtifactWriter(artifacts_dir)
+        try:
+            result = analyze_video(detector, tracker, args.input, **calibration, max_frames=args.max_frames,
+                                   profiler=profiler, sink=writer)
+        except BaseException:
+            writer.abort()
+            raise
+        with profiler.stage("artifacts"):
+            writer.close(artifacts_meta)
+    if not args.from_artifacts:
+        print(f"Artefatos: {artifacts_dir}")
+    print(f"Detecções totais: {result['n_detections']}")
 
     params = {
         "weights": args.weights,
+        "backend": args.backend,
+        "tracker": args.tracker,
         "conf": args.conf,
         "microns_per_pixel": args.microns_per_pixel,
         "fps": args.fps,
         "drop_volume_ul": args.drop_volume_ul
     }
 
-    # gerar outputs
-    out_json = generate_report_json(args.output, summary, df.to_dict(orient="records"), conc, params)
-    # gerar markdown ao lado do json
-    md_path = os.path.splitext(args.output)[0] + ".md"
-    plots = []
-    if velocities:
-        hist_png = os.path.splitext(args.output)[0] + "_vel_hist.png"
-        plot_velocity_histogram(velocities, hist_png)
-        plots.append(hist_png)
-    generate_markdown_report(md_path, summary, df, conc, params, plots=plots)
+    # gerar outputs: markdown e histograma ao lado do json
+    base = os.path.splitext(args.output)[0]
+    md_path = base + ".md"
+    history = HistoryIndex(args.history) if args.history else None
+    sample = os.path.splitext(os.path.basename(args.input or args.output))[0]
+    _, timings = write_reports(args.output, md_path, base + "_vel_hist.png", result, params, profiler=profiler,
+                               history=history, sample=sample)
 
+    print("Tempo por etapa (parede / CPU):")
+    for stage, t in timings["stages"].items():
+        print(f"  {stage}: {t['wall_s']:.2f}s / {t['cpu_s']:.2f}s")
+    if 0 < timings["inferred_frames"] < timings["frames"]:
+        print(f"Frames inferidos: {timings['inferred_frames']} de {timings['frames']} (demais interpolados)")
+    print(f"Total: {timings['wall_s']:.2f}s, {timings['fps'] or 0:.1f} frames/s, pico de memória {timings['peak_rss_mb']} MB")
     print("Relatório gerado:")
-    print(out_json)
+    print(args.output)
     print(md_path)
 
 if __name__ == "__main__":
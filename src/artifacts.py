@@ -0,0 +1,195 @@
+"""
+artifacts.py
+Artefatos brutos de uma análise: detecções e trilhas em colunas tipadas.
+Um diretório de artefatos contém:
+- manifest.json: versão do formato, colunas (arquivo, dtype, tamanho) e metadados
+  (pesos, conf, rastreador, fps do vídeo, ...)
+- detections.<coluna>.npy: frame (int64), x1, y1, x2, y2, score (float32)
+- tracks.<coluna>.npy: track_id, frame (int64), cx, cy (float64)
+
+Cada coluna é um .npy simples, para que read_artifacts possa mapeá-la em memória
+(np.load(mmap_mode="r")): só as páginas lidas de fato saem do disco.
+
+ArtifactWriter grava as colunas em partes, à medida que a análise produz detecções
+e trilhas encerradas, sem manter o vídeo inteiro em memória.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from src.track import TrackTable
+
+FORMAT_VERSION = 1
+
+DETECTION_COLUMNS = {"frame": "int64", "x1": "float32", "y1": "float32",
+                     "x2": "float32", "y2": "float32", "score": "float32"}
+TRACK_COLUMNS = {"track_id": "int64", "frame": "int64", "cx": "float64", "cy": "float64"}
+
+
+def write_artifacts(directory, tracks, detections=None, meta=None):
+    """
+    tracks: TrackTable
+    detections: array (n, 6) [frame, x1, y1, x2, y2, score] ou None
+    meta: dict com as entradas da análise (gravado no manifesto)
+    Retorna o caminho do manifesto.
+    """
+    writer = ArtifactWriter(directory)
+    try:
+        if detections is not None:
+            writer.add_detections(detections)
+        writer.add_tracks(tracks)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close(meta)
+
+
+class _ColumnFile:
+    """Um .npy 1D aberto para append; o cabeçalho com o tamanho final é escrito no close()."""
+
+    # cabeçalho com espaço para qualquer tamanho: reescrito no lugar no close()
+    _PLACEHOLDER = 10 ** 15
+
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self._f = open(path, "wb")
+        self._header_size = self._write_header(self._PLACEHOLDER)
+
+    def _write_header(self, length):
+        self._f.seek(0)
+        np.lib.format.write_array_header_1_0(
+            self._f, {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False, "shape": (length,)})
+        return self._f.tell()
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self._f.write(values.data)
+        self.length += len(values)
+
+    def close(self):
+        try:
+            self._f.flush()
+            if self._write_header(self.length) != self._header_size:
+                raise ValueError(f"Cabeçalho de {self.path} mudou de tamanho.")
+        finally:
+            self._f.close()
+
+
+class ArtifactWriter:
+    """
+    Grava um diretório de artefatos em partes:
+    add_detections(array (n, 6)) e add_tracks(TrackTable) acrescentam linhas às
+    colunas (cada trilha deve vir inteira numa única chamada, como as trilhas
+    encerradas de pipeline.iter_finished_tracks); close(meta) grava o manifesto.
+    As detecções de vários frames são juntadas em blocos de flush_rows linhas
+    antes de ir para o disco.
+    """
+
+    def __init__(self, directory, flush_rows=65536):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_rows = int(flush_rows)
+        self._files = {}
+        for group, dtypes in (("detections", DETECTION_COLUMNS), ("tracks", TRACK_COLUMNS)):
+            for name, dtype in dtypes.items():
+                self._files[f"{group}.{name}"] = _ColumnFile(os.path.join(directory, f"{group}.{name}.npy"), dtype)
+        self._pending = []
+        self._pending_rows = 0
+        self.n_tracks = 0
+
+    def add_detections(self, detections):
+        detections = np.asarray(detections).reshape(-1, 6)
+        if len(detections):
+            self._pending.append(detections)
+            self._pending_rows += len(detections)
+            if self._pending_rows >= self.flush_rows:
+                self._flush_detections()
+
+    def _flush_detections(self):
+        if not self._pending:
+            return
+        block = np.concatenate(self._pending)
+        self._pending, self._pending_rows = [], 0
+        for i, name in enumerate(DETECTION_COLUMNS):
+            self._files[f"detections.{name}"].append(block[:, i])
+
+    def add_tracks(self, table):
+        if len(table) == 0:
+            return
+        for name in TRACK_COLUMNS:
+            self._files[f"tracks.{name}"].append(getattr(table, name))
+        self.n_tracks += int(len(np.unique(table.track_id)))
+
+    def close(self, meta=None):
+        """Fecha as colunas e grava o manifesto; retorna o caminho do manifesto."""
+        self._flush_detections()
+        columns = {}
+        for key, col in self._files.items():
+            col.close()
+            columns[key] = {"file": os.path.basename(col.path), "dtype": col.dtype.name, "length": col.length}
+        manifest = {
+            "version": FORMAT_VERSION,
+            "n_detections": columns["detections.frame"]["length"],
+            "n_track_points": columns["tracks.frame"]["length"],
+            "n_tracks": self.n_tracks,
+            "columns": columns,
+            "meta": meta or {},
+        }
+        path = os.path.join(self.directory, "manifest.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        return path
+
+    def abort(self):
+        """Fecha os arquivos sem manifesto (quem chamou remove o diretório)."""
+        for col in self._files.values():
+            col._f.close()
+
+
+class Artifacts:
+    """
+    Artefatos lidos de um diretório. As colunas são carregadas (ou mapeadas em
+    memória) só quando acessadas.
+    """
+
+    def __init__(self, directory, mmap=True):
+        self.directory = directory
+        self.mmap_mode = "r" if mmap else None
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Versão de artefatos não suportada: {self.manifest.get('version')!r}")
+        self._columns = {}
+
+    @property
+    def meta(self):
+        return self.manifest["meta"]
+
+    def column(self, name):
+        """Coluna pelo nome, ex.: "tracks.cx" ou "detections.score"."""
+        if name not in self._columns:
+            info = self.manifest["columns"][name]
+            values = np.load(os.path.join(self.directory, info["file"]), mmap_mode=self.mmap_mode)
+            if values.dtype != np.dtype(info["dtype"]) or len(values) != info["length"]:
+                raise ValueError(f"Coluna {name} não confere com o manifesto.")
+            self._columns[name] = values
+        return self._columns[name]
+
+    @property
+    def tracks(self):
+        """TrackTable sobre as colunas mapeadas (sem cópia: os dtypes já são os da tabela)."""
+        return TrackTable(*(self.column(f"tracks.{name}") for name in TRACK_COLUMNS))
+
+    @property
+    def detections(self):
+        """Array (n, 6) [frame, x1, y1, x2, y2, score] (float32); materializa as colunas."""
+        cols = [self.column(f"detections.{name}") for name in DETECTION_COLUMNS]
+        return np.column_stack(cols).astype(np.float32) if len(cols[0]) else np.zeros((0, 6), dtype=np.float32)
+
+
+def read_artifacts(directory, mmap=True):
+    return Artifacts(directory, mmap=mmap)
@@ -0,0 +1,170 @@
+"""
+cache.py
+Cache de resultados endereçado por conteúdo.
+A chave combina o hash do vídeo enviado com as entradas que mudam detecção e
+rastreio (pesos, conf, max_frames, rastreador). Parâmetros de calibração
+(microns_per_pixel, fps, drop_volume_ul) ficam fora da chave: numa reanálise só
+com eles mudados, detecção e rastreio vêm do cache e só as métricas são refeitas.
+
+Cada entrada é um diretório <root>/<chave>/ com:
+- os artefatos da análise (ver artifacts.py): trilhas, detecções e manifest.json
+  com as entradas da chave; as colunas são mapeadas em memória na leitura
+- overlay.mp4 (opcional): vídeo com as trilhas, que também não depende da calibração
+O tamanho total é limitado por max_bytes, descartando as entradas usadas há mais tempo (LRU).
+
+Uma entrada pode ser gravada de uma vez (put) ou em partes durante a análise
+(writer: CacheWriter), sem acumular detecções e trilhas em memória.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from src.artifacts import ArtifactWriter, read_artifacts
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def weights_fingerprint(weights):
+    """Identifica os pesos pelo caminho + tamanho + data de modificação (pesos re-treinados mudam a chave)."""
+    try:
+        st = os.stat(weights)
+        return f"{os.path.abspath(weights)}:{st.st_size}:{int(st.st_mtime)}"
+    except OSError:
+        return os.path.abspath(weights)
+
+
+class ResultCache:
+    def __init__(self, root="cache", max_bytes=5 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def make_key(content_hash, **inputs):
+        payload = json.dumps({"content": content_hash, **inputs}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def _dir(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        """
+        Retorna dict com tracks (TrackTable sobre as colunas mapeadas), artifacts
+        (Artifacts da entrada; as detecções só são lidas se artifacts.detections for
+        acessado), meta e overlay_path (ou None), ou None se a chave não está no cache.
+        """
+        d = self._dir(key)
+        try:
+            artifacts = read_artifacts(d)
+            tracks = artifacts.tracks
+            # marca como usada recentemente (para o LRU); falha se evict() removeu a entrada no meio da leitura
+            os.utime(d)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        overlay = os.path.join(d, "overlay.mp4")
+        with self._lock:
+            self.hits += 1
+        return {
+            "tracks": tracks,
+            "artifacts": artifacts,
+            "meta": artifacts.meta,
+            "overlay_path": overlay if os.path.exists(overlay) else None,
+        }
+
+    def put(self, key, tracks, detections=None, meta=None, overlay_path=None):
+        """Grava a entrada de forma atômica (diretório temporário + rename) e aplica o limite de tamanho."""
+        writer = self.writer(key, meta)
+        try:
+            if detections is not None:
+                writer.add_detections(detections)
+            writer.add_tracks(tracks)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit(overlay_path)
+
+    def writer(self, key, meta=None):
+        """CacheWriter para gravar a entrada em partes (ex.: pipeline.analyze_video(sink=...))."""
+        return CacheWriter(self, key, meta)
+
+    def evict(self):
+        """Remove as entradas menos recentes até o total caber em max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.root):
+                if name.startswith("."):
+                    continue
+                d = self._dir(name)
+                try:
+                    size = sum(e.stat().st_size for e in os.scandir(d) if e.is_file())
+                    entries.append((os.stat(d).st_mtime, size, d))
+                except OSError:
+                    continue
+                total += size
+            for _, size, d in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(d, ignore_errors=True)
+                total -= size
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "max_bytes": self.max_bytes}
+
+
+class CacheWriter:
+    """
+    Entrada do cache gravada em partes num diretório temporário:
+    add_detections / add_tracks repassam ao ArtifactWriter; commit() grava o manifesto,
+    copia o overlay e publica a entrada com um rename atômico; abort() descarta tudo.
+    """
+
+    def __init__(self, cache, key, meta=None):
+        self.cache = cache
+        self.key = key
+        self.meta = dict(meta or {})
+        self.tmp = os.path.join(cache.root, f".tmp_{key}_{uuid.uuid4().hex[:6]}")
+        os.makedirs(self.tmp)
+        self.artifacts = ArtifactWriter(self.tmp)
+
+    def add_detections(self, detections):
+        self.artifacts.add_detections(detections)
+
+    def add_tracks(self, table):
+        self.artifacts.add_tracks(table)
+
+    def commit(self, overlay_path=None):
+        try:
+            self.artifacts.close(meta=dict(self.meta, created_at=time.time()))
+            if overlay_path and os.path.exists(overlay_path):
+                shutil.copyfile(overlay_path, os.path.join(self.tmp, "overlay.mp4"))
+            try:
+                os.rename(self.tmp, self.cache._dir(self.key))
+            except OSError:
+                # outra análise do mesmo vídeo gravou primeiro
+                shutil.rmtree(self.tmp, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+            raise
+        self.cache.evict()
+
+    def abort(self):
+        self.artifacts.abort()
+        shutil.rmtree(self.tmp, ignore_errors=True)
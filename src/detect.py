@@ -2,47 +2,290 @@
 detect.py
 Detecta espermatozoides em cada frame usando YOLOv8 (Ultralytics).
 Retorna lista de detecções: [frame_id, x1, y1, x2, y2, score]
+ou, em streaming (iter_detections), um array (n, 5) por frame.
+
+Modo em lote (batch_size > 1): uma thread decodifica os frames para uma fila
+limitada, o modelo roda sobre pilhas de N frames e as caixas do lote inteiro
+voltam para a CPU numa única conversão vetorizada.
+
+Subamostragem: skip_frames fixo ou adaptive=True, em que uma diferença de
+imagem barata (ver motion.py) decide quando o detector precisa rodar. Frames
+pulados também são gerados (com boxes None), para que o rastreador avance e
+interpole as posições neles. As métricas que somam o deslocamento quadro a quadro
+(VCL, VAP, linearidade, vigor) não são comparáveis com subamostragem e ficam fora
+do resultado (ver pipeline.PER_FRAME_METRICS).
+
+Modo em tiles (tile_size): para vídeos de alta resolução, cada frame é dividido
+em blocos do tamanho de entrada do modelo, todos os blocos do lote vão numa única
+chamada ao modelo e as caixas são juntadas nas emendas (ver tiling.py). Uma
+máscara de ROI opcional evita inferir blocos fora da câmara de contagem.
+
+Backends de inferência (ver inference.py): "torch" (referência) ou o grafo
+exportado para ONNX Runtime ("onnx", "onnx-fp16", "onnx-int8"), para servidores sem GPU;
+os benchmarks usam um backend simulado (benchmarks/stub_detector.py).
+
+Os pesos são carregados pelo cache de processo MODELS (ver models.py): vários
+SpermDetector com os mesmos pesos/device/backend compartilham o mesmo modelo.
 """
 
-from ultralytics import YOLO
 import cv2
 import numpy as np
+import os
+import queue
+import threading
+from src.models import ModelRegistry
+from src.inference import make_inference_backend
+from src.profiling import NULL_PROFILER
+from src.motion import MotionGate
+from src.tiling import (plan_tiles, load_roi_mask, fit_mask, tiles_in_mask, boxes_in_mask,
+                        merge_tile_boxes)
+
+_END = object()
+
+
+def _warm_model(model):
+    model.warmup()
+
+
+MODELS = ModelRegistry(loader=lambda weights, device, backend: make_inference_backend(backend, weights, device),
+                       warmer=_warm_model,
+                       max_models=int(os.environ.get("SPERMAI_MAX_MODELS", 2)))
+
 
 class SpermDetector:
-    def __init__(self, weights="models/yolo/yolov8n.pt", conf=0.25, device=None):
-        self.model = YOLO(weights)
+    """
+    tile_size: se dado, infere em tiles desse tamanho (px) com tile_overlap px de sobreposição
+    roi_mask: caminho de imagem ou array 2D; pixels != 0 são a região de interesse
+    nms_iou: limiar de IoU para juntar caixas duplicadas nas emendas dos tiles
+    skip_frames: infere 1 a cada skip_frames + 1 frames (padrão de iter_detections)
+    adaptive: decide por diferença de imagem quais frames inferir (ver motion.MotionGate),
+    com motion_threshold (fração da área das células alterada) e no máximo max_skip frames seguidos pulados
+    backend: "torch" (padrão), "onnx", "onnx-fp16" ou "onnx-int8" (ver inference.py)
+    """
+
+    def __init__(self, weights="models/yolo/yolov8n.pt", conf=0.25, device=None, batch_size=1, registry=MODELS,
+                 tile_size=None, tile_overlap=64, roi_mask=None, nms_iou=0.5,
+                 skip_frames=0, adaptive=False, motion_threshold=0.25, max_skip=8, backend="torch"):
+        self._entry = registry.get(weights, device, backend)
+        self.model = self._entry.model
         self.conf = conf
+        self.batch_size = max(1, int(batch_size))
+        self.tile_size = int(tile_size) if tile_size else None
+        self.tile_overlap = int(tile_overlap)
+        self.nms_iou = float(nms_iou)
+        self.roi_mask = load_roi_mask(roi_mask)
+        self._layouts = {}
+        self.skip_frames = max(0, int(skip_frames))
+        self.adaptive = bool(adaptive)
+        self.motion_threshold = float(motion_threshold)
+        self.max_skip = int(max_skip)
+        self.last_gate = None
+
+    @property
+    def subsampled(self):
+        return is_subsampled(self.skip_frames, self.adaptive)
 
-    def detect_video(self, video_path, max_frames=None, skip_frames=0):
-        cap = cv2.VideoCapture(video_path)
+    def detect_video(self, video_path, max_frames=None, skip_frames=None, batch_size=None):
         detections = []
-        frame_id = 0
+        for frame_id, boxes in self.iter_detections(video_path, max_frames=max_frames,
+                                                    skip_frames=skip_frames, batch_size=batch_size):
+            if boxes is None:
+                continue
+            for x1, y1, x2, y2, score in boxes.tolist():
+                detections.append([frame_id, x1, y1, x2, y2, score])
+        return detections
+
+    def iter_detections(self, video_path, max_frames=None, skip_frames=None, batch_size=None, return_frames=False,
+                        start_frame=0, profiler=None):
+        """
+        Versão em streaming de detect_video.
+        Gera (frame_id, boxes) para cada frame lido, inclusive frames sem detecção;
+        boxes é um array (n, 5): [x1, y1, x2, y2, score], ou None para frames
+        pulados (skip_frames ou modo adaptativo).
+        return_frames=True gera (frame_id, boxes, frame), para reaproveitar o frame
+        decodificado (ex.: vídeo com sobreposição) sem decodificar o vídeo de novo.
+        start_frame: começa a leitura neste frame (os frame_id continuam absolutos;
+        max_frames também é absoluto, isto é, o último frame lido é max_frames - 1)
+        profiler: opcional (profiling.Profiler), mede as etapas decode, inference e boxes
+        """
+        profiler = profiler or NULL_PROFILER
+        batch_size = self.batch_size if batch_size is None else max(1, int(batch_size))
+        skip_frames = self.skip_frames if skip_frames is None else skip_frames
+        gate = None
+        if self.adaptive:
+            # estado por vídeo; fica em last_gate para consultar quantos frames foram pulados
+            gate = self.last_gate = MotionGate(threshold=self.motion_threshold, max_skip=self.max_skip)
+        frames = _read_frames(video_path, max_frames=max_frames, skip_frames=skip_frames,
+                              keep_skipped=True, start_frame=start_frame, profiler=profiler, gate=gate)
+        if batch_size > 1:
+            # decodificação em paralelo com a inferência; fila limitada a 2 lotes
+            frames = _prefetch(frames, maxsize=2 * batch_size)
+
+        for items in _batched(frames, batch_size):
+            boxes = iter(self._infer_batch([frame for _, frame, infer in items if infer], profiler))
+            for frame_id, frame, infer in items:
+                frame_boxes = next(boxes) if infer else None
+                if return_frames:
+                    yield frame_id, frame_boxes, frame
+                else:
+                    yield frame_id, frame_boxes
+
+    def detect_frames(self, frames, profiler=None):
+        """Detecta numa lista de frames já decodificados (ex.: modo ao vivo); um array (n, 5) por frame."""
+        return self._infer_batch(list(frames), profiler or NULL_PROFILER)
+
+    def _infer_batch(self, frames, profiler=NULL_PROFILER):
+        """Roda o modelo sobre uma lista de frames; retorna um array (n, 5) por frame."""
+        if not frames:
+            return []
+        h, w = frames[0].shape[:2]
+        tiles, mask = self._layout(w, h)
+        if tiles is not None:
+            # todos os tiles de todos os frames do lote numa única chamada
+            inputs = [np.ascontiguousarray(f[y0:y1, x0:x1]) for f in frames for x0, y0, x1, y1 in tiles.tolist()]
+        else:
+            inputs = frames
+        if not inputs:
+            return [np.empty((0, 5), dtype=np.float32) for _ in frames]
+        # o modelo pode estar sendo usado por outras threads (outros jobs)
+        with profiler.stage("inference"), self._entry.lock:
+            boxes = self.model(inputs, conf=self.conf)
+        if len(boxes) == 0:
+            return [np.empty((0, 5), dtype=np.float32) for _ in frames]
+        with profiler.stage("boxes"):
+            if tiles is not None:
+                k = len(tiles)
+                boxes = [merge_tile_boxes(boxes[i * k:(i + 1) * k], tiles, w, h, self.nms_iou)
+                         for i in range(len(frames))]
+            if mask is not None:
+                boxes = [boxes_in_mask(b, mask) for b in boxes]
+            return boxes
+
+    def _layout(self, width, height):
+        """(tiles ou None, máscara booleana ou None) para frames deste tamanho; calculado uma vez."""
+        key = (width, height)
+        if key not in self._layouts:
+            mask = fit_mask(self.roi_mask, width, height) if self.roi_mask is not None else None
+            tiles = None
+            if self.tile_size:
+                tiles = plan_tiles(width, height, self.tile_size, self.tile_overlap)
+                if mask is not None:
+                    tiles = tiles_in_mask(tiles, mask)
+            self._layouts[key] = (tiles, mask)
+        return self._layouts[key]
+
+
+def is_subsampled(skip_frames=0, adaptive=False, **_):
+    """True se as opções de amostragem pulam frames (ver pipeline.PER_FRAME_METRICS)."""
+    return bool(adaptive) or int(skip_frames or 0) > 0
+
+
+def video_fps(video_path, default=25.0):
+    """FPS informado pelo container."""
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return fps or default
+
+
+def video_frame_count(video_path, max_frames=None):
+    """Número de frames informado pelo container (None se desconhecido)."""
+    cap = cv2.VideoCapture(video_path)
+    n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    cap.release()
+    if max_frames:
+        n = min(n, max_frames) if n > 0 else max_frames
+    return n or None
+
+
+def _read_frames(video_path, max_frames=None, skip_frames=0, keep_skipped=False, start_frame=0,
+                 profiler=NULL_PROFILER, gate=None):
+    """
+    Gera (frame_id, frame, infer): infer indica se o frame deve passar pelo detector.
+    gate: opcional, callable(frame) -> bool (ex.: MotionGate); substitui skip_frames
+    Frames pulados só são gerados com keep_skipped=True.
+    """
+    cap = cv2.VideoCapture(video_path)
+    frame_id = 0
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        frame_id = int(start_frame)
+    try:
         while cap.isOpened():
-            ret, frame = cap.read()
+            with profiler.stage("decode"):
+                ret, frame = cap.read()
             if not ret:
                 break
-
-            if skip_frames > 0 and (frame_id % (skip_frames + 1)) != 0:
-                frame_id += 1
-                continue
-
-            results = self.model(frame, conf=self.conf, verbose=False)
-            if len(results) == 0:
-                frame_id += 1
-                continue
-            r = results[0]
-            for box in r.boxes:
-                try:
-                    xyxy = box.xyxy[0].cpu().numpy()  # [x1, y1, x2, y2]
-                    score = float(box.conf[0].cpu().numpy())
-                except Exception:
-                    # fallback: boxes as numpy
-                    xyxy = box.xyxy[0].numpy()
-                    score = float(box.conf[0].numpy())
-                x1, y1, x2, y2 = xyxy.tolist()
-                detections.append([frame_id, float(x1), float(y1), float(x2), float(y2), score])
+            if gate is not None:
+                with profiler.stage("motion"):
+                    infer = gate(frame)
+            else:
+                infer = not (skip_frames > 0 and (frame_id % (skip_frames + 1)) != 0)
+            if infer or keep_skipped:
+                yield frame_id, frame, infer
             frame_id += 1
             if max_frames and frame_id >= max_frames:
                 break
+    finally:
         cap.release()
-        return detections
\ No newline at end of file
+
+
+def _prefetch(items, maxsize):
+    """
+    Consome o iterador `items` numa thread separada, entregando os itens por uma
+    fila limitada. Exceções da thread produtora são repassadas ao consumidor.
+    """
+    q = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:  # repassa para o consumidor
+            put((_END, e))
+            return
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+        put((_END, None))
+
+    t = threading.Thread(target=worker, name="frame-decoder", daemon=True)
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if item[0] is _END:
+                if item[1] is not None:
+                    raise item[1]
+                break
+            yield item
+    finally:
+        stop.set()
+        t.join()
+
+
+def _batched(frames, batch_size):
+    """
+    Agrupa (frame_id, frame, infer) em lotes com até batch_size frames a inferir,
+    mantendo os frames pulados na ordem original.
+    """
+    items, n_infer = [], 0
+    for item in frames:
+        items.append(item)
+        n_infer += item[2]
+        if n_infer >= batch_size:
+            yield items
+            items, n_infer = [], 0
+    if items:
+        yield items
@@ -0,0 +1,174 @@
+"""
+encoder.py
+Codificação do vídeo processado numa thread separada.
+VideoEncoder recebe os frames já desenhados por uma fila limitada (o laço de
+desenho só espera quando a fila enche) e os codifica em segundo plano:
+- com o ffmpeg disponível: H.264 em MP4 fragmentado (um fragmento por segundo),
+  tocável no navegador enquanto o arquivo ainda está sendo escrito
+- sem ffmpeg: cv2.VideoWriter (avc1, ou mp4v se o OpenCV não tiver H.264); o
+  arquivo só fica tocável no fim e nem todo navegador abre mp4v
+
+O executável do ffmpeg vem de SPERMAI_FFMPEG, do PATH ou do pacote opcional
+imageio-ffmpeg. preview_width reduz os frames antes da codificação (o custo do
+H.264 cai com a área do frame).
+"""
+
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+_STOP = object()
+
+
+def find_ffmpeg():
+    """Caminho do executável do ffmpeg, ou None."""
+    path = os.environ.get("SPERMAI_FFMPEG") or shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+    except ImportError:
+        return None
+    try:
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except RuntimeError:
+        return None
+
+
+def streamable():
+    """True se os vídeos gravados aqui podem ser tocados durante a gravação (MP4 fragmentado)."""
+    return find_ffmpeg() is not None
+
+
+def output_size(width, height, preview_width=None):
+    """Tamanho (par, exigido pelo yuv420p) do vídeo de saída, reduzido para preview_width se dado."""
+    if preview_width and preview_width < width:
+        height = height * preview_width / float(width)
+        width = preview_width
+    return max(2, int(width) // 2 * 2), max(2, int(round(height)) // 2 * 2)
+
+
+class VideoEncoder:
+    """
+    out_path: arquivo .mp4 de saída
+    preview_width: largura máxima do vídeo (None = tamanho original)
+    queue_size: frames aguardando codificação; write bloqueia quando a fila está cheia
+    crf / preset: qualidade e velocidade do libx264 (só com ffmpeg)
+    write(frame) entrega um frame BGR (o encoder passa a ser dono do array);
+    close() espera a codificação terminar e relança um erro da thread, se houve.
+    """
+
+    def __init__(self, out_path, fps=25, preview_width=None, queue_size=32, crf=23, preset="veryfast"):
+        self.out_path = out_path
+        self.fps = float(fps or 25)
+        self.preview_width = int(preview_width) if preview_width else None
+        self.crf = crf
+        self.preset = preset
+        self.ffmpeg = find_ffmpeg()
+        self.streamable = self.ffmpeg is not None
+        self.size = None
+        self.frames_written = 0
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="encoder", daemon=True)
+        self._thread.start()
+
+    def write(self, frame):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(frame)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.out_path
+
+    def _run(self):
+        sink = None
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is _STOP:
+                    break
+                if sink is None:
+                    h, w = frame.shape[:2]
+                    self.size = output_size(w, h, self.preview_width)
+                    sink = self._open_ffmpeg() if self.streamable else self._open_cv2()
+                if frame.shape[1] != self.size[0] or frame.shape[0] != self.size[1]:
+                    frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+                sink.write(frame)
+                self.frames_written += 1
+        except Exception as e:
+            self._error = e
+            # esvazia a fila para não deixar write() bloqueado
+            while self._queue.get() is not _STOP:
+                pass
+        finally:
+            if sink is not None:
+                try:
+                    sink.close()
+                except Exception as e:
+                    self._error = self._error or e
+
+    def _open_ffmpeg(self):
+        w, h = self.size
+        cmd = [self.ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}", "-r", f"{self.fps:g}", "-i", "-",
+               "-an", "-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf), "-pix_fmt", "yuv420p",
+               # um keyframe (e um fragmento) por segundo de vídeo
+               "-g", str(max(1, int(round(self.fps)))),
+               "-movflags", "frag_keyframe+empty_moov+default_base_moof", "-flush_packets", "1",
+               "-f", "mp4", self.out_path]
+        return _FfmpegSink(cmd)
+
+    def _open_cv2(self):
+        for codec in ("avc1", "mp4v"):
+            writer = cv2.VideoWriter(self.out_path, cv2.VideoWriter_fourcc(*codec), self.fps, self.size)
+            if writer.isOpened():
+                return _Cv2Sink(writer)
+            writer.release()
+        raise RuntimeError(f"Não foi possível criar o vídeo: {self.out_path}")
+
+
+class _FfmpegSink:
+    def __init__(self, cmd):
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            raise RuntimeError("ffmpeg encerrou durante a codificação: " + self._stderr()) from None
+
+    def _stderr(self):
+        self.proc.wait()
+        return self.proc.stderr.read().decode("utf-8", "replace").strip()
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        if self.proc.wait() != 0:
+            raise RuntimeError("ffmpeg falhou: " + self._stderr())
+
+
+class _Cv2Sink:
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
@@ -0,0 +1,317 @@
+"""
+history.py
+Índice SQLite do histórico de amostras.
+Cada relatório gravado por generate_report_json (report.py) vira uma linha na tabela
+`samples`: parâmetros, resumo, concentração e agregados das trilhas (médias de
+VCL/VSL/VAP e linearidade, trilhas por classe de vigor). Consultas entre amostras
+("motilidade progressiva desta semana") usam os índices do SQLite em vez de abrir
+cada report.json; com dezenas de milhares de amostras respondem em milissegundos.
+
+O report.json continua sendo a fonte da verdade: o índice pode ser refeito a partir
+dos relatórios (rebuild).
+
+Uso:
+python -m src.history rebuild reports/ --db reports/history.sqlite
+python -m src.history query --db reports/history.sqlite --since 2024-05-06 --sample carneiro
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    report_path TEXT NOT NULL UNIQUE,
+    sample TEXT,
+    created_at REAL NOT NULL,
+    day TEXT NOT NULL,
+    weights TEXT,
+    backend TEXT,
+    tracker TEXT,
+    conf REAL,
+    microns_per_pixel REAL,
+    fps REAL,
+    drop_volume_ul REAL,
+    progressive_motility REAL,
+    vigor_mean REAL,
+    n_tracks INTEGER,
+    concentration REAL,
+    vcl_mean REAL,
+    vcl_median REAL,
+    vsl_mean REAL,
+    vap_mean REAL,
+    linearity_mean REAL,
+    vigor_alto INTEGER,
+    vigor_medio INTEGER,
+    vigor_baixo INTEGER,
+    wall_s REAL,
+    params TEXT
+);
+CREATE INDEX IF NOT EXISTS samples_created_at ON samples (created_at);
+CREATE INDEX IF NOT EXISTS samples_sample ON samples (sample, created_at);
+CREATE INDEX IF NOT EXISTS samples_tracker ON samples (tracker, created_at);
+CREATE INDEX IF NOT EXISTS samples_motility ON samples (progressive_motility);
+-- cobre a tendência: agrega por dia sem ler as linhas da tabela
+CREATE INDEX IF NOT EXISTS samples_day ON samples (day, progressive_motility, vigor_mean, concentration, vcl_mean,
+                                                   n_tracks, created_at);
+"""
+
+COLUMNS = ("id", "report_path", "sample", "created_at", "day", "weights", "backend", "tracker", "conf",
+           "microns_per_pixel", "fps", "drop_volume_ul", "progressive_motility", "vigor_mean", "n_tracks",
+           "concentration", "vcl_mean", "vcl_median", "vsl_mean", "vap_mean", "linearity_mean",
+           "vigor_alto", "vigor_medio", "vigor_baixo", "wall_s", "params")
+# colunas aceitas em sort
+SORTABLE = ("created_at", "sample", "progressive_motility", "vigor_mean", "n_tracks", "concentration", "vcl_mean")
+# agrupamentos da tendência: formato de strftime do SQLite aplicado à coluna day (data local)
+BUCKETS = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+# agregados da tendência: (nome, expressão por dia, expressão no bucket)
+_TREND = (
+    ("n_samples", "COUNT(*)", "SUM(n_samples)"),
+    ("n_tracks", "SUM(n_tracks)", "SUM(n_tracks)"),
+    ("min_motility", "MIN(progressive_motility)", "MIN(min_motility)"),
+    ("max_motility", "MAX(progressive_motility)", "MAX(max_motility)"),
+)
+_TREND_MEANS = ("progressive_motility", "vigor_mean", "concentration", "vcl_mean")
+MAX_LIMIT = 500
+
+
+def parse_time(value, end=False):
+    """
+    Epoch (número) ou data/hora ISO ("2024-05-06", "2024-05-06T14:00") em hora local -> epoch.
+    end=True: uma data sem hora vale até o fim do dia (para filtros "até").
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        t = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Data inválida: {value!r} (use AAAA-MM-DD ou AAAA-MM-DDTHH:MM)") from None
+    if end and len(value) == 10:
+        t += datetime.timedelta(days=1)
+    return t.timestamp()
+
+
+def track_aggregates(per_track):
+    """per_track: lista de dicts (uma linha por trilha, como em report.json["tracks"])."""
+    out = {"vcl_mean": None, "vcl_median": None, "vsl_mean": None, "vap_mean": None, "linearity_mean": None,
+           "vigor_alto": 0, "vigor_medio": 0, "vigor_baixo": 0}
+    if not per_track:
+        return out
+
+    def column(key):
+        return np.array([t.get(key) for t in per_track if t.get(key) is not None], dtype=float)
+
+    for name, key in (("vcl_mean", "velocity_um_s"), ("vsl_mean", "vsl_um_s"), ("vap_mean", "vap_um_s"),
+                      ("linearity_mean", "linearity")):
+        values = column(key)
+        out[name] = float(values.mean()) if len(values) else None
+    vcl = column("velocity_um_s")
+    out["vcl_median"] = float(np.median(vcl)) if len(vcl) else None
+    classes = [t.get("vigor_class") for t in per_track]
+    out["vigor_alto"] = classes.count("Alto")
+    out["vigor_medio"] = classes.count("Médio")
+    out["vigor_baixo"] = classes.count("Baixo")
+    return out
+
+
+class HistoryIndex:
+    """
+    path: arquivo SQLite (criado se não existe)
+    Seguro entre threads: cada thread usa a sua conexão; o WAL deixa as consultas
+    rodarem enquanto um relatório é gravado.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, report_path, report, sample=None, created_at=None):
+        """
+        Grava (ou atualiza) a linha de um relatório; report: o dict gravado em report.json.
+        Sem `sample`, usa o nome gravado no relatório ou, na falta dele, o do arquivo.
+        """
+        params = report.get("params") or {}
+        summary = report.get("summary") or {}
+        created_at = time.time() if created_at is None else float(created_at)
+        row = {
+            "report_path": os.path.abspath(report_path),
+            "sample": sample or report.get("sample") or os.path.splitext(os.path.basename(report_path))[0],
+            "created_at": created_at,
+            "day": time.strftime("%Y-%m-%d", time.localtime(created_at)),
+            "weights": params.get("weights"),
+            "backend": params.get("backend"),
+            "tracker": params.get("tracker"),
+            "conf": params.get("conf"),
+            "microns_per_pixel": params.get("microns_per_pixel"),
+            "fps": params.get("fps"),
+            "drop_volume_ul": params.get("drop_volume_ul"),
+            "progressive_motility": summary.get("motilidade_progressiva_%"),
+            "vigor_mean": summary.get("vigor_medio"),
+            "n_tracks": summary.get("n_trajetorias"),
+            "concentration": report.get("concentration"),
+            "wall_s": (report.get("timings") or {}).get("wall_s"),
+            "params": json.dumps(params, ensure_ascii=False, default=str),
+        }
+        row.update(track_aggregates(report.get("tracks")))
+        names = list(row)
+        sql = (f"INSERT INTO samples ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+               f"ON CONFLICT(report_path) DO UPDATE SET "
+               + ", ".join(f"{n} = excluded.{n}" for n in names if n != "report_path"))
+        conn = self._conn()
+        with conn:
+            conn.execute(sql, [row[n] for n in names])
+
+    @staticmethod
+    def _where(since=None, until=None, sample=None, tracker=None, backend=None,
+               min_motility=None, max_motility=None, min_tracks=None):
+        clauses, args = [], []
+        for clause, value in (("created_at >= ?", parse_time(since)),
+                              ("created_at < ?", parse_time(until, end=True)),
+                              ("tracker = ?", tracker or None),
+                              ("backend = ?", backend or None),
+                              ("progressive_motility >= ?", min_motility),
+                              ("progressive_motility <= ?", max_motility),
+                              ("n_tracks >= ?", min_tracks)):
+            if value is not None and value != "":
+                clauses.append(clause)
+                args.append(value)
+        if sample:
+            # trecho do nome da amostra (ex.: identificação do animal), sem diferenciar maiúsculas
+            clauses.append("sample LIKE ? ESCAPE '\\'")
+            args.append("%" + sample.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def query(self, sort="created_at", order="desc", limit=50, offset=0, **filters):
+        """
+        Amostras que passam nos filtros (ver _where), paginadas.
+        Retorna {"total", "limit", "offset", "items": [dict por amostra]}.
+        """
+        if sort not in SORTABLE:
+            raise ValueError(f"Ordenação inválida: {sort} (use {', '.join(SORTABLE)})")
+        direction = "ASC" if str(order).lower() == "asc" else "DESC"
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        offset = max(0, int(offset))
+        where, args = self._where(**filters)
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM samples{where}", args).fetchone()[0]
+        rows = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM samples{where} "
+                            f"ORDER BY {sort} {direction}, id {direction} LIMIT ? OFFSET ?",
+                            args + [limit, offset]).fetchall()
+        items = []
+        for r in rows:
+            item = dict(r)
+            item["params"] = json.loads(item["params"]) if item["params"] else {}
+            items.append(item)
+        return {"total": total, "limit": limit, "offset": offset, "items": items}
+
+    def trend(self, bucket="day", **filters):
+        """
+        Médias por dia/semana/mês das amostras que passam nos filtros, em ordem cronológica.
+        Agrega primeiro por dia (índice samples_day) e depois junta os dias do bucket,
+        com médias ponderadas pelo número de amostras de cada dia.
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"Agrupamento inválido: {bucket} (use {', '.join(BUCKETS)})")
+        where, args = self._where(**filters)
+        per_day = [f"{expr} AS {name}" for name, expr, _ in _TREND]
+        per_bucket = [f"{expr} AS {name}" for name, _, expr in _TREND]
+        for name in _TREND_MEANS:
+            per_day += [f"SUM({name}) AS sum_{name}", f"COUNT({name}) AS count_{name}"]
+            per_bucket.append(f"SUM(sum_{name}) / NULLIF(SUM(count_{name}), 0) AS {name}")
+        rows = self._conn().execute(
+            f"SELECT strftime('{BUCKETS[bucket]}', day) AS bucket, MIN(day) AS first_day, {', '.join(per_bucket)} "
+            f"FROM (SELECT day, {', '.join(per_day)} FROM samples{where} GROUP BY day) "
+            "GROUP BY bucket ORDER BY first_day", args).fetchall()
+        return {"bucket": bucket, "buckets": [dict(r) for r in rows]}
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+
+    def rebuild(self, root):
+        """
+        Indexa todos os relatórios JSON sob root (data = modificação do arquivo); retorna quantos.
+        Os nomes variam (report.json do servidor e do batch.py, <output>.json do main.py):
+        vale todo .json com summary e params. A amostra é a gravada no relatório; nos
+        relatórios antigos, sem ela, o nome do arquivo ou, para report.json, o do diretório.
+        """
+        n = 0
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        report = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if not isinstance(report, dict) or "summary" not in report or "params" not in report:
+                    continue  # outros JSON (ex.: manifest.json dos artefatos)
+                fallback = os.path.basename(dirpath) if name == "report.json" else os.path.splitext(name)[0]
+                self.record(path, report, sample=report.get("sample") or fallback,
+                            created_at=os.path.getmtime(path))
+                n += 1
+        return n
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Índice do histórico de amostras")
+    sub = p.add_subparsers(dest="command", required=True)
+    rb = sub.add_parser("rebuild", help="Indexa os relatórios JSON de um diretório")
+    rb.add_argument("root")
+    rb.add_argument("--db", default="reports/history.sqlite")
+    q = sub.add_parser("query", help="Lista as amostras que passam nos filtros")
+    q.add_argument("--db", default="reports/history.sqlite")
+    q.add_argument("--since")
+    q.add_argument("--until")
+    q.add_argument("--sample", help="Trecho do nome da amostra")
+    q.add_argument("--tracker")
+    q.add_argument("--sort", default="created_at", choices=SORTABLE)
+    q.add_argument("--limit", type=int, default=50)
+    q.add_argument("--trend", choices=sorted(BUCKETS), help="Médias por dia/semana/mês em vez da lista")
+    args = p.parse_args(argv)
+
+    index = HistoryIndex(args.db)
+    if args.command == "rebuild":
+        t0 = time.perf_counter()
+        n = index.rebuild(args.root)
+        print(f"{n} relatórios indexados em {time.perf_counter() - t0:.1f}s ({args.db})")
+        return 0
+    filters = dict(since=args.since, until=args.until, sample=args.sample, tracker=args.tracker)
+    if args.trend:
+        print(json.dumps(index.trend(args.trend, **filters), indent=2, ensure_ascii=False))
+    else:
+        print(json.dumps(index.query(sort=args.sort, limit=args.limit, **filters), indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+"""
+inference.py
+Backends de inferência usados por SpermDetector (detect.py).
+
+Interface de um backend:
+    backend(images, conf) -> [array (n, 5) [x1, y1, x2, y2, score] por imagem]
+    backend.warmup()
+    - images: lista de frames BGR (uint8, HxWx3), todos do mesmo tamanho
+
+Backends (INFERENCE_BACKENDS):
+- "torch": o modelo PyTorch via ultralytics.YOLO (referência)
+- "onnx": grafo exportado para ONNX Runtime, com lote dinâmico; pensado para
+  servidores sem GPU. Pré e pós-processamento (letterbox, NMS) são os mesmos do
+  ultralytics, feitos aqui em NumPy/OpenCV
+- "onnx-fp16": idem, pesos em fp16 (metade do tamanho; em CPU a velocidade fica perto da do fp32)
+- "onnx-int8": idem, quantização estática int8 (QDQ), calibrada com frames de um
+  vídeo de amostra; precisa ser exportado antes com `python -m src.inference export`.
+  O final da cabeça de detecção fica em float (ver _head_nodes); scores perto de
+  `conf` podem mudar de lado, por isso a conferência abaixo antes de adotar o modelo
+
+Os modelos exportados ficam ao lado do .pt (ex.: yolov8n.pt -> yolov8n.fp32.onnx)
+e são refeitos quando o .pt for mais novo.
+
+Conferência de acurácia contra a referência PyTorch, num trecho de vídeo:
+python -m src.inference check --weights models/yolo/yolov8n.pt --backend onnx-int8 --video amostra.mp4
+python -m src.inference export --weights models/yolo/yolov8n.pt --precision int8 --calibration amostra.mp4
+"""
+
+import argparse
+import importlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from src.tiling import nms
+from src.trackers import greedy_match
+
+ONNX_PRECISIONS = ("fp32", "fp16", "int8")
+# deslocamento por classe no NMS por classe (maior que qualquer coordenada)
+_MAX_WH = 7680
+
+
+class TorchBackend:
+    def __init__(self, weights, device=None):
+        from ultralytics import YOLO
+        self.model = YOLO(weights)
+        if device is not None:
+            self.model.to(device)
+
+    def __call__(self, images, conf=0.25):
+        return _boxes_to_arrays(self.model(images, conf=conf, verbose=False))
+
+    def warmup(self, imgsz=640):
+        self.model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)
+
+
+class OnnxBackend:
+    """
+    precision: "fp32", "fp16" ou "int8" (ver export_onnx)
+    imgsz: lado maior da entrada do modelo; frames menores também são ampliados, como no ultralytics
+    iou, max_det: NMS (mesmos padrões do ultralytics)
+    """
+
+    def __init__(self, weights, device=None, precision="fp32", imgsz=640, iou=0.7, max_det=300):
+        import onnxruntime as ort
+        self.path = onnx_path(weights, precision)
+        if precision == "int8":
+            if not _is_fresh(self.path, weights):
+                raise FileNotFoundError(
+                    f"Modelo int8 não encontrado ou desatualizado: {self.path}. A quantização precisa de frames "
+                    f"de calibração; exporte antes com: python -m src.inference export --weights {weights} "
+                    f"--precision int8 --calibration <vídeo>")
+        else:
+            export_onnx(weights, precision, imgsz=imgsz)
+        providers = ["CPUExecutionProvider"]
+        if device is not None and str(device).startswith("cuda") and \
+                "CUDAExecutionProvider" in ort.get_available_providers():
+            providers.insert(0, "CUDAExecutionProvider")
+        self.session = ort.InferenceSession(self.path, providers=providers)
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        # exportação sem lote dinâmico: uma imagem por chamada
+        self.max_batch = inp.shape[0] if isinstance(inp.shape[0], int) else None
+        self.imgsz = int(imgsz)
+        self.iou = float(iou)
+        self.max_det = int(max_det)
+
+    def __call__(self, images, conf=0.25):
+        if not images:
+            return []
+        h, w = images[0].shape[:2]
+        batch, shape = preprocess(images, self.imgsz)
+        step = self.max_batch or len(batch)
+        outputs = [self.session.run(None, {self.input_name: batch[i:i + step]})[0]
+                   for i in range(0, len(batch), step)]
+        out = np.concatenate(outputs) if len(outputs) > 1 else outputs[0]
+        return [postprocess(pred, conf, self.iou, self.max_det, shape, (h, w)) for pred in out]
+
+    def warmup(self):
+        self([np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)])
+
+
+INFERENCE_BACKENDS = {
+    "torch": lambda weights, device: TorchBackend(weights, device),
+    "onnx": lambda weights, device: OnnxBackend(weights, device, precision="fp32"),
+    "onnx-fp16": lambda weights, device: OnnxBackend(weights, device, precision="fp16"),
+    "onnx-int8": lambda weights, device: OnnxBackend(weights, device, precision="int8"),
+}
+
+
+def make_inference_backend(name, weights, device=None):
+    """
+    name: um dos INFERENCE_BACKENDS ou "pacote.modulo:Classe", um backend de fora do
+    registro construído como Classe(weights, device) (ex.: o detector simulado de
+    benchmarks/stub_detector.py). A forma com ":" também vale nos processos filhos
+    de shard.py, que não veem backends registrados em tempo de execução.
+    """
+    if name in INFERENCE_BACKENDS:
+        return INFERENCE_BACKENDS[name](weights, device)
+    if ":" in name:
+        module, _, attr = name.partition(":")
+        return getattr(importlib.import_module(module), attr)(weights, device)
+    raise ValueError(f"Backend de inferência desconhecido: {name} (opções: {', '.join(INFERENCE_BACKENDS)})")
+
+
+def _boxes_to_arrays(results):
+    """
+    Converte as caixas de todos os resultados de um lote de uma só vez.
+    Cada linha de boxes.data é [x1, y1, x2, y2, conf, cls]; devolvemos as 5 primeiras colunas.
+    """
+    datas = [r.boxes.data if r.boxes is not None else None for r in results]
+    sizes = [0 if d is None else len(d) for d in datas]
+    datas = [d for d in datas if d is not None and len(d) > 0]
+    if not datas:
+        return [np.empty((0, 5), dtype=np.float32) for _ in results]
+    if hasattr(datas[0], "cpu"):
+        import torch
+        stacked = torch.cat(datas).cpu().numpy()
+    else:
+        stacked = np.concatenate([np.asarray(d) for d in datas])
+    return np.split(stacked[:, :5], np.cumsum(sizes)[:-1])
+
+
+# ---------------------------------------------------------------- pré/pós-processamento
+
+def letterbox_shape(height, width, imgsz=640, stride=32):
+    """(escala, (altura, largura) da entrada, (pad_topo, pad_esquerda)), como o LetterBox do ultralytics."""
+    r = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * r)), int(round(height * r))
+    # entrada retangular: só o necessário para chegar a um múltiplo do stride
+    dw, dh = (imgsz - new_w) % stride / 2, (imgsz - new_h) % stride / 2
+    top, left = int(round(dh - 0.1)), int(round(dw - 0.1))
+    bottom, right = int(round(dh + 0.1)), int(round(dw + 0.1))
+    return r, (new_h + top + bottom, new_w + left + right), (top, left)
+
+
+def preprocess(images, imgsz=640):
+    """Lista de frames BGR do mesmo tamanho -> (lote float32 NCHW RGB 0..1, forma da entrada)."""
+    h, w = images[0].shape[:2]
+    r, (in_h, in_w), (top, left) = letterbox_shape(h, w, imgsz)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    batch = np.full((len(images), in_h, in_w, 3), 114, dtype=np.uint8)
+    for i, img in enumerate(images):
+        if (new_h, new_w) != (h, w):
+            img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        batch[i, top:top + new_h, left:left + new_w] = img
+    batch = batch[..., ::-1].transpose(0, 3, 1, 2)  # BGR -> RGB, NHWC -> NCHW
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0, (in_h, in_w)
+
+
+def postprocess(pred, conf, iou, max_det, input_shape, image_shape):
+    """
+    pred: saída do YOLOv8 para uma imagem, (4 + n_classes, n_âncoras) com [cx, cy, w, h, scores...]
+    Retorna (n, 5) [x1, y1, x2, y2, score] nas coordenadas do frame original, em ordem de score.
+    """
+    pred = np.asarray(pred, dtype=np.float32)
+    scores = pred[4:]
+    cls = scores.argmax(axis=0)
+    score = scores[cls, np.arange(scores.shape[1])]
+    keep = score > conf
+    if not keep.any():
+        return np.empty((0, 5), dtype=np.float32)
+    xywh, cls, score = pred[:4, keep].T, cls[keep], score[keep]
+    boxes = np.empty((len(score), 5), dtype=np.float32)
+    boxes[:, 0:2] = xywh[:, 0:2] - xywh[:, 2:4] / 2
+    boxes[:, 2:4] = xywh[:, 0:2] + xywh[:, 2:4] / 2
+    boxes[:, 4] = score
+
+    # NMS por classe: caixas de classes diferentes são afastadas e nunca se sobrepõem
+    shifted = boxes.copy()
+    shifted[:, :4] += (cls * _MAX_WH)[:, None]
+    kept = nms(shifted, iou)
+    kept = kept[np.argsort(-boxes[kept, 4], kind="stable")][:max_det]
+    boxes = boxes[kept]
+
+    # desfaz o letterbox
+    h, w = image_shape
+    in_h, in_w = input_shape
+    gain = min(in_h / h, in_w / w)
+    pad_x = round((in_w - w * gain) / 2 - 0.1)
+    pad_y = round((in_h - h * gain) / 2 - 0.1)
+    boxes[:, [0, 2]] = np.clip((boxes[:, [0, 2]] - pad_x) / gain, 0, w)
+    boxes[:, [1, 3]] = np.clip((boxes[:, [1, 3]] - pad_y) / gain, 0, h)
+    return boxes
+
+
+# ---------------------------------------------------------------- exportação
+
+def onnx_path(weights, precision="fp32"):
+    """Modelo exportado ao lado do .pt: pesos.pt -> pesos.<precision>.onnx."""
+    if precision not in ONNX_PRECISIONS:
+        raise ValueError(f"Precisão desconhecida: {precision} (opções: {', '.join(ONNX_PRECISIONS)})")
+    return os.path.splitext(weights)[0] + f".{precision}.onnx"
+
+
+def _is_fresh(path, weights):
+    return os.path.exists(path) and (not os.path.exists(weights)
+                                     or os.path.getmtime(path) >= os.path.getmtime(weights))
+
+
+def export_onnx(weights, precision="fp32", imgsz=640, calibration=None, calibration_frames=32, force=False):
+    """
+    Exporta os pesos (se preciso) e retorna o caminho do .onnx.
+    int8 exige calibration: vídeo de amostra de onde saem até calibration_frames frames.
+    A exportação é feita num diretório temporário e movida no fim, para que processos
+    concorrentes (ex.: shards) nunca vejam um arquivo pela metade.
+    """
+    path = onnx_path(weights, precision)
+    if not force and _is_fresh(path, weights):
+        return path
+    if precision == "int8" and calibration is None:
+        raise ValueError("A quantização int8 precisa de um vídeo de calibração (calibration).")
+    with tempfile.TemporaryDirectory(prefix="spermai_export_") as tmp:
+        fp32 = os.path.join(tmp, "model.fp32.onnx")
+        if precision != "fp32" and _is_fresh(onnx_path(weights, "fp32"), weights):
+            shutil.copyfile(onnx_path(weights, "fp32"), fp32)
+        else:
+            from ultralytics import YOLO
+            local = os.path.join(tmp, "model.pt")
+            shutil.copyfile(weights, local)
+            exported = YOLO(local).export(format="onnx", dynamic=True, imgsz=imgsz, verbose=False)
+            os.replace(exported, fp32)
+        out = os.path.join(tmp, "model.onnx")
+        if precision == "fp32":
+            out = fp32
+        elif precision == "fp16":
+            import onnx
+            from onnxruntime.transformers.float16 import convert_float_to_float16
+            # entrada e saída continuam float32: o pré/pós-processamento não muda
+            onnx.save(convert_float_to_float16(onnx.load(fp32), keep_io_types=True), out)
+        else:
+            _quantize_int8(fp32, out, _calibration_batches(calibration, calibration_frames, imgsz))
+        os.replace(out, path + ".tmp")
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def _calibration_batches(video_path, n_frames, imgsz):
+    """Frames espalhados pelo vídeo, já pré-processados como na inferência."""
+    from src.detect import video_frame_count
+    total = video_frame_count(video_path) or n_frames
+    wanted = set(np.linspace(0, max(total - 1, 0), n_frames).astype(int).tolist())
+    cap = cv2.VideoCapture(video_path)
+    batches = []
+    frame_id = 0
+    try:
+        while len(batches) < len(wanted):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame_id in wanted:
+                batches.append(preprocess([frame], imgsz)[0])
+            frame_id += 1
+    finally:
+        cap.release()
+    if not batches:
+        raise ValueError(f"Nenhum frame lido do vídeo de calibração: {video_path}")
+    return batches
+
+
+def _head_nodes(model):
+    """
+    Nós do final da cabeça de detecção, que ficam em float na quantização: a saída junta
+    coordenadas (0..640) e scores (0..1) num só tensor, e em uint8 os scores se perdem.
+    Dentro da cabeça só os dois primeiros blocos de cada ramo (cv2/cv3) são quantizados.
+    """
+    producer = {out: node.name for node in model.graph.node for out in node.output}
+    last = producer.get(model.graph.output[0].name, "")
+    match = re.match(r"(/model\.\d+/)", last)
+    if match is None:
+        return []
+    branch = re.compile(r"/cv[23]\.\d+/cv[23]\.\d+\.[01]/")
+    return [node.name for node in model.graph.node
+            if node.name.startswith(match.group(1)) and not branch.search(node.name)]
+
+
+def _quantize_int8(src, dst, batches):
+    """Quantização estática (QDQ): pesos int8 por canal, ativações uint8 calibradas nos frames."""
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = ort.InferenceSession(src, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._it = iter(batches)
+
+        def get_next(self):
+            batch = next(self._it, None)
+            return None if batch is None else {input_name: batch}
+
+    quantize_static(src, dst, Reader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    nodes_to_exclude=_head_nodes(onnx.load(src)))
+
+
+# ---------------------------------------------------------------- conferência de acurácia
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """
+    Associa as caixas (n, 5) de dois backends no mesmo frame (gulosa por IoU).
+    Retorna (índices na referência, índices no candidato, IoU de cada par).
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    if len(reference) == 0 or len(candidate) == 0:
+        return empty, empty, np.zeros(0)
+    a, b = np.asarray(reference, dtype=np.float64)[:, None, :4], np.asarray(candidate, dtype=np.float64)[None, :, :4]
+    inter = (np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+             * np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None))
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    iou = inter / np.maximum(area_a + area_b - inter, 1e-9)
+    ri, ci = np.nonzero(iou >= iou_threshold)
+    if len(ri) == 0:
+        return empty, empty, np.zeros(0)
+    dist = 1.0 - iou[ri, ci]
+    order = np.argsort(dist, kind="stable")
+    ri, ci = greedy_match(ri[order], ci[order], dist[order])
+    return ri, ci, iou[ri, ci]
+
+
+def check_backend(weights, backend, video_path, max_frames=50, conf=0.25, batch_size=4, iou_threshold=0.5,
+                  device=None):
+    """
+    Roda a referência ("torch") e o backend nos mesmos frames e compara as detecções.
+    Retorna dict com recall/precisão do backend em relação à referência, IoU médio,
+    diferença média de score, contagens e tempo por frame de cada um.
+    """
+    from src.detect import _read_frames
+    frames = [frame for _, frame, _ in _read_frames(video_path, max_frames=max_frames)]
+    if not frames:
+        raise ValueError(f"Nenhum frame lido de {video_path}")
+    results, seconds = {}, {}
+    for name in ("torch", backend):
+        model = make_inference_backend(name, weights, device)
+        model(frames[:1], conf=conf)  # aquecimento fora da medição
+        t0 = time.perf_counter()
+        results[name] = [b for i in range(0, len(frames), batch_size)
+                         for b in model(frames[i:i + batch_size], conf=conf)]
+        seconds[name] = time.perf_counter() - t0
+
+    n_ref = n_cand = n_matched = 0
+    ious, score_diffs = [], []
+    for ref, cand in zip(results["torch"], results[backend]):
+        ri, ci, iou = match_detections(ref, cand, iou_threshold)
+        n_ref, n_cand, n_matched = n_ref + len(ref), n_cand + len(cand), n_matched + len(ri)
+        ious.append(iou)
+        score_diffs.append(np.abs(np.asarray(ref)[ri, 4] - np.asarray(cand)[ci, 4]))
+    ious, score_diffs = np.concatenate(ious), np.concatenate(score_diffs)
+    return {
+        "backend": backend,
+        "frames": len(frames),
+        "reference_detections": n_ref,
+        "backend_detections": n_cand,
+        "recall": round(n_matched / n_ref, 4) if n_ref else 1.0,
+        "precision": round(n_matched / n_cand, 4) if n_cand else 1.0,
+        "mean_iou": round(float(ious.mean()), 4) if len(ious) else None,
+        "mean_score_diff": round(float(score_diffs.mean()), 4) if len(score_diffs) else None,
+        "reference_ms_per_frame": round(1000 * seconds["torch"] / len(frames), 2),
+        "backend_ms_per_frame": round(1000 * seconds[backend] / len(frames), 2),
+        "speedup": round(seconds["torch"] / seconds[backend], 2) if seconds[backend] > 0 else None,
+    }
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Exportação e conferência dos backends de inferência")
+    sub = p.add_subparsers(dest="command", required=True)
+    ex = sub.add_parser("export", help="Exporta os pesos para ONNX (ao lado do .pt)")
+    ex.add_argument("--weights", default="models/yolo/yolov8n.pt")
+    ex.add_argument("--precision", default="fp32", choices=ONNX_PRECISIONS)
+    ex.add_argument("--calibration", default=None, help="Vídeo de amostra para calibrar a quantização int8")
+    ex.add_argument("--calibration_frames", type=int, default=32)
+    ex.add_argument("--imgsz", type=int, default=640)
+    ex.add_argument("--force", action="store_true", help="Exporta de novo mesmo se já existir")
+    ck = sub.add_parser("check", help="Compara as detecções de um backend com a referência PyTorch")
+    ck.add_argument("--weights", default="models/yolo/yolov8n.pt")
+    ck.add_argument("--backend", default="onnx", choices=sorted(INFERENCE_BACKENDS))
+    ck.add_argument("--video", required=True, help="Trecho de vídeo de amostra")
+    ck.add_argument("--max_frames", type=int, default=50)
+    ck.add_argument("--conf", type=float, default=0.25)
+    ck.add_argument("--min_recall", type=float, default=0.95, help="Recall mínimo aceito (sai com código 1 abaixo)")
+    ck.add_argument("--min_precision", type=float, default=0.95, help="Precisão mínima aceita")
+    args = p.parse_args(argv)
+
+    if args.command == "export":
+        path = export_onnx(args.weights, args.precision, imgsz=args.imgsz, calibration=args.calibration,
+                           calibration_frames=args.calibration_frames, force=args.force)
+        print(f"Modelo exportado: {path}")
+        return 0
+    report = check_backend(args.weights, args.backend, args.video, max_frames=args.max_frames, conf=args.conf)
+    for k, v in report.items():
+        print(f"{k}: {v}")
+    ok = report["recall"] >= args.min_recall and report["precision"] >= args.min_precision
+    print("OK" if ok else "Detecções divergem da referência além do tolerado.")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+jobs.py
+Fila de jobs local (sem broker externo) para a análise de vídeos.
+- JobManager: pool de threads com limite de concorrência e de jobs na fila
+- Job: estado, etapa e progresso por frame de uma análise; suporta cancelamento
+
+A função do job recebe o próprio Job como primeiro argumento e deve chamar
+job.report(...) periodicamente; é ali que o cancelamento é verificado.
+job.publish(...) expõe saídas parciais antes do fim (ex.: o vídeo em gravação).
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, ERROR, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.status = QUEUED
+        self.stage = None
+        self.frame = 0
+        self.total_frames = None
+        self.result = None
+        self.outputs = {}
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0
+        self._cancel = threading.Event()
+        self._cond = threading.Condition()
+
+    def _touch(self, **fields):
+        with self._cond:
+            for k, v in fields.items():
+                setattr(self, k, v)
+            self.version += 1
+            self._cond.notify_all()
+
+    def report(self, stage=None, frame=None, total_frames=None):
+        """Atualiza etapa/progresso. Levanta JobCancelled se o job foi cancelado."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        fields = {}
+        if stage is not None and stage != self.stage:
+            fields["stage"] = stage
+        if frame is not None:
+            fields["frame"] = frame
+        if total_frames is not None:
+            fields["total_frames"] = total_frames
+        if fields:
+            self._touch(**fields)
+
+    def publish(self, **outputs):
+        """Disponibiliza saídas parciais (ficam em to_dict()["outputs"])."""
+        self._touch(outputs=dict(self.outputs, **outputs))
+
+    def cancel(self):
+        self._cancel.set()
+        if self.status == QUEUED:
+            self._touch(status=CANCELLED, finished_at=time.time())
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def wait_for_change(self, version, timeout=None):
+        """Bloqueia até que version mude (ou timeout); retorna a versão atual."""
+        with self._cond:
+            if self.version == version:
+                self._cond.wait(timeout)
+            return self.version
+
+    def to_dict(self):
+        with self._cond:
+            progress = None
+            if self.total_frames:
+                progress = min(1.0, self.frame / float(self.total_frames))
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "frame": self.frame,
+                "total_frames": self.total_frames,
+                "progress": progress,
+                "result": self.result,
+                "outputs": self.outputs,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobManager:
+    """
+    max_workers: quantos jobs rodam ao mesmo tempo
+    max_queued: quantos jobs podem esperar na fila (além dos que estão rodando)
+    keep_finished: quantos jobs encerrados continuam consultáveis
+    """
+
+    def __init__(self, max_workers=2, max_queued=16, keep_finished=200):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status in (QUEUED, RUNNING))
+            if pending >= self.max_workers + self.max_queued:
+                raise QueueFull("Fila de análises cheia, tente novamente em instantes.")
+            job = Job()
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def count(self, status):
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == status)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and job.status not in FINISHED_STATES:
+            job.cancel()
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            return
+        job._touch(status=RUNNING, started_at=time.time())
+        try:
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            job._touch(status=CANCELLED, finished_at=time.time())
+        except Exception as e:
+            job._touch(status=ERROR, error=str(e), finished_at=time.time())
+        else:
+            job._touch(status=DONE, result=result, finished_at=time.time())
+
+    def _prune(self):
+        finished = [jid for jid, j in self._jobs.items() if j.status in FINISHED_STATES]
+        for jid in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[jid]
@@ -0,0 +1,403 @@
+"""
+live.py
+Análise ao vivo de qualquer fonte do cv2.VideoCapture (câmera, URL RTSP/HTTP ou
+arquivo reproduzido no fps nativo, para testes), com métricas móveis.
+
+Política de descarte (latência limitada):
+- LatestFrameReader lê a fonte numa thread própria e guarda só o frame mais novo;
+  frames que chegam enquanto o detector está ocupado são sobrescritos (descartados)
+- um frame que já está mais velho que latency_budget_ms quando o detector fica livre
+  também é descartado, sem inferência
+- frames descartados avançam o rastreador sem detecções (boxes None), e as trilhas
+  são interpoladas neles (ver SpermTracker.update), então o tempo das métricas
+  continua sendo o da fonte. A interpolação não recupera o deslocamento quadro a
+  quadro: com muitos descartes, VCL e linearidade (e, com elas, motilidade
+  progressiva e vigor) não são comparáveis às de uma análise de todos os frames
+  (ver pipeline.PER_FRAME_METRICS) e servem para acompanhar a tendência da amostra
+Assim o atraso de ponta a ponta (captura -> métricas atualizadas) fica limitado a
+latency_budget_ms + o tempo de processamento de um frame, e é medido frame a frame.
+
+Métricas móveis: motilidade progressiva, vigor e concentração das trilhas nos
+últimos window_s segundos, recalculadas a cada publish_interval segundos e
+publicadas em LiveSession.state (o app.py as envia por Server-Sent Events).
+
+Uso pela linha de comando:
+python -m src.live --source data/raw_videos/sample.mp4 --weights models/yolo/yolov8n.pt --latency_budget_ms 200
+python -m src.live --source 0 --lag_log lag.csv     # câmera 0; atraso de cada frame em CSV
+"""
+
+import argparse
+import collections
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from src.concentration import estimate_concentration
+from src.pipeline import summarize, track_metrics
+from src.track import TrackTable
+
+STARTING = "starting"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+STOPPED = "stopped"
+FINISHED_STATES = (DONE, ERROR, STOPPED)
+
+
+def open_source(source):
+    """Índice de câmera ("0") ou caminho/URL -> cv2.VideoCapture aberto."""
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        raise ValueError(f"Não foi possível abrir a fonte de vídeo: {source}")
+    return cap
+
+
+class LatestFrameReader:
+    """
+    Lê a fonte numa thread e mantém só o frame mais novo (frame_id, frame, t_captura).
+    realtime=True reproduz arquivos no fps nativo (câmeras já entregam no ritmo delas).
+    """
+
+    def __init__(self, source, realtime=False, fps=None):
+        self.cap = open_source(source)
+        self.fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+        self.realtime = realtime
+        self.frames_read = 0
+        self.overwritten = 0
+        self.ended = False
+        self.error = None
+        self._latest = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="live-reader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        t0 = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if self.realtime:
+                    delay = t0 + self.frames_read / self.fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                with self._cond:
+                    if self._latest is not None:
+                        self.overwritten += 1
+                    self._latest = (self.frames_read, frame, time.monotonic())
+                    self.frames_read += 1
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.cap.release()
+            with self._cond:
+                self.ended = True
+                self._cond.notify_all()
+
+    def get(self, timeout=1.0):
+        """Retorna o frame mais novo ainda não entregue, ou None (timeout ou fim da fonte)."""
+        with self._cond:
+            if self._latest is None and not self.ended:
+                self._cond.wait(timeout)
+            item, self._latest = self._latest, None
+            return item
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+
+class RollingMetrics:
+    """Métricas das trilhas com pontos nos últimos window_frames frames."""
+
+    def __init__(self, fps, microns_per_pixel, drop_volume_ul, window_frames, min_points=5):
+        self.fps = fps
+        self.microns_per_pixel = microns_per_pixel
+        self.drop_volume_ul = drop_volume_ul
+        self.window_frames = int(window_frames)
+        self.min_points = int(min_points)
+        self._finished = collections.deque()
+
+    def add_finished(self, table):
+        if len(table):
+            self._finished.append((int(table.frame.max()), table))
+
+    def compute(self, active, frame_id):
+        """active: TrackTable das trilhas ainda em andamento; frame_id: frame mais recente."""
+        start = frame_id - self.window_frames + 1
+        while self._finished and self._finished[0][0] < start:
+            self._finished.popleft()
+        table = TrackTable.concat([t for _, t in self._finished] + [active])
+        table = table.take(table.frame >= start).sorted()
+        # frames sem nenhum ponto (ex.: os últimos descartados, ainda não interpolados) não entram na média
+        counts = np.bincount(table.frame - start) if len(table) else np.zeros(0, dtype=np.int64)
+        counts = counts[counts > 0]
+        track_ids, points, offsets = table.groups()
+        # só as trilhas com pontos suficientes entram nas métricas de movimento
+        lengths = np.diff(offsets)
+        keep = lengths >= self.min_points
+        import pandas as pd
+        df = pd.DataFrame()
+        if keep.any():
+            offsets = np.concatenate([[0], np.cumsum(lengths[keep])])
+            df = pd.DataFrame(track_metrics(track_ids[keep], points[np.repeat(keep, lengths)], offsets,
+                                            fps=self.fps, microns_per_pixel=self.microns_per_pixel))
+        return {
+            "summary": summarize(df),
+            "concentration": estimate_concentration(counts.tolist(), self.drop_volume_ul),
+            "cells_per_frame": round(float(counts.mean()), 2) if len(counts) else 0.0,
+        }
+
+
+class LiveSession:
+    """
+    Uma análise ao vivo: lê `source`, detecta, rastreia e publica o estado em `state`.
+    detector: SpermDetector (ou compatível com detect_frames); tracker: SpermTracker
+    latency_budget_ms: frames mais velhos que isso ao chegar no detector são descartados
+    window_s: janela das métricas móveis; publish_interval: segundos entre publicações
+    """
+
+    def __init__(self, detector, tracker, source, microns_per_pixel, drop_volume_ul, fps=None,
+                 realtime=False, latency_budget_ms=200.0, window_s=10.0, publish_interval=0.5,
+                 max_frames=None, on_frame=None, session_id=None):
+        self.id = session_id
+        self.detector = detector
+        self.tracker = tracker
+        self.source = source
+        self.latency_budget_s = float(latency_budget_ms) / 1000.0
+        self.publish_interval = float(publish_interval)
+        self.max_frames = max_frames
+        self.on_frame = on_frame
+        self.reader = LatestFrameReader(source, realtime=realtime, fps=fps)
+        self.fps = self.reader.fps
+        self.rolling = RollingMetrics(self.fps, microns_per_pixel, drop_volume_ul,
+                                      window_frames=max(1, int(round(window_s * self.fps))))
+        self.window_s = float(window_s)
+        self.processed = 0
+        self.late = 0
+        self.lags = collections.deque(maxlen=max(1, int(window_s * self.fps)))
+        self.recent = collections.deque(maxlen=50)
+        self.state = {"status": STARTING, "id": session_id}
+        self.version = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------ estado publicado
+
+    def _publish(self, **fields):
+        with self._cond:
+            self.state = dict(self.state, **fields)
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait_for_change(self, version, timeout=None):
+        """Bloqueia até que version mude (ou timeout); retorna a versão atual."""
+        with self._cond:
+            if self.version == version:
+                self._cond.wait(timeout)
+            return self.version
+
+    def to_dict(self):
+        with self._cond:
+            return dict(self.state)
+
+    # ------------------------------------------------------------ execução
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=f"live-{self.id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        t0 = time.monotonic()
+        self.reader.start()
+        self._publish(status=RUNNING, source=str(self.source), fps=self.fps,
+                      latency_budget_ms=self.latency_budget_s * 1000, window_s=self.window_s)
+        last_publish = 0.0
+        next_frame = 0
+        try:
+            while not self._stop.is_set():
+                item = self.reader.get(timeout=0.5)
+                if item is None:
+                    if self.reader.ended:
+                        break
+                    continue
+                frame_id, frame, captured = item
+                # frames descartados desde o último processado: o rastreador avança sem detecções
+                for skipped in range(next_frame, frame_id):
+                    self.tracker.update(skipped, None)
+                next_frame = frame_id + 1
+                if time.monotonic() - captured > self.latency_budget_s:
+                    self.late += 1
+                    self.tracker.update(frame_id, None)
+                else:
+                    boxes = self.detector.detect_frames([frame])[0]
+                    points = self.tracker.update(frame_id, boxes)
+                    self.rolling.add_finished(self.tracker.pop_finished(frame_id))
+                    self.processed += 1
+                    lag = time.monotonic() - captured
+                    self.lags.append(lag)
+                    self.recent.append((frame_id, round(lag * 1000, 1)))
+                    if self.on_frame is not None:
+                        self.on_frame(frame_id, lag, len(boxes), points)
+                now = time.monotonic()
+                if now - last_publish >= self.publish_interval:
+                    last_publish = now
+                    self._publish(**self._snapshot(frame_id, now - t0))
+                if self.max_frames and frame_id + 1 >= self.max_frames:
+                    break
+            if self.reader.error is not None:
+                raise self.reader.error
+            status = STOPPED if self._stop.is_set() else DONE
+            self._publish(status=status, **self._snapshot(next_frame - 1, time.monotonic() - t0))
+        except Exception as e:
+            self._publish(status=ERROR, error=str(e))
+        finally:
+            self.reader.stop()
+
+    def _snapshot(self, frame_id, elapsed):
+        frame_id = max(frame_id, 0)
+        lags_ms = np.asarray(self.lags, dtype=np.float64) * 1000
+        read = self.reader.frames_read
+        metrics = self.rolling.compute(self.tracker.active_table(), frame_id)
+        return {
+            "frame": frame_id,
+            "elapsed_s": round(elapsed, 2),
+            "frames_read": read,
+            "processed": self.processed,
+            "dropped": read - self.processed,
+            "late": self.late,
+            "fps_in": round(read / elapsed, 2) if elapsed > 0 else None,
+            "fps_out": round(self.processed / elapsed, 2) if elapsed > 0 else None,
+            "lag_ms": {
+                "last": round(float(lags_ms[-1]), 1) if len(lags_ms) else None,
+                "p50": round(float(np.percentile(lags_ms, 50)), 1) if len(lags_ms) else None,
+                "p95": round(float(np.percentile(lags_ms, 95)), 1) if len(lags_ms) else None,
+                "max": round(float(lags_ms.max()), 1) if len(lags_ms) else None,
+            },
+            "recent_lags": list(self.recent),
+            **metrics,
+        }
+
+
+class SessionLimit(Exception):
+    pass
+
+
+class LiveSessionRegistry:
+    """
+    Sessões ao vivo do servidor, consultadas e criadas por várias threads de
+    requisição; como em jobs.JobManager, todo acesso passa pelo lock, e a checagem
+    do limite e o registro da sessão nova são uma única operação.
+    max_running: sessões em andamento ao mesmo tempo (cada uma ocupa o modelo continuamente)
+    keep_finished: quantas sessões encerradas continuam consultáveis
+    """
+
+    def __init__(self, max_running=1, keep_finished=4):
+        self.max_running = max_running
+        self.keep_finished = keep_finished
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _running(self):
+        return sum(1 for s in self._sessions.values() if s.to_dict()["status"] not in FINISHED_STATES)
+
+    def full(self):
+        with self._lock:
+            return self._running() >= self.max_running
+
+    def start(self, session):
+        """Registra e inicia a sessão; SessionLimit se já há max_running em andamento."""
+        with self._lock:
+            if self._running() >= self.max_running:
+                raise SessionLimit("Já há uma análise ao vivo em andamento; pare-a antes de iniciar outra.")
+            finished = [k for k, s in self._sessions.items() if s.to_dict()["status"] in FINISHED_STATES]
+            for k in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self._sessions[k]
+            self._sessions[session.id] = session.start()
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+
+def main(argv=None):
+    from src.detect import SpermDetector
+    from src.inference import INFERENCE_BACKENDS
+    from src.track import SpermTracker
+    from src.trackers import TRACKER_BACKENDS
+
+    p = argparse.ArgumentParser(description="Análise ao vivo com métricas móveis")
+    p.add_argument("--source", required=True, help="Índice da câmera, URL ou arquivo de vídeo")
+    p.add_argument("--weights", default="models/yolo/yolov8n.pt")
+    p.add_argument("--backend", default="torch", choices=sorted(INFERENCE_BACKENDS))
+    p.add_argument("--conf", type=float, default=0.25)
+    p.add_argument("--tracker", default="centroid", choices=sorted(TRACKER_BACKENDS))
+    p.add_argument("--microns_per_pixel", type=float, default=0.5)
+    p.add_argument("--drop_volume_ul", type=float, default=2.0)
+    p.add_argument("--fps", type=float, default=None, help="FPS da fonte (padrão: o informado por ela)")
+    p.add_argument("--latency_budget_ms", type=float, default=200.0)
+    p.add_argument("--window_s", type=float, default=10.0, help="Janela das métricas móveis (s)")
+    p.add_argument("--no_realtime", action="store_true", help="Arquivos: lê o mais rápido possível")
+    p.add_argument("--max_frames", type=int, default=None)
+    p.add_argument("--lag_log", default=None, help="CSV com frame, atraso (ms) e detecções de cada frame processado")
+    args = p.parse_args(argv)
+
+    detector = SpermDetector(weights=args.weights, conf=args.conf, backend=args.backend)
+    tracker = SpermTracker(backend=args.tracker)
+    log = open(args.lag_log, "w", encoding="utf-8") if args.lag_log else None
+    if log is not None:
+        log.write("frame,lag_ms,detections\n")
+
+    def on_frame(frame_id, lag, n_boxes, points):
+        if log is not None:
+            log.write(f"{frame_id},{lag * 1000:.1f},{n_boxes}\n")
+
+    session = LiveSession(detector, tracker, args.source, args.microns_per_pixel, args.drop_volume_ul,
+                          fps=args.fps, realtime=not args.no_realtime, latency_budget_ms=args.latency_budget_ms,
+                          window_s=args.window_s, publish_interval=1.0, max_frames=args.max_frames,
+                          on_frame=on_frame)
+    session.start()
+    version = 0
+    try:
+        while True:
+            version = session.wait_for_change(version, timeout=2)
+            s = session.to_dict()
+            if "summary" in s:
+                print(f"frame {s['frame']}: motilidade progressiva {s['summary']['motilidade_progressiva_%']:.1f}%, "
+                      f"vigor {s['summary']['vigor_medio']:.1f}, {s['concentration']:.3g} sptz/mL, "
+                      f"atraso p50 {s['lag_ms']['p50']} ms / p95 {s['lag_ms']['p95']} ms, "
+                      f"descartados {s['dropped']} de {s['frames_read']}")
+            if s["status"] in FINISHED_STATES:
+                if s["status"] == ERROR:
+                    print(f"Erro: {s['error']}")
+                break
+    except KeyboardInterrupt:
+        session.stop()
+        session.join()
+    finally:
+        if log is not None:
+            log.close()
+    return 1 if session.state["status"] == ERROR else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
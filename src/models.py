@@ -0,0 +1,134 @@
+"""
+models.py
+Cache de modelos por processo.
+Cada modelo é carregado uma única vez por (caminho dos pesos, device, backend) e
+reaproveitado entre requisições; quando há mais modelos que `max_models`,
+o menos usado recentemente é descartado (LRU).
+
+Modelos como o YOLO não são seguros para inferência concorrente, então cada
+entrada tem um lock: quem compartilha o modelo entre threads deve usar
+`with entry.lock:` em volta da inferência.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ModelEntry:
+    def __init__(self, key):
+        self.key = key
+        self.model = None
+        self.error = None
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.hits = 0
+        self.last_used = None
+
+    def to_dict(self):
+        weights, device, backend = self.key
+        return {
+            "weights": weights,
+            "device": device,
+            "backend": backend,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "hits": self.hits,
+            "last_used": self.last_used,
+        }
+
+
+class ModelRegistry:
+    """
+    loader: callable(weights, device, backend) -> modelo
+    warmer: callable(modelo) opcional, usado em warmup() (ex.: uma inferência num frame vazio)
+    """
+
+    def __init__(self, loader, warmer=None, max_models=2):
+        self.loader = loader
+        self.warmer = warmer
+        self.max_models = max(1, int(max_models))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds_total = 0.0
+
+    @staticmethod
+    def _key(weights, device, backend):
+        return (os.path.abspath(weights), None if device is None else str(device), backend)
+
+    def get(self, weights, device=None, backend="torch"):
+        """Retorna a ModelEntry carregada (carrega na primeira vez)."""
+        key = self._key(weights, device, backend)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                entry.hits += 1
+                owner = False
+            else:
+                entry = ModelEntry(key)
+                self._entries[key] = entry
+                self.misses += 1
+                owner = True
+            entry.last_used = time.time()
+
+        if owner:
+            self._load(entry)
+        else:
+            entry.ready.wait()
+        if entry.error is not None:
+            raise entry.error
+        return entry
+
+    def _load(self, entry):
+        t0 = time.perf_counter()
+        try:
+            entry.model = self.loader(*entry.key)
+        except Exception as e:
+            entry.error = e
+            with self._lock:
+                # não guardar falhas: a próxima chamada tenta de novo
+                if self._entries.get(entry.key) is entry:
+                    del self._entries[entry.key]
+        else:
+            with self._lock:
+                self._evict()
+        finally:
+            entry.load_seconds = time.perf_counter() - t0
+            with self._lock:
+                self.load_seconds_total += entry.load_seconds
+            entry.ready.set()
+
+    def _evict(self):
+        # chamado com self._lock; modelos em uso continuam vivos para quem já os tem
+        while len(self._entries) > self.max_models:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def warmup(self, weights, device=None, backend="torch"):
+        """Carrega o modelo e roda uma inferência de aquecimento."""
+        entry = self.get(weights, device, backend)
+        if self.warmer is not None and entry.warmup_seconds is None:
+            t0 = time.perf_counter()
+            with entry.lock:
+                self.warmer(entry.model)
+            entry.warmup_seconds = time.perf_counter() - t0
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_models": self.max_models,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_seconds_total": self.load_seconds_total,
+                "models": [e.to_dict() for e in self._entries.values() if e.ready.is_set()],
+            }
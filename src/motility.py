@@ -1,21 +1,24 @@
 """
 motility.py
 Cálculos de distância, velocidade, retilinearidade (linearity)
-Assume trajetórias como listas: [(frame_id, x, y), ...]
+Assume trajetórias como listas: [(frame_id, x, y), ...] ou arrays (n, 3)
+
+trajectory_metrics calcula as mesmas métricas (e VCL/VSL/VAP) para todas as
+trilhas de uma vez, a partir de um array "ragged": pontos (N, 3) concatenados
+e offsets (n_trilhas + 1), trilha i = pontos[offsets[i]:offsets[i+1]].
 """
 
 import numpy as np
 
+def _as_points(traj):
+    return np.asarray(traj, dtype=np.float64).reshape(-1, 3)
+
 def distance_pixels(traj):
     """Distância total percorrida em pixels"""
     if len(traj) < 2:
         return 0.0
-    dist = 0.0
-    for i in range(1, len(traj)):
-        x1, y1 = traj[i-1][1], traj[i-1][2]
-        x2, y2 = traj[i][1], traj[i][2]
-        dist += np.hypot(x2 - x1, y2 - y1)
-    return float(dist)
+    pts = _as_points(traj)
+    return float(np.hypot(np.diff(pts[:, 1]), np.diff(pts[:, 2])).sum())
 
 def velocity_um_s(traj, fps, microns_per_pixel):
     """Velocidade média (µm/s) ao longo da trajetória"""
@@ -38,4 +41,96 @@ def linearity(traj):
     total = distance_pixels(traj)
     if total == 0:
         return 0.0
-    return float(straight / total)
\ No newline at end of file
+    return float(straight / total)
+
+def ragged_from_tracks(trajs):
+    """
+    Concatena trilhas [(n_i, 3) ou listas de (frame_id, x, y)] em (pontos, offsets).
+    Trilhas fora de ordem de frame são ordenadas aqui.
+    """
+    arrays = []
+    for traj in trajs:
+        pts = _as_points(traj)
+        if len(pts) > 1 and np.any(np.diff(pts[:, 0]) < 0):
+            pts = pts[np.argsort(pts[:, 0], kind="stable")]
+        arrays.append(pts)
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    if arrays:
+        np.cumsum([len(a) for a in arrays], out=offsets[1:])
+        points = np.concatenate(arrays)
+    else:
+        points = np.empty((0, 3), dtype=np.float64)
+    return points, offsets
+
+def _segment_path_length(x, y, starts, ends):
+    """Soma dos passos entre pontos consecutivos de cada trilha [starts, ends]."""
+    step = np.hypot(np.diff(x), np.diff(y))
+    csum = np.concatenate(([0.0], np.cumsum(step)))
+    return csum[ends] - csum[starts]
+
+def _moving_average(values, starts, ends, idx_track, window):
+    """Média móvel centrada que não atravessa a fronteira entre trilhas."""
+    half = window // 2
+    idx = np.arange(len(values))
+    lo = np.maximum(starts[idx_track], idx - half)
+    hi = np.minimum(ends[idx_track], idx + half)
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    return (csum[hi + 1] - csum[lo]) / (hi - lo + 1)
+
+def trajectory_metrics(points, offsets, fps, microns_per_pixel, smooth_window=5):
+    """
+    Métricas de todas as trilhas numa única passada vetorizada.
+    points: (N, 3) [frame_id, x, y], ordenado por frame dentro de cada trilha
+    offsets: (n_trilhas + 1,)
+    Retorna dict de arrays (um valor por trilha):
+    - n_points, distance_px
+    - vcl_um_s: velocidade curvilínea (igual a velocity_um_s)
+    - vsl_um_s: velocidade em linha reta (primeiro -> último ponto)
+    - vap_um_s: velocidade na trajetória média (média móvel de smooth_window pontos)
+    - linearity: VSL / VCL (igual a linearity)
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = np.diff(offsets)
+    n_tracks = len(n)
+    out = {
+        "n_points": n,
+        "distance_px": np.zeros(n_tracks),
+        "vcl_um_s": np.zeros(n_tracks),
+        "vsl_um_s": np.zeros(n_tracks),
+        "vap_um_s": np.zeros(n_tracks),
+        "linearity": np.zeros(n_tracks),
+    }
+    valid = n >= 2
+    if not np.any(valid):
+        return out
+
+    fr, x, y = points[:, 0], points[:, 1], points[:, 2]
+    # trilhas vazias apontam para um índice válido; o resultado delas é descartado por `valid`
+    starts = np.minimum(offsets[:-1], len(points) - 1)
+    ends = np.where(n > 0, offsets[1:] - 1, starts)
+
+    total = _segment_path_length(x, y, starts, ends)
+    straight = np.hypot(x[ends] - x[starts], y[ends] - y[starts])
+
+    idx_track = np.repeat(np.arange(n_tracks), n)
+    xs = _moving_average(x, starts, ends, idx_track, smooth_window)
+    ys = _moving_average(y, starts, ends, idx_track, smooth_window)
+    average_path = _segment_path_length(xs, ys, starts, ends)
+
+    # mesma regra de velocity_um_s para o tempo total
+    if fps > 0:
+        seconds = (fr[ends] - fr[starts]) / float(fps)
+        seconds = np.where(seconds <= 0, n / float(fps), seconds)
+    else:
+        seconds = np.ones(n_tracks)
+    seconds = np.where(valid, seconds, 1.0)
+
+    out["distance_px"] = np.where(valid, total, 0.0)
+    out["vcl_um_s"] = np.where(valid, total * microns_per_pixel / seconds, 0.0)
+    out["vsl_um_s"] = np.where(valid, straight * microns_per_pixel / seconds, 0.0)
+    out["vap_um_s"] = np.where(valid, average_path * microns_per_pixel / seconds, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lin = np.where(total > 0, straight / total, 0.0)
+    out["linearity"] = np.where(valid, lin, 0.0)
+    return out
@@ -0,0 +1,256 @@
+"""
+pipeline.py
+Pipeline em streaming detect -> track -> métricas.
+Cada frame detectado vai direto para o rastreador; cada trilha encerrada vai direto
+para os cálculos de motilidade/vigor. O pico de memória fica limitado pelo número
+de trilhas ativas, não pela duração do vídeo.
+Opcionalmente o vídeo com sobreposição é gravado na mesma passada (OverlayWriter).
+O pandas só é importado ao montar a tabela final (dataframe()).
+"""
+
+from src.motility import trajectory_metrics
+from src.track import TrackTable
+from src.vigor import vigor_index, vigor_classes
+from src.concentration import estimate_concentration
+from src.detect import is_subsampled, video_fps, video_frame_count
+from src.visualize import OverlayWriter
+from src.profiling import NULL_PROFILER
+import numpy as np
+
+
+# Métricas que somam o deslocamento quadro a quadro, inclusive o ruído de detecção.
+# Com subamostragem (skip_frames / adaptive) esse deslocamento só é visto nos frames
+# inferidos e a interpolação o troca por retas: em amostras lentas a VCL cai a uma
+# fração da obtida com todos os frames e a linearidade sobe. Nesses casos as colunas
+# ficam fora da tabela por trilha e o resumo as informa como None; contagens,
+# concentração e VSL continuam comparáveis (ver tests/test_subsampling.py).
+PER_FRAME_METRICS = ("distance_px", "velocity_um_s", "vap_um_s", "linearity", "vigor_index", "vigor_class")
+
+
+def iter_finished_tracks(frames, tracker, on_update=None, profiler=NULL_PROFILER):
+    """
+    frames: iterável de (frame_id, boxes) como gerado por SpermDetector.iter_detections
+    (boxes None para frames pulados pela subamostragem)
+    on_update: opcional, callable(frame_id, [(track_id, cx, cy), ...]) a cada frame rastreado
+    Gera TrackTables com as trilhas encerradas, assim que o rastreador as libera.
+    """
+    for frame_id, boxes in frames:
+        with profiler.stage("tracking"):
+            points = tracker.update(frame_id, boxes)
+            if on_update is not None:
+                on_update(frame_id, points)
+            finished = tracker.pop_finished(frame_id)
+        if len(finished):
+            yield finished
+    with profiler.stage("tracking"):
+        finished = tracker.flush()
+    if len(finished):
+        yield finished
+
+
+def track_metrics(track_ids, points, offsets, fps, microns_per_pixel, subsampled=False):
+    """
+    Motilidade + vigor de várias trilhas numa passada vetorizada.
+    subsampled: as trilhas vêm de uma análise com frames pulados; omite PER_FRAME_METRICS
+    Retorna dict de colunas (uma linha por trilha), pronto para pd.DataFrame.
+    """
+    m = trajectory_metrics(points, offsets, fps=fps, microns_per_pixel=microns_per_pixel)
+    vigor = vigor_index(m["vcl_um_s"], m["linearity"])
+    columns = {
+        "track_id": np.asarray(track_ids, dtype=np.int64),
+        "n_points": m["n_points"],
+        "distance_px": m["distance_px"],
+        "velocity_um_s": m["vcl_um_s"],
+        "vsl_um_s": m["vsl_um_s"],
+        "vap_um_s": m["vap_um_s"],
+        "linearity": m["linearity"],
+        "vigor_index": vigor,
+        "vigor_class": vigor_classes(vigor),
+    }
+    if subsampled:
+        for name in PER_FRAME_METRICS:
+            del columns[name]
+    return columns
+
+
+class MotilityAccumulator:
+    """
+    Acumula as métricas por trilha à medida que as trilhas são encerradas.
+    subsampled: ver track_metrics
+    """
+
+    def __init__(self, fps, microns_per_pixel, subsampled=False):
+        self.fps = fps
+        self.microns_per_pixel = microns_per_pixel
+        self.subsampled = subsampled
+        self._columns = []
+        self._counts = np.zeros(0, dtype=np.int64)
+
+    def add_table(self, table):
+        """table: TrackTable com trilhas completas, ordenada por (track_id, frame)."""
+        track_ids, points, offsets = table.groups()
+        if len(track_ids) == 0:
+            return
+        self._columns.append(track_metrics(track_ids, points, offsets,
+                                           fps=self.fps, microns_per_pixel=self.microns_per_pixel,
+                                           subsampled=self.subsampled))
+        # contar trilhas por frame para concentração
+        counts = np.bincount(table.frame)
+        if len(counts) > len(self._counts):
+            counts[:len(self._counts)] += self._counts
+            self._counts = counts
+        else:
+            self._counts[:len(counts)] += counts
+
+    def add(self, tid, traj):
+        """Uma trilha no formato [(frame_id, cx, cy), ...]."""
+        self.add_table(TrackTable.from_dict({tid: traj}).sorted())
+
+    @property
+    def velocities(self):
+        if not self._columns or self.subsampled:
+            return []
+        return np.concatenate([c["velocity_um_s"] for c in self._columns]).tolist()
+
+    def concentration(self, drop_volume_ul):
+        return estimate_concentration(self._counts[self._counts > 0].tolist(), drop_volume_ul)
+
+    def dataframe(self):
+        import pandas as pd
+        if not self._columns:
+            return pd.DataFrame()
+        return pd.DataFrame({k: np.concatenate([c[k] for c in self._columns]) for k in self._columns[0]})
+
+
+def summarize(df, subsampled=False):
+    """subsampled: motilidade progressiva e vigor dependem de PER_FRAME_METRICS e saem como None."""
+    summary = {}
+    if subsampled:
+        summary["motilidade_progressiva_%"] = None
+        summary["vigor_medio"] = None
+        summary["n_trajetorias"] = int(df.shape[0])
+    elif not df.empty:
+        summary["motilidade_progressiva_%"] = float((df[(df.velocity_um_s > 25) & (df.linearity > 0.6)].shape[0] / df.shape[0]) * 100)
+        summary["vigor_medio"] = float(df["vigor_index"].mean())
+        summary["n_trajetorias"] = int(df.shape[0])
+    else:
+        summary["motilidade_progressiva_%"] = 0.0
+        summary["vigor_medio"] = 0.0
+        summary["n_trajetorias"] = 0
+    return summary
+
+
+def analyze_track_table(table, fps, microns_per_pixel, drop_volume_ul, profiler=NULL_PROFILER, sampling=None):
+    """
+    Métricas e resumo a partir de uma TrackTable já completa (ex.: shards, artefatos).
+    sampling: opções de amostragem da análise que gerou a tabela (skip_frames, adaptive, ...)
+    """
+    subsampled = is_subsampled(**(sampling or {}))
+    acc = MotilityAccumulator(fps=fps, microns_per_pixel=microns_per_pixel, subsampled=subsampled)
+    with profiler.stage("metrics"):
+        acc.add_table(table.sorted())
+        df = acc.dataframe()
+    return {
+        "summary": summarize(df, subsampled),
+        "df": df,
+        "concentration": acc.concentration(drop_volume_ul),
+        "velocities": acc.velocities,
+        "tracks": table,
+    }
+
+
+def analyze_video(detector, tracker, video_path, fps, microns_per_pixel, drop_volume_ul,
+                  max_frames=None, keep_tracks=False, progress=None, overlay_path=None,
+                  overlay_options=None, keep_detections=False, profiler=None, sink=None):
+    """
+    Roda a pipeline completa em streaming.
+    progress: callable(stage=..., frame=..., total_frames=...) chamado a cada frame (ex.: Job.report)
+    overlay_path: se dado, grava o vídeo com as trilhas a partir dos mesmos frames
+    decodificados para a detecção (o vídeo é lido uma única vez)
+    overlay_options: kwargs extras para OverlayWriter (ex.: max_trail, fade_frames)
+    profiler: opcional (profiling.Profiler), recebe o tempo de cada etapa e as contagens
+    sink: opcional, recebe as detecções e as trilhas à medida que saem, sem acumulá-las
+    em memória: sink.add_detections(array (n, 6)) por frame e sink.add_tracks(TrackTable)
+    por lote de trilhas encerradas (ex.: artifacts.ArtifactWriter, ResultCache.writer)
+    Retorna dict com summary, df, concentration, velocities, n_detections e,
+    se keep_tracks=True, tracks (TrackTable com todas as trilhas) e, se keep_detections=True,
+    detections (array (n, 6) float32: frame, x1, y1, x2, y2, score).
+    """
+    profiler = profiler or NULL_PROFILER
+    subsampled = bool(getattr(detector, "subsampled", False))
+    acc = MotilityAccumulator(fps=fps, microns_per_pixel=microns_per_pixel, subsampled=subsampled)
+    kept = [] if keep_tracks else None
+    kept_detections = [] if keep_detections else None
+    n_detections = [0]
+    if progress is not None:
+        progress(stage="detect", frame=0, total_frames=video_frame_count(video_path, max_frames))
+    overlay = None
+    if overlay_path is not None:
+        overlay = OverlayWriter(overlay_path, fps=video_fps(video_path), **(overlay_options or {}))
+
+    def draw_points(frame_id, points):
+        for tid, cx, cy in points:
+            overlay.add_point(frame_id, tid, cx, cy)
+
+    def frames():
+        for item in detector.iter_detections(video_path, max_frames=max_frames,
+                                             return_frames=overlay is not None, profiler=profiler):
+            frame_id, boxes = item[0], item[1]
+            if overlay is not None:
+                with profiler.stage("overlay"):
+                    overlay.push(frame_id, item[2])
+            if progress is not None:
+                progress(frame=frame_id + 1)
+            if boxes is None:
+                # frame pulado pela subamostragem: o rastreador avança e interpola as trilhas nele
+                profiler.count(frames=1)
+                yield frame_id, None
+                continue
+            n_detections[0] += len(boxes)
+            profiler.count(frames=1, detections=len(boxes), inferred=1)
+            if (kept_detections is not None or sink is not None) and len(boxes):
+                chunk = np.column_stack([np.full(len(boxes), frame_id), boxes]).astype(np.float32)
+                if kept_detections is not None:
+                    kept_detections.append(chunk)
+                if sink is not None:
+                    sink.add_detections(chunk)
+            yield frame_id, boxes
+
+    try:
+        for table in iter_finished_tracks(frames(), tracker, on_update=draw_points if overlay is not None else None,
+                                          profiler=profiler):
+            with profiler.stage("metrics"):
+                acc.add_table(table)
+            if kept is not None:
+                kept.append(table)
+            if sink is not None:
+                sink.add_tracks(table)
+    except BaseException:
+        # o erro original (ou o cancelamento do job) prevalece sobre uma falha do encoder ao fechar
+        if overlay is not None:
+            try:
+                overlay.close()
+            except Exception:
+                pass
+        raise
+    if overlay is not None:
+        with profiler.stage("overlay"):
+            overlay.close()
+
+    with profiler.stage("metrics"):
+        df = acc.dataframe()
+    return {
+        "summary": summarize(df, subsampled),
+        "df": df,
+        "concentration": acc.concentration(drop_volume_ul),
+        "velocities": acc.velocities,
+        "n_detections": n_detections[0],
+        "tracks": TrackTable.concat(kept).sorted() if kept is not None else None,
+        "detections": _concat_detections(kept_detections) if kept_detections is not None else None,
+    }
+
+
+def _concat_detections(chunks):
+    if not chunks:
+        return np.zeros((0, 6), dtype=np.float32)
+    return np.concatenate(chunks)
@@ -0,0 +1,100 @@
+"""
+prewarm.py
+Aquecimento em segundo plano na subida do servidor.
+As bibliotecas pesadas (pandas, matplotlib, scipy, DeepSORT, ultralytics/ONNX
+Runtime) são importadas só no primeiro uso; Prewarm faz esse primeiro uso numa
+thread, junto com a carga e o aquecimento do modelo padrão (MODELS.warmup), enquanto
+o servidor já atende. Uma análise que chega antes do fim espera só pelo que falta:
+os imports concorrentes usam o lock de import do Python e o modelo, o da ModelEntry.
+"""
+
+import importlib
+import os
+import threading
+import time
+
+from src.detect import MODELS
+
+# módulos importados no aquecimento, na ordem (os de relatório e métricas primeiro)
+HEAVY_MODULES = ("pandas", "matplotlib.figure", "matplotlib.backends.backend_agg")
+TRACKER_MODULES = {
+    "deepsort": ("deep_sort_realtime.deepsort_tracker",),
+    "centroid": ("scipy.optimize",),
+}
+
+IDLE = "idle"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+
+class Prewarm:
+    """
+    weights / backend: modelo a carregar e aquecer (pulado se os pesos não existem)
+    trackers: backends de rastreamento cujas dependências devem ser importadas
+    to_dict() informa o estado e o tempo de cada etapa (em s).
+    """
+
+    def __init__(self, weights=None, backend="torch", trackers=("deepsort", "centroid"), modules=HEAVY_MODULES):
+        self.weights = weights
+        self.backend = backend
+        self.modules = list(modules)
+        for name in trackers:
+            self.modules.extend(m for m in TRACKER_MODULES.get(name, ()) if m not in self.modules)
+        self.status = IDLE
+        self.steps = {}
+        self.errors = {}
+        self.started_at = None
+        self.finished_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self):
+        return self._thread is not None
+
+    def start(self):
+        """Inicia o aquecimento numa thread; chamadas seguintes não fazem nada."""
+        with self._lock:
+            if self._thread is None:
+                self.status = RUNNING
+                self.started_at = time.time()
+                self._thread = threading.Thread(target=self.run, name="prewarm", daemon=True)
+                self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _step(self, name, fn):
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            # uma dependência opcional ausente não impede o resto do aquecimento
+            self.errors[name] = f"{type(e).__name__}: {e}"
+        self.steps[name] = round(time.perf_counter() - t0, 3)
+
+    def run(self):
+        self.status = RUNNING
+        for module in self.modules:
+            self._step(module, lambda: importlib.import_module(module))
+        failed = False
+        if self.weights and os.path.exists(self.weights):
+            self._step("model", lambda: MODELS.warmup(self.weights, backend=self.backend))
+            failed = "model" in self.errors
+        elif self.weights:
+            self.errors["model"] = f"pesos não encontrados: {self.weights}"
+        self.finished_at = time.time()
+        self.status = ERROR if failed else DONE
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "weights": self.weights,
+            "backend": self.backend,
+            "steps": dict(self.steps),
+            "errors": dict(self.errors),
+            "seconds": round(self.finished_at - self.started_at, 3) if self.finished_at and self.started_at else None,
+        }
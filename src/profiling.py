@@ -0,0 +1,210 @@
+"""
+profiling.py
+Instrumentação por etapa da análise.
+- Profiler: tempo de parede e de CPU por etapa (decode, inference, boxes, tracking,
+  metrics, overlay, report, histogram), frames/s, detecções por frame, frames
+  que passaram pelo detector (inferred_frames; menos que frames com subamostragem) e pico de RSS
+- METRICS: agregado do processo (contadores e histogramas), exportado no formato
+  texto do Prometheus pela rota /metrics do app.py
+
+As etapas são medidas com `with profiler.stage("nome"):`. O tempo de CPU é o da
+thread que executa a etapa (time.thread_time): a decodificação, que roda numa
+thread própria com batch_size > 1, não se mistura com a inferência.
+"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_bytes():
+    """Pico de memória residente do processo (None se indisponível)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB; macOS em bytes
+    return int(rss if sys.platform == "darwin" else rss * 1024)
+
+
+class Profiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self.frames = 0
+        self.detections = 0
+        self.inferred = 0
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @contextmanager
+    def stage(self, name):
+        wall0 = time.perf_counter()
+        cpu0 = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall0
+            cpu = time.thread_time() - cpu0
+            with self._lock:
+                s = self._stages.setdefault(name, [0, 0.0, 0.0])
+                s[0] += 1
+                s[1] += wall
+                s[2] += cpu
+
+    def count(self, frames=0, detections=0, inferred=0):
+        with self._lock:
+            self.frames += frames
+            self.detections += detections
+            self.inferred += inferred
+
+    def summary(self):
+        """Dict serializável (vai para a seção `timings` do relatório)."""
+        wall = time.perf_counter() - self._wall_start
+        with self._lock:
+            stages = {name: {"calls": calls, "wall_s": round(w, 4), "cpu_s": round(c, 4)}
+                      for name, (calls, w, c) in self._stages.items()}
+            frames, detections, inferred = self.frames, self.detections, self.inferred
+        rss = peak_rss_bytes()
+        return {
+            "wall_s": round(wall, 4),
+            "cpu_s": round(time.process_time() - self._cpu_start, 4),
+            "frames": frames,
+            "fps": round(frames / wall, 2) if wall > 0 else None,
+            "inferred_frames": inferred,
+            "detections": detections,
+            "detections_per_frame": round(detections / (inferred or frames), 3) if frames else None,
+            "peak_rss_mb": round(rss / 1024 ** 2, 1) if rss is not None else None,
+            "stages": stages,
+        }
+
+
+class _NullProfiler:
+    """Profiler que não mede nada (padrão quando nenhum é passado)."""
+
+    def stage(self, name):
+        return nullcontext()
+
+    def count(self, frames=0, detections=0, inferred=0):
+        pass
+
+    def summary(self):
+        return None
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+_SECONDS_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+_FPS_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 500, 1000)
+
+
+class MetricsRegistry:
+    """Contadores e histogramas do processo, no formato texto do Prometheus."""
+
+    def __init__(self, prefix="spermai"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    def inc(self, name, value=1.0, help=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+            if help:
+                self._help[name] = help
+
+    def observe(self, name, value, buckets=_SECONDS_BUCKETS, help=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = {"buckets": tuple(buckets), "counts": [0] * len(buckets),
+                                             "sum": 0.0, "count": 0}
+            for i, le in enumerate(h["buckets"]):
+                if value <= le:
+                    h["counts"][i] += 1
+            h["sum"] += value
+            h["count"] += 1
+            if help:
+                self._help[name] = help
+
+    def record(self, timings):
+        """Acumula o resumo de um Profiler (uma análise concluída)."""
+        self.inc("analyses_total", help="Análises concluídas")
+        self.inc("frames_total", timings["frames"], help="Frames processados")
+        self.inc("inferred_frames_total", timings.get("inferred_frames", timings["frames"]),
+                 help="Frames que passaram pelo detector")
+        self.inc("detections_total", timings["detections"], help="Detecções")
+        self.observe("analysis_seconds", timings["wall_s"], help="Duração das análises (s)")
+        if timings["fps"]:
+            self.observe("analysis_fps", timings["fps"], buckets=_FPS_BUCKETS, help="Frames por segundo por análise")
+        for stage, s in timings["stages"].items():
+            self.inc("stage_wall_seconds_total", s["wall_s"], help="Tempo de parede por etapa (s)", stage=stage)
+            self.inc("stage_cpu_seconds_total", s["cpu_s"], help="Tempo de CPU por etapa (s)", stage=stage)
+            self.observe("stage_seconds", s["wall_s"], help="Tempo de parede por etapa e análise (s)", stage=stage)
+
+    def render(self, gauges=None, counters=None):
+        """
+        Texto no formato de exposição do Prometheus.
+        gauges: {nome: valor} extras, lidos na hora (ex.: fila de jobs)
+        counters: {nome_total: valor} contadores mantidos fora do registro e lidos na
+        hora (ex.: acertos dos caches); só crescem, por isso o tipo counter
+        """
+        lines = []
+        with self._lock:
+            registered = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            helps = dict(self._help)
+
+        def header(name, kind):
+            full = f"{self.prefix}_{name}"
+            if name in helps:
+                lines.append(f"# HELP {full} {helps[name]}")
+            lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        seen = set()
+        for (name, labels), value in registered:
+            full = header(name, "counter") if name not in seen else f"{self.prefix}_{name}"
+            seen.add(name)
+            lines.append(f"{full}{_labels(labels)} {_num(value)}")
+        for (name, labels), h in histograms:
+            full = header(name, "histogram") if name not in seen else f"{self.prefix}_{name}"
+            seen.add(name)
+            for le, count in zip(h["buckets"], h["counts"]):
+                lines.append(f"{full}_bucket{_labels(labels + (('le', _num(le)),))} {count}")
+            lines.append(f"{full}_bucket{_labels(labels + (('le', '+Inf'),))} {h['count']}")
+            lines.append(f"{full}_sum{_labels(labels)} {_num(h['sum'])}")
+            lines.append(f"{full}_count{_labels(labels)} {h['count']}")
+        for name, value in sorted((counters or {}).items()):
+            if value is None:
+                continue
+            full = header(name, "counter")
+            lines.append(f"{full} {_num(value)}")
+        for name, value in sorted((gauges or {}).items()):
+            if value is None:
+                continue
+            full = header(name, "gauge")
+            lines.append(f"{full} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+METRICS = MetricsRegistry()
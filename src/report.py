@@ -1,17 +1,39 @@
 """
 report.py
 Gera relatório em JSON + Markdown+PNG (gráficos) com resultados.
+O matplotlib só é importado ao desenhar o primeiro gráfico (importá-lo leva
+centenas de ms, pagos até por `python main.py --help`).
 """
 
 import json
+import logging
 import os
-import matplotlib.pyplot as plt
-import pandas as pd
+from src.profiling import NULL_PROFILER
 
-def generate_report_json(out_path, summary, per_track, concentration_est, params):
+logger = logging.getLogger(__name__)
+
+def generate_report_json(out_path, summary, per_track, concentration_est, params, timings=None,
+                         history=None, sample=None):
+    """
+    timings: opcional, Profiler.summary() (tempo por etapa, fps, pico de memória)
+    history: opcional, history.HistoryIndex onde o relatório é indexado
+    sample: opcional, nome da amostra; fica no JSON para que history.rebuild o recupere
+    O registro no histórico é só um índice: se falhar, o relatório já gravado vale
+    e o erro vai para o log (o índice pode ser refeito com `python -m src.history rebuild`).
+    """
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    report = {"summary": summary, "tracks": per_track, "concentration": concentration_est, "params": params}
+    if sample is not None:
+        report["sample"] = sample
+    if timings is not None:
+        report["timings"] = timings
     with open(out_path, "w", encoding="utf-8") as f:
-        json.dump({"summary": summary, "tracks": per_track, "concentration": concentration_est, "params": params}, f, indent=2, ensure_ascii=False)
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    if history is not None:
+        try:
+            history.record(out_path, report, sample=sample)
+        except Exception:
+            logger.exception("Falha ao registrar %s no histórico (%s)", out_path, getattr(history, "path", history))
     return out_path
 
 def generate_markdown_report(md_path, summary, per_track_df, concentration_est, params, plots=[]):
@@ -23,7 +45,8 @@ def generate_markdown_report(md_path, summary, per_track_df, concentration_est,
             f.write(f"- {k}: {v}\n")
         f.write("\n## Resumo\n")
         for k,v in summary.items():
-            f.write(f"- **{k}**: {v}\n")
+            # None: métrica não calculada (ex.: VCL/linearidade com subamostragem, ver pipeline.PER_FRAME_METRICS)
+            f.write(f"- **{k}**: {'n/d' if v is None else v}\n")
         f.write("\n## Concentração estimada\n")
         f.write(f"- {concentration_est:.2e} sptz/mL\n\n")
         if not per_track_df.empty:
@@ -37,12 +60,34 @@ def generate_markdown_report(md_path, summary, per_track_df, concentration_est,
     return md_path
 
 def plot_velocity_histogram(velocities, out_png):
-    plt.figure(figsize=(6,4))
-    plt.hist(velocities, bins=30, color='C0', alpha=0.8)
-    plt.xlabel("Velocidade (µm/s)")
-    plt.ylabel("Número de trajetórias")
-    plt.title("Histograma de velocidades")
-    plt.tight_layout()
-    plt.savefig(out_png)
-    plt.close()
-    return out_png
\ No newline at end of file
+    from matplotlib.figure import Figure
+    # Figure direto (sem o estado global do pyplot): seguro com várias análises em threads
+    fig = Figure(figsize=(6,4))
+    ax = fig.subplots()
+    ax.hist(velocities, bins=30, color='C0', alpha=0.8)
+    ax.set_xlabel("Velocidade (µm/s)")
+    ax.set_ylabel("Número de trajetórias")
+    ax.set_title("Histograma de velocidades")
+    fig.tight_layout()
+    fig.savefig(out_png)
+    return out_png
+
+def write_reports(json_path, md_path, hist_path, result, params, profiler=NULL_PROFILER, history=None,
+                  sample=None):
+    """
+    Grava histograma, Markdown e, por último, o JSON (com a seção timings do profiler,
+    que assim inclui as etapas anteriores). result: dict de pipeline.analyze_video /
+    analyze_track_table. history / sample: ver generate_report_json. Retorna (plots, timings).
+    """
+    plots = []
+    if result["velocities"]:
+        with profiler.stage("histogram"):
+            plot_velocity_histogram(result["velocities"], hist_path)
+        plots.append(hist_path)
+    with profiler.stage("report"):
+        generate_markdown_report(md_path, result["summary"], result["df"], result["concentration"], params,
+                                 plots=plots)
+    timings = profiler.summary()
+    generate_report_json(json_path, result["summary"], result["df"].to_dict(orient="records"),
+                         result["concentration"], params, timings=timings, history=history, sample=sample)
+    return plots, timings
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+shard.py
+Análise de vídeos longos em paralelo, por trechos de tempo (shards).
+- O vídeo é dividido em intervalos de frames que se sobrepõem em `overlap` frames
+- Cada shard roda detecção + rastreio num processo separado (ProcessPoolExecutor)
+- As trilhas são costuradas nas fronteiras: no trecho sobreposto, trilhas dos dois
+  shards que ocupam as mesmas posições nos mesmos frames recebem o mesmo id
+
+Cada processo carrega o seu próprio modelo (MODELS é por processo).
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from src.detect import SpermDetector, video_frame_count
+from src.track import SpermTracker, TrackTable
+from src.trackers import candidate_pairs, greedy_match
+
+
+def plan_shards(n_frames, n_shards, overlap):
+    """Retorna [(start, stop), ...]; shards consecutivos compartilham `overlap` frames."""
+    n_shards = max(1, min(int(n_shards), n_frames))
+    step = int(np.ceil((n_frames + overlap * (n_shards - 1)) / n_shards))
+    shards = []
+    start = 0
+    for _ in range(n_shards):
+        stop = min(n_frames, start + step)
+        shards.append((start, stop))
+        if stop >= n_frames:
+            break
+        start = stop - overlap
+    return shards
+
+
+def _run_shard(video_path, start, stop, detector_options, tracker_options):
+    """Executado no processo filho: detecção + rastreio de [start, stop)."""
+    detector = SpermDetector(**detector_options)
+    tracker = SpermTracker(**tracker_options)
+    detections = []
+
+    def frames():
+        for frame_id, boxes in detector.iter_detections(video_path, max_frames=stop, start_frame=start):
+            if boxes is not None and len(boxes):
+                detections.append(np.column_stack([np.full(len(boxes), frame_id), boxes]).astype(np.float32))
+            yield frame_id, boxes
+
+    table = tracker.run(frames())
+    detections = np.concatenate(detections) if detections else np.zeros((0, 6), dtype=np.float32)
+    return table, detections
+
+
+def _cuts(shards):
+    """Frame de corte entre shards consecutivos: o meio da sobreposição."""
+    return [start + (shards[k - 1][1] - start) // 2 for k, (start, _) in enumerate(shards) if k > 0]
+
+
+def stitch_detections(detections, shards):
+    """Junta as detecções dos shards sem duplicar os frames sobrepostos (mesmo corte das trilhas)."""
+    bounds = [0] + _cuts(shards) + [np.inf]
+    parts = [d[(d[:, 0] >= bounds[k]) & (d[:, 0] < bounds[k + 1])] for k, d in enumerate(detections)]
+    return np.concatenate(parts) if parts else np.zeros((0, 6), dtype=np.float32)
+
+
+def stitch_tracks(tables, shards, overlap, max_distance=5.0, min_common=3):
+    """
+    Junta as TrackTables (ids locais de cada shard) numa única TrackTable com ids globais.
+    No trecho sobreposto, um par (trilha anterior, trilha nova) é a mesma trilha quando
+    os pontos dos dois ficam a até max_distance px em pelo menos min_common frames.
+    O corte entre shards é feito no meio da sobreposição.
+    """
+    if not tables:
+        return TrackTable.empty()
+    merged = [tables[0]]
+    prev = tables[0]
+    next_id = int(prev.track_id.max()) + 1 if len(prev) else 1
+
+    cuts = _cuts(shards)
+    for k in range(1, len(tables)):
+        cur = tables[k]
+        start = shards[k][0]
+        prev_stop = shards[k - 1][1]
+        cut = cuts[k - 1]
+        mapping = _match_overlap(prev, cur, start, prev_stop, max_distance, min_common)
+
+        cur_ids = np.unique(cur.track_id)
+        new_ids = np.empty(len(cur_ids), dtype=np.int64)
+        for i, tid in enumerate(cur_ids.tolist()):
+            if tid in mapping:
+                new_ids[i] = mapping[tid]
+            else:
+                new_ids[i] = next_id
+                next_id += 1
+        relabeled = TrackTable(new_ids[np.searchsorted(cur_ids, cur.track_id)], cur.frame, cur.cx, cur.cy)
+
+        merged[-1] = merged[-1].take(merged[-1].frame < cut)
+        # a tabela anterior já tem os ids globais; a próxima fronteira usa esta
+        prev = relabeled
+        merged.append(relabeled.take(relabeled.frame >= cut))
+
+    return TrackTable.concat(merged).sorted()
+
+
+def _match_overlap(prev, cur, start, stop, max_distance, min_common):
+    """Retorna {id em cur: id em prev} para as trilhas que coincidem em [start, stop)."""
+    p = prev.take((prev.frame >= start) & (prev.frame < stop))
+    c = cur.take((cur.frame >= start) & (cur.frame < stop))
+    if len(p) == 0 or len(c) == 0:
+        return {}
+    pairs_p, pairs_c, dists = [], [], []
+    p_sorted, c_sorted = p.by_frame(), c.by_frame()
+    frames = np.intersect1d(p_sorted.frame, c_sorted.frame)
+    p_bounds = np.searchsorted(p_sorted.frame, np.r_[frames, frames + 1].reshape(2, -1))
+    c_bounds = np.searchsorted(c_sorted.frame, np.r_[frames, frames + 1].reshape(2, -1))
+    for i in range(len(frames)):
+        ps = slice(p_bounds[0, i], p_bounds[1, i])
+        cs = slice(c_bounds[0, i], c_bounds[1, i])
+        pp = np.column_stack([p_sorted.cx[ps], p_sorted.cy[ps]])
+        cc = np.column_stack([c_sorted.cx[cs], c_sorted.cy[cs]])
+        ti, di, d = candidate_pairs(pp, cc, max_distance)
+        pairs_p.append(p_sorted.track_id[ps][ti])
+        pairs_c.append(c_sorted.track_id[cs][di])
+        dists.append(d)
+    if not pairs_p:
+        return {}
+    pairs_p = np.concatenate(pairs_p)
+    pairs_c = np.concatenate(pairs_c)
+    dists = np.concatenate(dists)
+    if len(pairs_p) == 0:
+        return {}
+
+    # votos por par (trilha anterior, trilha nova): nº de frames coincidentes e distância média
+    uniq, inverse, counts = np.unique(np.column_stack([pairs_p, pairs_c]), axis=0,
+                                      return_inverse=True, return_counts=True)
+    mean_dist = np.bincount(inverse.ravel(), weights=dists) / counts
+    ok = counts >= min(min_common, stop - start)
+    if not ok.any():
+        return {}
+    uniq, counts, mean_dist = uniq[ok], counts[ok], mean_dist[ok]
+    # mais frames em comum primeiro; distância média desempata
+    cost = -counts + mean_dist / (max_distance + 1.0)
+    pi, ci = greedy_match(uniq[:, 0], uniq[:, 1], cost)
+    return dict(zip(ci.tolist(), pi.tolist()))
+
+
+def track_video_sharded(video_path, n_shards, overlap=50, workers=None, max_frames=None,
+                        detector_options=None, tracker_options=None, progress=None):
+    """
+    Detecção + rastreio de video_path em n_shards processos.
+    progress: callable(stage=..., frame=..., total_frames=...), chamado a cada shard concluído
+    Retorna (TrackTable com ids globais, detecções (n, 6): frame, x1, y1, x2, y2, score).
+    """
+    n_frames = video_frame_count(video_path, max_frames)
+    if not n_frames:
+        raise RuntimeError("Não foi possível obter o número de frames do vídeo para dividir em shards.")
+    shards = plan_shards(n_frames, n_shards, overlap)
+    workers = workers or min(len(shards), os.cpu_count() or 1)
+    detector_options = detector_options or {}
+    tracker_options = tracker_options or {}
+    if progress is not None:
+        progress(stage="detect", frame=0, total_frames=n_frames)
+
+    results = [None] * len(shards)
+    done_frames = 0
+    # "spawn": processos limpos, sem herdar threads/estado do torch do processo pai
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = {pool.submit(_run_shard, video_path, start, stop, detector_options, tracker_options): i
+                   for i, (start, stop) in enumerate(shards)}
+        try:
+            for fut in as_completed(futures):
+                i = futures[fut]
+                results[i] = fut.result()
+                done_frames += shards[i][1] - shards[i][0]
+                if progress is not None:
+                    progress(frame=min(done_frames, n_frames))
+        except BaseException:
+            for fut in futures:
+                fut.cancel()
+            raise
+
+    tables = [r[0] for r in results]
+    detections = stitch_detections([r[1] for r in results], shards)
+    return stitch_tracks(tables, shards, overlap), detections
+
+
+def compare_summaries(a, b):
+    """
+    Diferença relativa entre dois resumos (ex.: execução com shards x sem shards).
+    Retorna {chave: |a - b| / max(|a|, |b|, 1e-9)} para as chaves numéricas comuns.
+    """
+    out = {}
+    for k in a.keys() & b.keys():
+        va, vb = a[k], b[k]
+        if isinstance(va, (int, float)) and isinstance(vb, (int, float)):
+            out[k] = abs(va - vb) / max(abs(va), abs(vb), 1e-9)
+    return out
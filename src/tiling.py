@@ -0,0 +1,149 @@
+"""
+tiling.py
+Inferência em blocos (tiles) para vídeos de alta resolução.
+O YOLO reduz o frame inteiro para o tamanho de entrada (ex.: 640 px) e células
+pequenas somem; em vez disso o frame é dividido em tiles do tamanho de entrada,
+que se sobrepõem em `overlap` px, e as caixas de todos os tiles são juntadas:
+- caixas encostadas numa borda de tile que não é borda do frame são descartadas
+  (a célula cortada aparece inteira no tile vizinho, desde que overlap > tamanho da célula)
+- as duplicatas restantes nas emendas saem por NMS vetorizado (nms)
+
+Uma máscara de região de interesse (ROI) opcional faz com que tiles fora da
+câmara de contagem nem sejam inferidos, e descarta caixas com centro fora dela.
+"""
+
+import cv2
+import numpy as np
+
+from src.trackers import candidate_pairs
+
+
+def plan_tiles(width, height, tile_size, overlap):
+    """Retorna array (k, 4) [x0, y0, x1, y1] de tiles cobrindo o frame."""
+    tile_size = int(tile_size)
+    overlap = min(int(overlap), tile_size - 1)
+
+    def starts(n):
+        if n <= tile_size:
+            return np.zeros(1, dtype=np.int64)
+        step = tile_size - overlap
+        s = np.arange(0, n - tile_size, step, dtype=np.int64)
+        # o último tile encosta na borda do frame
+        return np.append(s, n - tile_size)
+
+    xs, ys = starts(width), starts(height)
+    x0, y0 = np.meshgrid(xs, ys)
+    x0, y0 = x0.ravel(), y0.ravel()
+    return np.column_stack([x0, y0, np.minimum(x0 + tile_size, width), np.minimum(y0 + tile_size, height)])
+
+
+def load_roi_mask(roi):
+    """roi: caminho de uma imagem (pixels != 0 são a região de interesse) ou array 2D; None passa direto."""
+    if roi is None or isinstance(roi, np.ndarray):
+        return roi
+    mask = cv2.imread(roi, cv2.IMREAD_GRAYSCALE)
+    if mask is None:
+        raise ValueError(f"Não foi possível ler a máscara de ROI: {roi}")
+    return mask
+
+
+def fit_mask(mask, width, height):
+    """Máscara booleana do tamanho do frame (redimensionada se preciso)."""
+    if mask.shape[:2] != (height, width):
+        mask = cv2.resize(mask.astype(np.uint8), (width, height), interpolation=cv2.INTER_NEAREST)
+    return mask > 0
+
+
+def tiles_in_mask(tiles, mask):
+    """Filtra os tiles que têm pelo menos um pixel da máscara (via imagem integral)."""
+    integral = cv2.integral(mask.astype(np.uint8))
+    x0, y0, x1, y1 = tiles.T
+    area = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    return tiles[area > 0]
+
+
+def boxes_in_mask(boxes, mask):
+    """Mantém as caixas (n, 5) com centro dentro da máscara."""
+    if len(boxes) == 0:
+        return boxes
+    h, w = mask.shape
+    cx = np.clip(((boxes[:, 0] + boxes[:, 2]) / 2).astype(np.int64), 0, w - 1)
+    cy = np.clip(((boxes[:, 1] + boxes[:, 3]) / 2).astype(np.int64), 0, h - 1)
+    return boxes[mask[cy, cx]]
+
+
+def merge_tile_boxes(tile_boxes, tiles, width, height, iou_threshold=0.5, edge_margin=1.0):
+    """
+    tile_boxes: lista de arrays (n, 5) em coordenadas de cada tile
+    Retorna um array (m, 5) em coordenadas do frame, sem duplicatas nas emendas.
+    """
+    parts = []
+    for boxes, (x0, y0, x1, y1) in zip(tile_boxes, tiles.tolist()):
+        if len(boxes) == 0:
+            continue
+        b = np.array(boxes, dtype=np.float32)
+        b[:, [0, 2]] += x0
+        b[:, [1, 3]] += y0
+        # caixa cortada pela borda do tile (quando a borda não é a do frame)
+        cut = np.zeros(len(b), dtype=bool)
+        if x0 > 0:
+            cut |= b[:, 0] <= x0 + edge_margin
+        if y0 > 0:
+            cut |= b[:, 1] <= y0 + edge_margin
+        if x1 < width:
+            cut |= b[:, 2] >= x1 - edge_margin
+        if y1 < height:
+            cut |= b[:, 3] >= y1 - edge_margin
+        parts.append(b[~cut])
+    if not parts:
+        return np.empty((0, 5), dtype=np.float32)
+    boxes = np.concatenate(parts)
+    return boxes[nms(boxes, iou_threshold)]
+
+
+def nms(boxes, iou_threshold=0.5):
+    """
+    Non-maximum suppression gulosa por score (mesmo resultado que o NMS clássico),
+    vetorizada: só pares de caixas próximas (grade espacial) são comparados, e a
+    supressão é resolvida em rodadas — uma caixa é mantida quando nenhuma caixa de
+    score maior ainda indecisa ou mantida a sobrepõe acima do limiar.
+    boxes: array (n, 5) [x1, y1, x2, y2, score]; retorna os índices mantidos (ordem original).
+    """
+    n = len(boxes)
+    if n < 2:
+        return np.arange(n)
+    order = np.argsort(-boxes[:, 4], kind="stable")
+    b = np.asarray(boxes, dtype=np.float64)[order]
+    wh = b[:, 2:4] - b[:, 0:2]
+    cents = (b[:, 0:2] + b[:, 2:4]) / 2.0
+    # duas caixas só se sobrepõem se |dx| < maior largura e |dy| < maior altura
+    radius = max(float(np.hypot(wh[:, 0].max(), wh[:, 1].max())), 1e-6)
+    i, j, _ = candidate_pairs(cents, cents, radius)
+    keep_pair = i < j  # i tem score maior (ordem decrescente)
+    i, j = i[keep_pair], j[keep_pair]
+
+    ix1 = np.maximum(b[i, 0], b[j, 0])
+    iy1 = np.maximum(b[i, 1], b[j, 1])
+    ix2 = np.minimum(b[i, 2], b[j, 2])
+    iy2 = np.minimum(b[i, 3], b[j, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area = wh[:, 0] * wh[:, 1]
+    iou = inter / np.maximum(area[i] + area[j] - inter, 1e-9)
+    over = iou > iou_threshold
+    i, j = i[over], j[over]
+
+    UNDECIDED, KEEP, SUPPRESSED = 0, 1, -1
+    state = np.zeros(n, dtype=np.int8)
+    while True:
+        undecided = state == UNDECIDED
+        if not undecided.any():
+            break
+        # suprimida se uma caixa de score maior já foi mantida
+        hit = np.zeros(n, dtype=bool)
+        hit[j[state[i] == KEEP]] = True
+        state[undecided & hit] = SUPPRESSED
+        # mantida se nenhuma caixa de score maior ainda está indecisa
+        blocked = np.zeros(n, dtype=bool)
+        blocked[j[state[i] == UNDECIDED]] = True
+        state[(state == UNDECIDED) & ~blocked] = KEEP
+    return np.sort(order[state == KEEP])
@@ -1,65 +1,291 @@
 """
 track.py
-Rastreamento com DeepSORT usando as detecções do detect.py
-Entrada: lista de detecções [frame_id, x1, y1, x2, y2, score]
-Saída: dict tracks: {track_id: [(frame_id, cx, cy), ...]}
+Rastreamento (DeepSORT ou backend só de movimento, ver trackers.py) usando as detecções do detect.py
+Entrada: detecções por frame (frame_id, boxes (n, 5)), incluindo frames vazios,
+ou a lista antiga [frame_id, x1, y1, x2, y2, score]
+Saída: TrackTable colunar (track_id, frame, cx, cy); TrackTable.to_dict() devolve
+o formato antigo {track_id: [(frame_id, cx, cy), ...]}
+
+O rastreador avança um passo por frame (inclusive sem detecções, para que o
+envelhecimento max_age seja correto) e só registra a posição das trilhas que
+receberam uma detecção naquele frame.
+
+Frames pulados pela subamostragem (boxes None, ver detect.py) também avançam o
+rastreador, sem detecções. Quando uma trilha volta a receber detecção, as posições
+nos frames pulados desde a observação anterior são interpoladas linearmente, de
+modo que a trilha continua com um ponto por frame (para o vídeo com as trilhas e a
+contagem de células por frame da concentração). A interpolação não recupera o
+deslocamento quadro a quadro que não foi observado: VCL, VAP e linearidade de uma
+análise subamostrada não são comparáveis às de uma análise de todos os frames
+(ver pipeline.PER_FRAME_METRICS). Frames inferidos em que a trilha não foi
+detectada continuam sem ponto.
+
+Também pode ser alimentado um frame por vez (update / pop_finished / flush), de
+modo que trilhas encerradas sejam liberadas assim que o rastreador as descarta.
 """
 
-from deep_sort_realtime.deepsort_tracker import DeepSort
+import numpy as np
+from src.trackers import make_backend
+
+
+class TrackTable:
+    """Tabela colunar de pontos: track_id, frame (int64), cx, cy (float64), todos com o mesmo tamanho."""
+
+    def __init__(self, track_id, frame, cx, cy):
+        self.track_id = np.asarray(track_id, dtype=np.int64)
+        self.frame = np.asarray(frame, dtype=np.int64)
+        self.cx = np.asarray(cx, dtype=np.float64)
+        self.cy = np.asarray(cy, dtype=np.float64)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0))
+
+    @classmethod
+    def concat(cls, tables):
+        tables = [t for t in tables if len(t)]
+        if not tables:
+            return cls.empty()
+        return cls(np.concatenate([t.track_id for t in tables]),
+                   np.concatenate([t.frame for t in tables]),
+                   np.concatenate([t.cx for t in tables]),
+                   np.concatenate([t.cy for t in tables]))
+
+    @classmethod
+    def from_dict(cls, tracks):
+        """Converte {track_id: [(frame_id, cx, cy), ...]} em TrackTable."""
+        ids, rows = [], []
+        for tid, traj in tracks.items():
+            ids.extend([int(tid)] * len(traj))
+            rows.extend(traj)
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, 3)
+        return cls(ids, rows[:, 0], rows[:, 1], rows[:, 2])
+
+    def __len__(self):
+        return len(self.track_id)
+
+    def take(self, index):
+        return TrackTable(self.track_id[index], self.frame[index], self.cx[index], self.cy[index])
+
+    def sorted(self):
+        """Ordenada por (track_id, frame)."""
+        return self.take(np.lexsort((self.frame, self.track_id)))
+
+    def by_frame(self):
+        """Ordenada por frame (para desenhar o vídeo)."""
+        return self.take(np.argsort(self.frame, kind="stable"))
+
+    def groups(self):
+        """
+        Formato "ragged" das trilhas, para motility.trajectory_metrics.
+        Retorna (track_ids únicos, pontos (N, 3) [frame, cx, cy], offsets); a tabela
+        precisa estar ordenada por (track_id, frame), ver sorted().
+        """
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 3)), np.zeros(1, dtype=np.int64)
+        starts = np.flatnonzero(np.r_[True, self.track_id[1:] != self.track_id[:-1]])
+        offsets = np.append(starts, len(self)).astype(np.int64)
+        points = np.column_stack([self.frame.astype(np.float64), self.cx, self.cy])
+        return self.track_id[starts], points, offsets
+
+    def to_dict(self):
+        tids, points, offsets = self.sorted().groups()
+        out = {}
+        for i, tid in enumerate(tids.tolist()):
+            seg = points[offsets[i]:offsets[i + 1]]
+            out[tid] = [(int(f), float(x), float(y)) for f, x, y in seg.tolist()]
+        return out
+
+
+class _TrackBuffer:
+    """Buffer colunar que cresce por duplicação; guarda os pontos das trilhas ativas."""
+
+    def __init__(self, capacity=4096):
+        self.n = 0
+        self._cols = [np.zeros(capacity, dtype=np.int64), np.zeros(capacity, dtype=np.int64),
+                      np.zeros(capacity), np.zeros(capacity)]
+
+    def append(self, track_id, frame_id, cx, cy):
+        k = len(track_id)
+        if self.n + k > len(self._cols[0]):
+            cap = max(2 * len(self._cols[0]), self.n + k)
+            for i, col in enumerate(self._cols):
+                grown = np.zeros(cap, dtype=col.dtype)
+                grown[:self.n] = col[:self.n]
+                self._cols[i] = grown
+        tid_col, fr_col, cx_col, cy_col = self._cols
+        tid_col[self.n:self.n + k] = track_id
+        fr_col[self.n:self.n + k] = frame_id
+        cx_col[self.n:self.n + k] = cx
+        cy_col[self.n:self.n + k] = cy
+        self.n += k
+
+    def table(self):
+        return TrackTable(*(col[:self.n] for col in self._cols))
+
+    def pop(self, track_ids):
+        """Remove e retorna (TrackTable ordenada) os pontos das trilhas em track_ids."""
+        table = self.table()
+        mask = np.isin(table.track_id, track_ids)
+        out = table.take(mask).sorted()
+        keep = ~mask
+        k = int(keep.sum())
+        for col in self._cols:
+            col[:k] = col[:self.n][keep]
+        self.n = k
+        return out
+
 
 class SpermTracker:
-    def __init__(self, max_age=30, n_init=1):
-        self.tracker = DeepSort(max_age=max_age, n_init=n_init)
+    """
+    max_age: frames sem detecção até a trilha ser descartada
+    pop_every: trilhas encerradas são liberadas em lotes, a cada pop_every frames
+    interpolate: preenche as posições nos frames pulados (boxes None) por interpolação linear
+    (uma reta entre as observações: não serve para VCL/linearidade, ver pipeline.PER_FRAME_METRICS)
+    """
+
+    def __init__(self, max_age=30, n_init=1, backend="deepsort", pop_every=32, interpolate=True,
+                 **backend_options):
+        self.backend = make_backend(backend, max_age=max_age, n_init=n_init, **backend_options)
+        self.max_age = max_age
+        self.pop_every = max(1, int(pop_every))
+        self.interpolate = interpolate
+        # estado do modo streaming: pontos das trilhas ainda não liberadas
+        self._buffer = _TrackBuffer()
+        self._stored_ids = np.zeros(0, dtype=np.int64)
+        self._live_ids = np.zeros(0, dtype=np.int64)
+        self._frames_since_pop = 0
+        self._reset_interpolation()
+
+    def _reset_interpolation(self):
+        # frames pulados recentes (crescente) e última observação de cada trilha (ordenado por id)
+        self._skipped = np.zeros(0, dtype=np.int64)
+        self._last_ids = np.zeros(0, dtype=np.int64)
+        self._last_frame = np.zeros(0, dtype=np.int64)
+        self._last_xy = np.zeros((0, 2))
 
     def run(self, detections, video_shape=None):
         """
-        detections: list of [frame_id, x1, y1, x2, y2, score]
-        retorna: dict {track_id: [(frame_id, cx, cy), ...]}
+        detections: iterável de (frame_id, boxes (n, 5)) por frame, incluindo frames vazios
+        (boxes None para frames pulados), ou a lista antiga de [frame_id, x1, y1, x2, y2, score] (frames ausentes até o último
+        frame com detecção são tratados como vazios)
+        retorna: TrackTable ordenada por (track_id, frame)
+        """
+        if isinstance(detections, (list, tuple)) and detections and len(detections[0]) == 6:
+            detections = frames_from_detections(detections)
+        tables = []
+        for frame_id, boxes in detections:
+            self.update(frame_id, boxes)
+            tables.append(self.pop_finished(frame_id))
+        tables.append(self.flush())
+        return TrackTable.concat(tables).sorted()
+
+    def update(self, frame_id, boxes):
+        """
+        Avança o rastreador em um frame (modo streaming).
+        boxes: array (n, 5) [x1, y1, x2, y2, score]; pode ser vazio. None indica um frame
+        pulado pelo detector: o rastreador avança sem detecções e a posição das trilhas
+        nesse frame é interpolada quando elas forem detectadas de novo.
+        Retorna [(track_id, cx, cy), ...] das trilhas que receberam detecção neste frame.
+        """
+        frame_id = int(frame_id)
+        skipped = boxes is None
+        if skipped:
+            boxes = np.zeros((0, 5))
+        ids, ltrb, matched = self.backend.update(np.asarray(boxes, dtype=float).reshape(-1, 5))
+        self._live_ids = ids
+        self._frames_since_pop += 1
+        if skipped:
+            if self.interpolate:
+                self._skipped = np.append(self._skipped, frame_id)
+            return []
+        ids, ltrb = ids[matched], ltrb[matched]
+        cx = (ltrb[:, 0] + ltrb[:, 2]) / 2.0
+        cy = (ltrb[:, 1] + ltrb[:, 3]) / 2.0
+        if self.interpolate:
+            self._interpolate(frame_id, ids, cx, cy)
+        self._buffer.append(ids, frame_id, cx, cy)
+        self._stored_ids = np.union1d(self._stored_ids, ids)
+        return list(zip(ids.tolist(), cx.tolist(), cy.tolist()))
+
+    def _interpolate(self, frame_id, ids, cx, cy):
+        """Grava os pontos interpolados nos frames pulados entre a última observação e frame_id."""
+        k = len(self._last_ids)
+        idx = np.minimum(np.searchsorted(self._last_ids, ids), max(k - 1, 0))
+        known = (self._last_ids[idx] == ids) if k else np.zeros(len(ids), dtype=bool)
+
+        if len(self._skipped) and known.any():
+            src = idx[known]
+            p = self._last_frame[src]
+            lo = np.searchsorted(self._skipped, p, side="right")
+            hi = np.searchsorted(self._skipped, frame_id, side="left")
+            counts = hi - lo
+            total = int(counts.sum())
+            if total:
+                row = np.repeat(np.arange(len(src)), counts)
+                within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                frames = self._skipped[lo[row] + within]
+                t = (frames - p[row]) / (frame_id - p[row]).astype(np.float64)
+                x0, y0 = self._last_xy[src[row], 0], self._last_xy[src[row], 1]
+                self._buffer.append(ids[known][row], frames,
+                                    x0 + t * (cx[known][row] - x0), y0 + t * (cy[known][row] - y0))
+
+        # última observação: atualiza as trilhas conhecidas e insere as novas
+        self._last_frame[idx[known]] = frame_id
+        self._last_xy[idx[known]] = np.column_stack([cx[known], cy[known]])
+        new = ~known
+        if new.any():
+            all_ids = np.concatenate([self._last_ids, ids[new]])
+            order = np.argsort(all_ids, kind="stable")
+            self._last_ids = all_ids[order]
+            self._last_frame = np.concatenate([self._last_frame, np.full(int(new.sum()), frame_id)])[order]
+            self._last_xy = np.concatenate([self._last_xy, np.column_stack([cx[new], cy[new]])])[order]
+
+        # um frame pulado só interessa enquanto alguma trilha observada antes dele pode voltar
+        if len(self._skipped) and self._skipped[0] < frame_id - self.max_age - 1:
+            self._skipped = self._skipped[self._skipped >= frame_id - self.max_age - 1]
+
+    def active_table(self):
+        """Cópia (TrackTable) dos pontos guardados das trilhas ainda não liberadas."""
+        table = self._buffer.table()
+        return TrackTable(table.track_id.copy(), table.frame.copy(), table.cx.copy(), table.cy.copy())
+
+    def pop_finished(self, frame_id=None):
+        """
+        Remove e retorna (TrackTable) as trilhas que o rastreador já descartou e que,
+        portanto, não vão mais crescer. Para amortizar o custo, só libera a cada
+        pop_every frames; nos demais retorna uma tabela vazia.
         """
-        tracks = {}
-        current_frame = -1
-        batch = []
-        for det in detections:
-            frame_id, x1, y1, x2, y2, score = det
-            if frame_id != current_frame and current_frame != -1:
-                track_results = self._update_tracker(batch)
-                for tr in track_results:
-                    tid, ltrb, frame_index = tr
-                    x1t, y1t, x2t, y2t = ltrb
-                    cx = float((x1t + x2t) / 2.0)
-                    cy = float((y1t + y2t) / 2.0)
-                    tracks.setdefault(tid, []).append((frame_index, cx, cy))
-                batch = []
-
-            current_frame = frame_id
-            w = x2 - x1
-            h = y2 - y1
-            batch.append(([float(x1), float(y1), float(w), float(h)], float(score), None, int(frame_id)))
-
-        if batch:
-            track_results = self._update_tracker(batch)
-            for tr in track_results:
-                tid, ltrb, frame_index = tr
-                x1t, y1t, x2t, y2t = ltrb
-                cx = float((x1t + x2t) / 2.0)
-                cy = float((y1t + y2t) / 2.0)
-                tracks.setdefault(tid, []).append((frame_index, cx, cy))
-
-        return tracks
-
-    def _update_tracker(self, batch):
-        dets = []
-        frame_index = None
-        for item in batch:
-            bbox, score, cls, fi = item
-            dets.append((bbox, score, cls))
-            frame_index = fi
-        tracks = self.tracker.update_tracks(dets, frame=None)
-        out = []
-        for t in tracks:
-            if not t.is_confirmed():
-                continue
-            track_id = t.track_id
-            ltrb = t.to_ltrb()  # left top right bottom
-            out.append((track_id, ltrb, frame_index))
-        return out
\ No newline at end of file
+        if self._frames_since_pop < self.pop_every:
+            return TrackTable.empty()
+        self._frames_since_pop = 0
+        finished = np.setdiff1d(self._stored_ids, self._live_ids, assume_unique=True)
+        if len(finished) == 0:
+            return TrackTable.empty()
+        self._stored_ids = np.setdiff1d(self._stored_ids, finished, assume_unique=True)
+        if len(self._last_ids):
+            keep = ~np.isin(self._last_ids, finished)
+            self._last_ids, self._last_frame, self._last_xy = (
+                self._last_ids[keep], self._last_frame[keep], self._last_xy[keep])
+        return self._buffer.pop(finished)
+
+    def flush(self):
+        """Fim do vídeo: remove e retorna todas as trilhas ainda guardadas."""
+        out = self._buffer.table().sorted()
+        self._buffer = _TrackBuffer()
+        self._stored_ids = np.zeros(0, dtype=np.int64)
+        self._frames_since_pop = 0
+        self._reset_interpolation()
+        return out
+
+
+def frames_from_detections(detections):
+    """Lista [frame_id, x1, y1, x2, y2, score] -> gerador de (frame_id, boxes (n, 5)) por frame."""
+    dets = np.asarray(detections, dtype=np.float64).reshape(-1, 6)
+    if len(dets) == 0:
+        return
+    dets = dets[np.argsort(dets[:, 0], kind="stable")]
+    frames = dets[:, 0].astype(np.int64)
+    bounds = np.searchsorted(frames, np.arange(frames[-1] + 2))
+    for frame_id in range(int(frames[-1]) + 1):
+        yield frame_id, dets[bounds[frame_id]:bounds[frame_id + 1], 1:]
@@ -0,0 +1,227 @@
+"""
+trackers.py
+Backends de rastreamento usados por SpermTracker (track.py).
+
+Interface de um backend:
+    update(boxes) -> (track_ids, ltrb, matched)
+    - boxes: array (n, 5) [x1, y1, x2, y2, score] do frame atual (pode ser vazio)
+    - track_ids: array (k,) int64 das trilhas confirmadas ainda vivas
+    - ltrb: array (k, 4) posição atual de cada trilha (left, top, right, bottom)
+    - matched: array (k,) bool, True se a trilha recebeu uma detecção neste frame
+
+Backends:
+- "deepsort": DeepSORT (deep_sort_realtime) só com movimento: sem embedder de
+  aparência, com um embedding constante por detecção, a associação fica a cargo do
+  filtro de Kalman e do IoU (as células são visualmente idênticas)
+- "centroid": só movimento — predição por velocidade constante, associação gulosa
+  por distância entre centróides com índice espacial em grade, estado em arrays NumPy
+"""
+
+import numpy as np
+
+
+class DeepSortBackend:
+    # embedding constante: a distância de aparência é sempre zero
+    _EMBED = np.ones(1, dtype=np.float32)
+
+    def __init__(self, max_age=30, n_init=1, max_iou_distance=0.9, **kwargs):
+        from deep_sort_realtime.deepsort_tracker import DeepSort
+        kwargs.setdefault("embedder", None)
+        # caixas de poucos px: entre dois frames o IoU de uma célula em movimento cai
+        # bem abaixo de 0,3 (o padrão do DeepSort, 0,7 de distância) e a trilha se perde
+        self.tracker = DeepSort(max_age=max_age, n_init=n_init, max_iou_distance=max_iou_distance, **kwargs)
+
+    def update(self, boxes):
+        dets = []
+        for x1, y1, x2, y2, score in np.asarray(boxes, dtype=float).reshape(-1, 5).tolist():
+            # o DeepSort descarta caixas degeneradas depois de parear detecções e embeddings
+            if x2 > x1 and y2 > y1:
+                dets.append(([x1, y1, x2 - x1, y2 - y1], score, None))
+        ids, ltrb, matched = [], [], []
+        for t in self.tracker.update_tracks(dets, embeds=[self._EMBED] * len(dets)):
+            if not t.is_confirmed():
+                continue
+            ids.append(int(t.track_id))
+            ltrb.append(t.to_ltrb())  # left top right bottom
+            matched.append(t.time_since_update == 0)
+        return (np.asarray(ids, dtype=np.int64),
+                np.asarray(ltrb, dtype=np.float64).reshape(-1, 4),
+                np.asarray(matched, dtype=bool))
+
+
+_GRID_OFFSET = 1 << 20
+_GRID_STRIDE = 1 << 22
+
+
+class CentroidTracker:
+    """
+    Rastreador só de movimento, pensado para milhares de células por frame.
+    - max_distance: raio (px) para associar uma detecção à posição prevista da trilha
+    - max_age: frames sem detecção até a trilha ser descartada
+    - n_init: detecções necessárias para confirmar uma trilha
+    - smoothing: peso da nova observação na estimativa de velocidade (0..1)
+    - assignment: "greedy" (padrão) ou "hungarian" (scipy; ótimo, mas O(k·n) de memória)
+    """
+
+    def __init__(self, max_age=30, n_init=1, max_distance=25.0, smoothing=0.5, assignment="greedy"):
+        self.max_age = max_age
+        self.n_init = n_init
+        self.max_distance = float(max_distance)
+        self.smoothing = float(smoothing)
+        self.assignment = assignment
+        self._next_id = 1
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.pos = np.zeros((0, 2))
+        self.vel = np.zeros((0, 2))
+        self.size = np.zeros((0, 2))
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+
+    def update(self, boxes):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 5)
+        cents = (boxes[:, 0:2] + boxes[:, 2:4]) / 2.0
+        sizes = boxes[:, 2:4] - boxes[:, 0:2]
+
+        # predição por velocidade constante
+        pred = self.pos + self.vel
+        ti, di = self._associate(pred, cents)
+
+        matched = np.zeros(len(self.ids), dtype=bool)
+        matched[ti] = True
+        # velocidade observada desde a última detecção (a posição seguiu a predição nos frames perdidos)
+        steps = (self.misses[ti] + 1)[:, None]
+        last_obs = pred[ti] - self.vel[ti] * steps
+        new_vel = (cents[di] - last_obs) / steps
+        self.vel[ti] = self.smoothing * new_vel + (1.0 - self.smoothing) * self.vel[ti]
+        self.pos[ti] = cents[di]
+        self.size[ti] = sizes[di]
+        self.hits[ti] += 1
+        self.misses[ti] = 0
+        # trilhas sem detecção seguem a predição
+        self.pos[~matched] = pred[~matched]
+        self.misses[~matched] += 1
+
+        keep = self.misses <= self.max_age
+        self._compact(keep)
+        matched = matched[keep]
+
+        # detecções sem trilha abrem trilhas novas
+        free = np.ones(len(boxes), dtype=bool)
+        free[di] = False
+        n_new = int(free.sum())
+        if n_new:
+            self.ids = np.concatenate([self.ids, np.arange(self._next_id, self._next_id + n_new)])
+            self._next_id += n_new
+            self.pos = np.concatenate([self.pos, cents[free]])
+            self.vel = np.concatenate([self.vel, np.zeros((n_new, 2))])
+            self.size = np.concatenate([self.size, sizes[free]])
+            self.hits = np.concatenate([self.hits, np.ones(n_new, dtype=np.int64)])
+            self.misses = np.concatenate([self.misses, np.zeros(n_new, dtype=np.int64)])
+            matched = np.concatenate([matched, np.ones(n_new, dtype=bool)])
+
+        confirmed = self.hits >= self.n_init
+        half = self.size[confirmed] / 2.0
+        ltrb = np.hstack([self.pos[confirmed] - half, self.pos[confirmed] + half])
+        return self.ids[confirmed].copy(), ltrb, matched[confirmed]
+
+    def _compact(self, keep):
+        if keep.all():
+            return
+        self.ids = self.ids[keep]
+        self.pos = self.pos[keep]
+        self.vel = self.vel[keep]
+        self.size = self.size[keep]
+        self.hits = self.hits[keep]
+        self.misses = self.misses[keep]
+
+    def _associate(self, pred, cents):
+        """Retorna (índices de trilha, índices de detecção) associados."""
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        if len(pred) == 0 or len(cents) == 0:
+            return empty
+        if self.assignment == "hungarian":
+            return self._associate_hungarian(pred, cents)
+        ti, di, dist = candidate_pairs(pred, cents, self.max_distance)
+        if len(ti) == 0:
+            return empty
+        return greedy_match(ti, di, dist)
+
+    def _associate_hungarian(self, pred, cents):
+        from scipy.optimize import linear_sum_assignment
+        cost = np.hypot(pred[:, None, 0] - cents[None, :, 0], pred[:, None, 1] - cents[None, :, 1])
+        gated = cost > self.max_distance
+        cost[gated] = 1e9
+        ti, di = linear_sum_assignment(cost)
+        ok = ~gated[ti, di]
+        return ti[ok].astype(np.int64), di[ok].astype(np.int64)
+
+
+def _grid_keys(cells_x, cells_y):
+    return (cells_x + _GRID_OFFSET) * _GRID_STRIDE + (cells_y + _GRID_OFFSET)
+
+
+def candidate_pairs(pred, cents, radius):
+    """
+    Pares (trilha, detecção) a no máximo `radius` px, via grade de células de lado
+    `radius`: cada trilha só compara com as detecções das 9 células vizinhas.
+    """
+    dcell = np.floor(cents / radius).astype(np.int64)
+    keys = _grid_keys(dcell[:, 0], dcell[:, 1])
+    order = np.argsort(keys, kind="stable")
+    skeys = keys[order]
+    tcell = np.floor(pred / radius).astype(np.int64)
+
+    tis, dis = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            k = _grid_keys(tcell[:, 0] + dx, tcell[:, 1] + dy)
+            lo = np.searchsorted(skeys, k, side="left")
+            hi = np.searchsorted(skeys, k, side="right")
+            counts = hi - lo
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            tis.append(np.repeat(np.arange(len(pred)), counts))
+            dis.append(order[np.repeat(lo, counts) + within])
+    if not tis:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    ti = np.concatenate(tis)
+    di = np.concatenate(dis)
+    dist = np.hypot(pred[ti, 0] - cents[di, 0], pred[ti, 1] - cents[di, 1])
+    near = dist <= radius
+    return ti[near], di[near], dist[near]
+
+
+def greedy_match(ti, di, dist):
+    """
+    Associação gulosa pela menor distância, feita em rodadas vetorizadas: a cada
+    rodada aceitamos os pares que são o melhor candidato tanto da trilha quanto da
+    detecção (mesmo resultado que percorrer os pares em ordem de distância).
+    """
+    order = np.argsort(dist, kind="stable")
+    ti, di = ti[order], di[order]
+    out_t, out_d = [], []
+    while len(ti):
+        _, best_t = np.unique(ti, return_index=True)
+        _, best_d = np.unique(di, return_index=True)
+        mutual = np.intersect1d(best_t, best_d, assume_unique=True)
+        out_t.append(ti[mutual])
+        out_d.append(di[mutual])
+        rest = ~(np.isin(ti, ti[mutual]) | np.isin(di, di[mutual]))
+        ti, di = ti[rest], di[rest]
+    return np.concatenate(out_t), np.concatenate(out_d)
+
+
+TRACKER_BACKENDS = {
+    "deepsort": DeepSortBackend,
+    "centroid": CentroidTracker,
+}
+
+
+def make_backend(name, **kwargs):
+    try:
+        cls = TRACKER_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Rastreador desconhecido: {name!r} (opções: {', '.join(TRACKER_BACKENDS)})")
+    return cls(**kwargs)
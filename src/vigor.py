@@ -2,8 +2,11 @@
 vigor.py
 Índice de vigor simples: vigor = velocity * linearity
 Classificação: Alto / Médio / Baixo
+vigor_index também aceita arrays NumPy (um valor por trilha).
 """
 
+import numpy as np
+
 def vigor_index(vel_um_s, lin):
     return vel_um_s * lin
 
@@ -13,4 +16,9 @@ def vigor_class(v):
     elif v > 5:
         return "Médio"
     else:
-        return "Baixo"
\ No newline at end of file
+        return "Baixo"
+
+def vigor_classes(v):
+    """Versão vetorizada de vigor_class para um array de índices de vigor."""
+    v = np.asarray(v, dtype=float)
+    return np.where(v > 15, "Alto", np.where(v > 5, "Médio", "Baixo"))
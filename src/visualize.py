@@ -3,57 +3,226 @@ visualize.py
 Desenha trilhas no vídeo original e salva um vídeo processado.
 Entrada:
 - video_path: caminho do vídeo original
-- tracks: dict {track_id: [(frame_id, cx, cy), ...]}
+- tracks: TrackTable (track.py) ou dict {track_id: [(frame_id, cx, cy), ...]}
 - out_path: caminho para salvar o vídeo com sobreposição
+- progress: opcional, callable(frame=...) chamado a cada frame escrito
+- max_trail / fade_frames: ver TrailRenderer
+- preview_width: reduz o vídeo de saída para essa largura (codificação mais barata)
+
+OverlayWriter faz o mesmo a partir dos frames já decodificados pela detecção
+(uma única passada pelo decodificador): os frames esperam num buffer circular
+limitado até que as posições das trilhas naquele frame sejam conhecidas.
+
+Os frames desenhados vão para um VideoEncoder (encoder.py), que codifica numa
+thread própria e, com ffmpeg, grava MP4 fragmentado tocável durante a análise.
 """
 
 import cv2
 import os
-import random
+import zlib
+import numpy as np
+from collections import deque
+
+from src.encoder import VideoEncoder
+
+# tabela fixa de cores (sem re-semear o módulo random a cada frame)
+_COLOR_TABLE = [tuple(int(c) for c in row)
+                for row in np.random.default_rng(0).integers(50, 256, size=(256, 3))]
 
 def _color_for_id(i):
-    random.seed(i)
-    return (random.randint(50,255), random.randint(50,255), random.randint(50,255))
+    try:
+        idx = int(i)
+    except (TypeError, ValueError):
+        idx = zlib.crc32(str(i).encode("utf-8"))
+    return _COLOR_TABLE[idx % len(_COLOR_TABLE)]
+
+class TrailRenderer:
+    """
+    Desenho incremental das trilhas: cada novo segmento é desenhado uma única vez
+    numa camada persistente, que é composta (alpha) sobre cada frame.
+    - max_trail: mantém só os últimos N pontos de cada trilha (None = trilha inteira)
+    - dead_after: frames sem aparecer para uma trilha ser considerada encerrada
+    - fade_frames: trilhas encerradas somem gradualmente em N frames (0 = ficam no vídeo)
+    - alpha: opacidade das trilhas ativas
+    A camada ativa só é redesenhada por inteiro quando uma trilha é encerrada ou
+    aparada por max_trail (aparamos com folga de max_trail/2 para amortizar).
+    """
+
+    def __init__(self, max_trail=None, dead_after=30, fade_frames=0, alpha=1.0, thickness=2):
+        self.max_trail = max_trail if max_trail and max_trail > 1 else None
+        self.dead_after = dead_after
+        self.fade_frames = max(0, int(fade_frames))
+        self.alpha = float(alpha)
+        self.thickness = thickness
+        self.trails = {}
+        self.last_seen = {}
+        self._layer = None
+        self._mask = None
+        self._dead_layer = None
+        self._dead_alpha = None
+        self._has_dead = False
+        self._dirty = False
+
+    def _ensure(self, shape):
+        if self._layer is None or self._layer.shape != shape:
+            h, w = shape[:2]
+            self._layer = np.zeros((h, w, 3), dtype=np.uint8)
+            self._mask = np.zeros((h, w), dtype=np.uint8)
+            self._dead_layer = np.zeros((h, w, 3), dtype=np.uint8)
+            self._dead_alpha = np.zeros((h, w), dtype=np.uint8)
+            self._dirty = True
+
+    def _add(self, frame_id, tid, cx, cy):
+        pt = (int(cx), int(cy))
+        trail = self.trails.setdefault(tid, [])
+        if trail and not self._dirty:
+            color = _color_for_id(tid)
+            cv2.line(self._layer, trail[-1], pt, color, self.thickness)
+            cv2.line(self._mask, trail[-1], pt, 255, self.thickness)
+        trail.append(pt)
+        self.last_seen[tid] = frame_id
+        if self.max_trail and len(trail) > self.max_trail + self.max_trail // 2:
+            del trail[:-self.max_trail]
+            self._dirty = True
+
+    def _retire(self, frame_id):
+        dead = [tid for tid, last in self.last_seen.items() if frame_id - last > self.dead_after]
+        for tid in dead:
+            trail = self.trails.pop(tid)
+            del self.last_seen[tid]
+            color = _color_for_id(tid)
+            pts = np.array(trail, dtype=np.int32).reshape(-1, 1, 2)
+            cv2.polylines(self._dead_layer, [pts], False, color, self.thickness)
+            cv2.polylines(self._dead_alpha, [pts], False, 255, self.thickness)
+            if self.fade_frames == 0:
+                # sem esmaecimento: o último ponto e o rótulo ficam no vídeo, como as trilhas
+                self._draw_head(self._dead_layer, tid, trail[-1], color)
+                self._draw_head(self._dead_alpha, tid, trail[-1], 255)
+            self._has_dead = True
+            self._dirty = True
+
+    def _rebuild(self):
+        self._layer[:] = 0
+        self._mask[:] = 0
+        for tid, trail in self.trails.items():
+            if len(trail) < 2:
+                continue
+            pts = np.array(trail, dtype=np.int32).reshape(-1, 1, 2)
+            cv2.polylines(self._layer, [pts], False, _color_for_id(tid), self.thickness)
+            cv2.polylines(self._mask, [pts], False, 255, self.thickness)
+        self._dirty = False
 
-def draw_tracks_on_video(video_path, tracks, out_path):
+    @staticmethod
+    def _draw_head(img, tid, pt, color):
+        cv2.circle(img, pt, 4, color, -1)
+        cv2.putText(img, f"ID:{tid}", (pt[0]+5, pt[1]-5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+
+    def render(self, frame_id, frame, points=()):
+        """Aplica os pontos [(track_id, cx, cy), ...] do frame e desenha as trilhas sobre ele."""
+        self._ensure(frame.shape)
+        for tid, cx, cy in points:
+            self._add(frame_id, tid, cx, cy)
+        self._retire(frame_id)
+        if self._dirty:
+            self._rebuild()
+
+        if self._has_dead:
+            if self.fade_frames == 0:
+                np.copyto(frame, self._dead_layer, where=(self._dead_alpha > 0)[..., None])
+            else:
+                a = self._dead_alpha[..., None] * (1.0 / 255)
+                frame[:] = (frame * (1.0 - a) + self._dead_layer * a).astype(np.uint8)
+                # subtração saturada em uint8: chega a zero em ~fade_frames frames
+                cv2.subtract(self._dead_alpha, max(1, 255 // self.fade_frames), dst=self._dead_alpha)
+                if not self._dead_alpha.any():
+                    self._dead_layer[:] = 0
+                    self._has_dead = False
+
+        mask = self._mask > 0
+        if self.alpha >= 1.0:
+            np.copyto(frame, self._layer, where=mask[..., None])
+        else:
+            frame[mask] = (frame[mask] * (1.0 - self.alpha) + self._layer[mask] * self.alpha).astype(np.uint8)
+        # ponto atual e rótulo só para as trilhas ativas
+        for tid, trail in self.trails.items():
+            self._draw_head(frame, tid, trail[-1], _color_for_id(tid))
+        return frame
+
+def draw_tracks_on_video(video_path, tracks, out_path, progress=None, max_trail=None, fade_frames=0,
+                         preview_width=None):
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise RuntimeError("Não foi possível abrir o vídeo para visualização.")
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     fps = cap.get(cv2.CAP_PROP_FPS) or 25
-    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    out = cv2.VideoWriter(out_path, fourcc, fps, (w, h))
+    out = VideoEncoder(out_path, fps=fps, preview_width=preview_width)
     # construir mapa frame -> list of (track_id, cx, cy)
     frame_map = {}
-    for tid, traj in tracks.items():
-        for fr, cx, cy in traj:
-            frame_map.setdefault(fr, []).append((tid, int(cx), int(cy)))
+    if hasattr(tracks, "by_frame"):
+        # TrackTable (track.py)
+        table = tracks.by_frame()
+        for tid, fr, cx, cy in zip(table.track_id.tolist(), table.frame.tolist(), table.cx.tolist(), table.cy.tolist()):
+            frame_map.setdefault(fr, []).append((tid, cx, cy))
+    else:
+        for tid, traj in tracks.items():
+            for fr, cx, cy in traj:
+                frame_map.setdefault(fr, []).append((tid, cx, cy))
 
     frame_id = 0
-    # para desenhar rastro acumulado, guardamos últimas posições por track
-    trails = {tid: [] for tid in tracks.keys()}
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        if frame_id in frame_map:
-            for tid, cx, cy in frame_map[frame_id]:
-                trails[tid].append((cx, cy))
-        # desenhar trilhas
-        for tid, points in trails.items():
-            color = _color_for_id(tid)
-            # desenhar linhas do rastro
-            for i in range(1, len(points)):
-                cv2.line(frame, points[i-1], points[i], color, 2)
-            # desenhar último ponto
-            if points:
-                cv2.circle(frame, points[-1], 4, color, -1)
-                cv2.putText(frame, f"ID:{tid}", (points[-1][0]+5, points[-1][1]-5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
-        out.write(frame)
-        frame_id += 1
-
-    cap.release()
-    out.release()
-    return out_path
\ No newline at end of file
+    # rastro acumulado desenhado de forma incremental
+    renderer = TrailRenderer(max_trail=max_trail, fade_frames=fade_frames)
+
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            out.write(renderer.render(frame_id, frame, frame_map.get(frame_id, ())))
+            frame_id += 1
+            if progress is not None:
+                progress(frame=frame_id)
+    finally:
+        cap.release()
+        out.close()
+    return out_path
+
+class OverlayWriter:
+    """
+    Escreve o vídeo com trilhas a partir dos frames da própria detecção.
+    push(frame_id, frame): entrega um frame decodificado (em ordem)
+    add_point(frame_id, tid, cx, cy): posição de uma trilha num frame ainda no buffer
+    O frame mais recente sempre espera pelos seus pontos; além dele, até `delay`
+    frames anteriores continuam no buffer. Pontos que chegam para frames já
+    escritos são ignorados.
+    """
+
+    def __init__(self, out_path, fps=25, delay=0, max_trail=None, fade_frames=0, preview_width=None):
+        self.out_path = out_path
+        self.fps = fps or 25
+        self.delay = max(0, int(delay))
+        self._buffer = deque()
+        self._points = {}
+        self._renderer = TrailRenderer(max_trail=max_trail, fade_frames=fade_frames)
+        self._writer = VideoEncoder(out_path, fps=self.fps, preview_width=preview_width)
+        self.frames_written = 0
+
+    def push(self, frame_id, frame):
+        self._buffer.append((frame_id, frame))
+        while len(self._buffer) > self.delay + 1:
+            self._write_oldest()
+
+    def add_point(self, frame_id, tid, cx, cy):
+        if self._buffer and frame_id >= self._buffer[0][0]:
+            self._points.setdefault(frame_id, []).append((tid, cx, cy))
+
+    def _write_oldest(self):
+        frame_id, frame = self._buffer.popleft()
+        self._writer.write(self._renderer.render(frame_id, frame, self._points.pop(frame_id, ())))
+        self.frames_written += 1
+
+    def close(self):
+        try:
+            while self._buffer:
+                self._write_oldest()
+        finally:
+            self._writer.close()
+        return self.out_path
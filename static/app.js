@@ -5,6 +5,8 @@ const summaryDiv = document.getElementById('summary');
 const linksDiv = document.getElementById('links');
 const procVideo = document.getElementById('procVideo');
 const submitBtn = document.getElementById('submitBtn');
+const cancelBtn = document.getElementById('cancelBtn');
+const progressText = document.getElementById('progressText');
 
 form.addEventListener('submit', (e) => {
   e.preventDefault();
@@ -18,7 +20,8 @@ form.addEventListener('submit', (e) => {
   results.classList.add('hidden');
   summaryDiv.innerHTML = '';
   linksDiv.innerHTML = '';
-  procVideo.src = '';
+  procVideo.removeAttribute('src');
+  procVideo.dataset.streaming = '';
 
   const fd = new FormData();
   fd.append('file', fileInput.files[0]);
@@ -26,30 +29,21 @@ form.addEventListener('submit', (e) => {
   fd.append('fps', document.getElementById('fps').value);
   fd.append('drop_volume_ul', document.getElementById('volume').value);
   fd.append('conf', document.getElementById('conf').value);
+  fd.append('tracker', document.getElementById('tracker').value);
+  fd.append('backend', document.getElementById('backend').value);
+  fd.append('preview_width', document.getElementById('previewWidth').value);
 
   const xhr = new XMLHttpRequest();
   xhr.open('POST', '/analyze', true);
 
   xhr.onreadystatechange = function(){
     if (xhr.readyState === 4) {
-      progress.classList.add('hidden');
-      submitBtn.disabled = false;
-      if (xhr.status === 200) {
+      if (xhr.status === 202) {
         const resp = JSON.parse(xhr.responseText);
-        if (resp.status === 'done') {
-          results.classList.remove('hidden');
-          summaryDiv.innerHTML = `<pre>${JSON.stringify(resp.summary, null, 2)}</pre>`;
-          if (resp.processed_video) {
-            procVideo.src = resp.processed_video;
-          }
-          linksDiv.innerHTML = '';
-          if (resp.report_json) linksDiv.innerHTML += `<a href="${resp.report_json}" target="_blank">JSON do Relatório</a>`;
-          if (resp.report_md) linksDiv.innerHTML += `<a href="${resp.report_md}" target="_blank">Relatório (Markdown)</a>`;
-          if (resp.histogram) linksDiv.innerHTML += `<a href="${resp.histogram}" target="_blank">Histograma</a>`;
-        } else {
-          alert("Resposta inesperada: " + JSON.stringify(resp));
-        }
+        followJob(resp);
       } else {
+        progress.classList.add('hidden');
+        submitBtn.disabled = false;
         let msg = "Erro no servidor.";
         try { msg = JSON.parse(xhr.responseText).error || xhr.responseText } catch(e){}
         alert("Erro: " + msg);
@@ -58,4 +52,290 @@ form.addEventListener('submit', (e) => {
   };
 
   xhr.send(fd);
-});
\ No newline at end of file
+});
+
+const STAGE_LABELS = {
+  hash: 'Verificando cache',
+  load_model: 'Carregando modelo',
+  detect: 'Detectando e rastreando',
+  render: 'Gerando vídeo processado',
+  report: 'Gerando relatório'
+};
+
+function finishJob() {
+  progress.classList.add('hidden');
+  submitBtn.disabled = false;
+  cancelBtn.onclick = null;
+}
+
+function showResults(resp) {
+  results.classList.remove('hidden');
+  summaryDiv.innerHTML = `<pre>${JSON.stringify(resp.summary, null, 2)}</pre>`;
+  if (resp.processed_video && procVideo.dataset.streaming) {
+    // troca o stream pelo arquivo completo (com seek) sem perder a posição
+    const time = procVideo.currentTime;
+    const playing = !procVideo.paused && !procVideo.ended;
+    procVideo.dataset.streaming = '';
+    procVideo.src = resp.processed_video;
+    procVideo.addEventListener('loadedmetadata', () => {
+      procVideo.currentTime = time;
+      if (playing) procVideo.play().catch(() => {});
+    }, {once: true});
+  } else if (resp.processed_video) {
+    procVideo.src = resp.processed_video;
+  }
+  linksDiv.innerHTML = '';
+  if (resp.report_json) linksDiv.innerHTML += `<a href="${resp.report_json}" target="_blank">JSON do Relatório</a>`;
+  if (resp.report_md) linksDiv.innerHTML += `<a href="${resp.report_md}" target="_blank">Relatório (Markdown)</a>`;
+  if (resp.histogram) linksDiv.innerHTML += `<a href="${resp.histogram}" target="_blank">Histograma</a>`;
+}
+
+function streamVideo(url) {
+  // vídeo em gravação (MP4 fragmentado): toca enquanto a análise continua
+  results.classList.remove('hidden');
+  summaryDiv.innerHTML = '<p>Análise em andamento; o vídeo processado aparece à medida que é gravado.</p>';
+  procVideo.dataset.streaming = '1';
+  procVideo.muted = true;
+  procVideo.src = url;
+  procVideo.play().catch(() => {});
+}
+
+function followJob(job) {
+  progressText.textContent = 'Na fila...';
+  cancelBtn.onclick = () => fetch(`/jobs/${job.job_id}/cancel`, {method: 'POST'});
+
+  const events = new EventSource(job.events_url);
+  events.onmessage = (ev) => {
+    const state = JSON.parse(ev.data);
+    if (state.status === 'running') {
+      if (state.outputs && state.outputs.video_stream && !procVideo.dataset.streaming) {
+        streamVideo(state.outputs.video_stream);
+      }
+      let text = STAGE_LABELS[state.stage] || 'Processando';
+      if (state.progress !== null) {
+        text += ` — ${Math.round(state.progress * 100)}%`;
+      } else if (state.frame) {
+        text += ` — frame ${state.frame}`;
+      }
+      progressText.textContent = text + '...';
+    } else if (state.status === 'done') {
+      events.close();
+      finishJob();
+      showResults(state.result);
+    } else if (state.status === 'error') {
+      events.close();
+      finishJob();
+      alert("Erro: " + state.error);
+    } else if (state.status === 'cancelled') {
+      events.close();
+      finishJob();
+    }
+  };
+}
+
+// ---------------------------------------------------------------- ao vivo
+
+const liveForm = document.getElementById('liveForm');
+const liveStartBtn = document.getElementById('liveStartBtn');
+const liveStopBtn = document.getElementById('liveStopBtn');
+const livePanel = document.getElementById('livePanel');
+const liveMetrics = document.getElementById('liveMetrics');
+const liveStatus = document.getElementById('liveStatus');
+const liveLag = document.getElementById('liveLag');
+let liveEvents = null;
+
+function fmt(value, digits) {
+  return (value === null || value === undefined) ? '—' : Number(value).toFixed(digits);
+}
+
+function drawLag(recent, budget) {
+  const ctx = liveLag.getContext('2d');
+  const w = liveLag.width, h = liveLag.height;
+  ctx.clearRect(0, 0, w, h);
+  if (!recent || recent.length === 0) return;
+  const top = Math.max(budget * 1.5, ...recent.map(r => r[1]));
+  const step = w / Math.max(recent.length - 1, 1);
+  // linha do orçamento de latência
+  ctx.strokeStyle = 'rgba(248,113,113,0.7)';
+  ctx.beginPath();
+  ctx.moveTo(0, h - budget / top * h);
+  ctx.lineTo(w, h - budget / top * h);
+  ctx.stroke();
+  ctx.strokeStyle = '#2dd4bf';
+  ctx.beginPath();
+  recent.forEach((r, i) => {
+    const y = h - r[1] / top * h;
+    if (i === 0) ctx.moveTo(0, y); else ctx.lineTo(i * step, y);
+  });
+  ctx.stroke();
+}
+
+function showLive(state) {
+  if (!state.summary) {
+    liveStatus.textContent = 'Iniciando...';
+    return;
+  }
+  const items = [
+    ['Motilidade progressiva', fmt(state.summary['motilidade_progressiva_%'], 1) + '%'],
+    ['Vigor médio', fmt(state.summary.vigor_medio, 1)],
+    ['Concentração (sptz/mL)', Number(state.concentration).toExponential(2)],
+    ['Trajetórias na janela', state.summary.n_trajetorias],
+    ['Atraso p50 / p95 (ms)', `${fmt(state.lag_ms.p50, 0)} / ${fmt(state.lag_ms.p95, 0)}`],
+    ['Frames processados', `${state.processed} de ${state.frames_read}`],
+  ];
+  liveMetrics.innerHTML = items.map(([k, v]) => `<div><b>${v}</b><span>${k}</span></div>`).join('');
+  drawLag(state.recent_lags, state.latency_budget_ms);
+  liveStatus.textContent = `frame ${state.frame} · ${fmt(state.fps_out, 1)} de ${fmt(state.fps_in, 1)} frames/s analisados · ` +
+    `último atraso ${fmt(state.lag_ms.last, 0)} ms · ${state.late} descartados por atraso`;
+}
+
+function endLive() {
+  if (liveEvents) liveEvents.close();
+  liveEvents = null;
+  liveStartBtn.disabled = false;
+  liveStopBtn.classList.add('hidden');
+  liveStopBtn.onclick = null;
+}
+
+liveForm.addEventListener('submit', (e) => {
+  e.preventDefault();
+  const fd = new FormData();
+  const liveFile = document.getElementById('liveFile');
+  if (liveFile.files && liveFile.files.length > 0) {
+    fd.append('file', liveFile.files[0]);
+  } else {
+    fd.append('source', document.getElementById('liveSource').value);
+  }
+  fd.append('latency_budget_ms', document.getElementById('liveBudget').value);
+  fd.append('window_s', document.getElementById('liveWindow').value);
+  fd.append('microns_per_pixel', document.getElementById('microns').value);
+  fd.append('drop_volume_ul', document.getElementById('volume').value);
+  fd.append('conf', document.getElementById('conf').value);
+  fd.append('tracker', document.getElementById('tracker').value);
+  fd.append('backend', document.getElementById('backend').value);
+
+  liveStartBtn.disabled = true;
+  fetch('/live', {method: 'POST', body: fd})
+    .then(r => r.json().then(body => ({ok: r.ok, body})))
+    .then(({ok, body}) => {
+      if (!ok) throw new Error(body.error || 'Erro no servidor.');
+      livePanel.classList.remove('hidden');
+      liveStopBtn.classList.remove('hidden');
+      liveStopBtn.onclick = () => fetch(body.stop_url, {method: 'POST'});
+      liveEvents = new EventSource(body.events_url);
+      liveEvents.onmessage = (ev) => {
+        const state = JSON.parse(ev.data);
+        if (state.status === 'error') {
+          endLive();
+          alert('Erro: ' + state.error);
+          return;
+        }
+        showLive(state);
+        if (state.status === 'done' || state.status === 'stopped') {
+          liveStatus.textContent += state.status === 'done' ? ' · fim da fonte' : ' · parado';
+          endLive();
+        }
+      };
+    })
+    .catch(err => {
+      endLive();
+      alert('Erro: ' + err.message);
+    });
+});
+
+// ---------------------------------------------------------------- histórico
+
+const historyForm = document.getElementById('historyForm');
+const historyPanel = document.getElementById('historyPanel');
+const historyTrend = document.getElementById('historyTrend');
+const historyBody = document.querySelector('#historyTable tbody');
+const historyInfo = document.getElementById('historyInfo');
+const historyPrev = document.getElementById('historyPrev');
+const historyNext = document.getElementById('historyNext');
+const HISTORY_PAGE = 25;
+let historyOffset = 0;
+
+function historyParams() {
+  const params = new URLSearchParams();
+  const fields = {since: 'historySince', until: 'historyUntil', sample: 'historySample'};
+  for (const [name, id] of Object.entries(fields)) {
+    const value = document.getElementById(id).value.trim();
+    if (value) params.set(name, value);
+  }
+  return params;
+}
+
+function drawTrend(buckets) {
+  const ctx = historyTrend.getContext('2d');
+  const w = historyTrend.width, h = historyTrend.height, pad = 16;
+  ctx.clearRect(0, 0, w, h);
+  if (buckets.length === 0) return;
+  const step = (w - 2 * pad) / Math.max(buckets.length - 1, 1);
+  const x = (i) => buckets.length === 1 ? w / 2 : pad + i * step;
+  // motilidade em 0-100%; vigor na sua própria escala
+  const series = [
+    ['progressive_motility', '#2dd4bf', 100],
+    ['vigor_mean', '#fbbf24', Math.max(...buckets.map(b => b.vigor_mean || 0), 1)],
+  ];
+  for (const [key, color, top] of series) {
+    ctx.strokeStyle = color;
+    ctx.fillStyle = color;
+    ctx.beginPath();
+    buckets.forEach((b, i) => {
+      const y = h - pad - (b[key] || 0) / top * (h - 2 * pad);
+      if (i === 0) ctx.moveTo(x(i), y); else ctx.lineTo(x(i), y);
+    });
+    ctx.stroke();
+    buckets.forEach((b, i) => {
+      ctx.fillRect(x(i) - 2, h - pad - (b[key] || 0) / top * (h - 2 * pad) - 2, 4, 4);
+    });
+  }
+  ctx.fillStyle = 'rgba(255,255,255,0.5)';
+  ctx.font = '11px sans-serif';
+  ctx.fillText(buckets[0].bucket, pad, h - 2);
+  if (buckets.length > 1) {
+    const last = buckets[buckets.length - 1].bucket;
+    ctx.fillText(last, w - pad - ctx.measureText(last).width, h - 2);
+  }
+}
+
+function showHistoryPage(page) {
+  historyBody.innerHTML = page.items.map(item => {
+    const date = new Date(item.created_at * 1000).toLocaleString('pt-BR');
+    const link = item.report_json ? `<a href="${item.report_json}" target="_blank">JSON</a>` : '';
+    return `<tr><td>${date}</td><td>${item.sample || ''}</td><td>${fmt(item.progressive_motility, 1)}</td>` +
+      `<td>${fmt(item.vigor_mean, 1)}</td><td>${item.n_tracks ?? '—'}</td>` +
+      `<td>${item.concentration ? Number(item.concentration).toExponential(2) : '—'}</td><td>${link}</td></tr>`;
+  }).join('');
+  const end = Math.min(page.offset + page.items.length, page.total);
+  historyInfo.textContent = page.total ? `${page.offset + 1}–${end} de ${page.total}` : 'Nenhuma amostra';
+  historyPrev.disabled = page.offset === 0;
+  historyNext.disabled = end >= page.total;
+}
+
+function loadHistory(offset) {
+  historyOffset = offset;
+  const params = historyParams();
+  const trend = new URLSearchParams(params);
+  trend.set('bucket', document.getElementById('historyBucket').value);
+  params.set('limit', HISTORY_PAGE);
+  params.set('offset', offset);
+  const get = (url) => fetch(url).then(r => r.json().then(body => {
+    if (!r.ok) throw new Error(body.error || 'Erro no servidor.');
+    return body;
+  }));
+  Promise.all([get('/history?' + params), offset === 0 ? get('/history/trend?' + trend) : null])
+    .then(([page, trendBody]) => {
+      historyPanel.classList.remove('hidden');
+      if (trendBody) drawTrend(trendBody.buckets);
+      showHistoryPage(page);
+    })
+    .catch(err => alert('Erro: ' + err.message));
+}
+
+historyForm.addEventListener('submit', (e) => {
+  e.preventDefault();
+  loadHistory(0);
+});
+historyPrev.onclick = () => loadHistory(Math.max(0, historyOffset - HISTORY_PAGE));
+historyNext.onclick = () => loadHistory(historyOffset + HISTORY_PAGE);
@@ -0,0 +1,84 @@
+"""
+Servidor Flask (app.py): validação dos campos do formulário.
+O app é importado num diretório temporário (ele cria uploads/, reports/ e cache/ no
+diretório atual) e sem o aquecimento em segundo plano.
+"""
+
+import importlib
+import io
+import os
+import types
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("app")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(workdir)
+        mp.setenv("SPERMAI_PREWARM", "0")
+        mp.delenv("SPERMAI_HISTORY_DB", raising=False)
+        mp.delenv("SPERMAI_CACHE_DIR", raising=False)
+        module = importlib.import_module("app")
+        module.app.config["PREWARM"] = False
+        yield module, workdir
+
+
+@pytest.fixture
+def submitted(server, monkeypatch):
+    """Substitui jobs.submit: registra as análises aceitas sem rodá-las."""
+    module, _ = server
+    calls = []
+
+    def submit(fn, uid, in_path, params, options):
+        calls.append((in_path, params, options))
+        return types.SimpleNamespace(id="job", status="queued")
+
+    monkeypatch.setattr(module.jobs, "submit", submit)
+    return calls
+
+
+def _post(server, path, **form):
+    module, _ = server
+    data = dict(form)
+    if "file" not in data:
+        data["file"] = (io.BytesIO(b"video"), "amostra.mp4")
+    return module.app.test_client().post(path, data=data, content_type="multipart/form-data")
+
+
+def _uploads(server):
+    module, workdir = server
+    return os.listdir(os.path.join(workdir, module.app.config["UPLOAD_FOLDER"]))
+
+
+@pytest.mark.parametrize("field, value", [
+    ("conf", "abc"), ("conf", "1.5"), ("fps", "0"), ("fps", "nan"), ("microns_per_pixel", "-0.5"),
+    ("drop_volume_ul", "inf"), ("batch_size", "1.5"), ("shards", "0"), ("max_frames", "-1"),
+    ("tile_size", "x"), ("skip_frames", "-2"), ("trail_length", "0"), ("preview_width", "abc"),
+])
+def test_analyze_rejects_bad_fields(server, submitted, field, value):
+    resp = _post(server, "/analyze", **{field: value})
+    assert resp.status_code == 400
+    assert field in resp.get_json()["error"]
+    assert submitted == []
+    assert _uploads(server) == []
+
+
+def test_analyze_defaults_for_empty_fields(server, submitted):
+    resp = _post(server, "/analyze", fps="30", conf="", tracker="centroid", preview_width="", max_frames="10")
+    assert resp.status_code == 202
+    (in_path, params, options), = submitted
+    assert params["fps"] == 30.0 and params["conf"] == 0.25 and params["microns_per_pixel"] == 0.5
+    assert options["max_frames"] == 10 and options["batch_size"] == 1
+    assert options["overlay"]["preview_width"] is None
+    assert options["sampling"] == {"skip_frames": 0, "adaptive": False, "motion_threshold": 0.25, "max_skip": 8}
+    os.remove(in_path)
+
+
+def test_live_rejects_bad_fields(server):
+    resp = _post(server, "/live", conf="alto", tracker="centroid")
+    assert resp.status_code == 400
+    assert "conf" in resp.get_json()["error"]
+    # o vídeo enviado para o teste não fica para trás
+    assert _uploads(server) == []
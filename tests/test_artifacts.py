@@ -0,0 +1,94 @@
+"""Formato colunar de artefatos (src/artifacts.py): gravação e leitura mapeada em memória."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.artifacts import DETECTION_COLUMNS, TRACK_COLUMNS, ArtifactWriter, read_artifacts, write_artifacts
+from src.track import TrackTable
+
+
+def _tracks(rng, n_tracks=5, n_points=20):
+    ids = np.repeat(np.arange(1, n_tracks + 1), n_points)
+    frames = np.tile(np.arange(n_points), n_tracks)
+    return TrackTable(ids, frames, rng.uniform(0, 640, len(ids)), rng.uniform(0, 480, len(ids)))
+
+
+def _detections(rng, n=100):
+    det = rng.uniform(0, 640, size=(n, 6)).astype(np.float32)
+    det[:, 0] = np.sort(rng.integers(0, 50, n))
+    return det
+
+
+def _assert_tables_equal(a, b):
+    for name in TRACK_COLUMNS:
+        np.testing.assert_array_equal(getattr(a, name), getattr(b, name))
+
+
+def test_round_trip_mmap(tmp_path):
+    rng = np.random.default_rng(0)
+    tracks, detections = _tracks(rng), _detections(rng)
+    write_artifacts(str(tmp_path), tracks, detections, meta={"weights": "x.pt", "conf": 0.25})
+
+    artifacts = read_artifacts(str(tmp_path))
+    assert artifacts.meta == {"weights": "x.pt", "conf": 0.25}
+    assert artifacts.manifest["n_detections"] == 100
+    assert artifacts.manifest["n_track_points"] == 100
+    assert artifacts.manifest["n_tracks"] == 5
+    _assert_tables_equal(artifacts.tracks, tracks)
+    assert isinstance(artifacts.column("tracks.cx"), np.memmap)
+    for name, dtype in TRACK_COLUMNS.items():
+        assert artifacts.column(f"tracks.{name}").dtype == np.dtype(dtype)
+    for name, dtype in DETECTION_COLUMNS.items():
+        assert artifacts.column(f"detections.{name}").dtype == np.dtype(dtype)
+    np.testing.assert_array_equal(artifacts.detections, detections)
+    # sem mmap: mesmos valores, arrays comuns
+    plain = read_artifacts(str(tmp_path), mmap=False)
+    assert not isinstance(plain.column("tracks.cx"), np.memmap)
+    _assert_tables_equal(plain.tracks, tracks)
+
+
+def test_empty_table(tmp_path):
+    write_artifacts(str(tmp_path), TrackTable.empty())
+    artifacts = read_artifacts(str(tmp_path))
+    assert artifacts.manifest["n_detections"] == 0
+    assert artifacts.manifest["n_tracks"] == 0
+    assert len(artifacts.tracks) == 0
+    assert artifacts.tracks.to_dict() == {}
+    assert artifacts.detections.shape == (0, 6)
+
+
+def test_writer_in_chunks_matches_write_artifacts(tmp_path):
+    rng = np.random.default_rng(1)
+    tracks, detections = _tracks(rng, n_tracks=8), _detections(rng, n=257)
+    write_artifacts(str(tmp_path / "whole"), tracks, detections)
+
+    # flush_rows pequeno: as detecções vão para o disco em vários blocos
+    writer = ArtifactWriter(str(tmp_path / "chunks"), flush_rows=16)
+    for chunk in np.array_split(detections, 40):
+        writer.add_detections(chunk)
+    for tid in range(1, 9):
+        writer.add_tracks(tracks.take(tracks.track_id == tid))
+    writer.close({"a": 1})
+
+    whole, chunks = read_artifacts(str(tmp_path / "whole")), read_artifacts(str(tmp_path / "chunks"))
+    np.testing.assert_array_equal(chunks.detections, whole.detections)
+    _assert_tables_equal(chunks.tracks, whole.tracks)
+    for key in ("n_detections", "n_track_points", "n_tracks", "columns"):
+        assert chunks.manifest[key] == whole.manifest[key]
+    # cada coluna é um .npy comum, legível sem o manifesto
+    assert np.load(str(tmp_path / "chunks" / "detections.score.npy")).shape == (257,)
+
+
+def test_manifest_mismatch_is_rejected(tmp_path):
+    write_artifacts(str(tmp_path), _tracks(np.random.default_rng(2)))
+    path = os.path.join(str(tmp_path), "manifest.json")
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest["columns"]["tracks.cx"]["length"] += 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    with pytest.raises(ValueError):
+        read_artifacts(str(tmp_path)).tracks
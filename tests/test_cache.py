@@ -0,0 +1,132 @@
+"""Cache de resultados (src/cache.py): leitura preguiçosa, LRU por tamanho e gravação atômica."""
+
+import os
+
+import numpy as np
+import pytest
+
+from src.cache import ResultCache
+from src.track import TrackTable
+
+
+def _tracks(rng, n_tracks=4, n_points=50):
+    ids = np.repeat(np.arange(1, n_tracks + 1), n_points)
+    frames = np.tile(np.arange(n_points), n_tracks)
+    return TrackTable(ids, frames, rng.uniform(0, 640, len(ids)), rng.uniform(0, 480, len(ids)))
+
+
+def _detections(rng, n=200):
+    det = rng.uniform(0, 640, size=(n, 6)).astype(np.float32)
+    det[:, 0] = np.sort(rng.integers(0, 50, n))
+    return det
+
+
+def _entry_bytes(cache, key):
+    return sum(e.stat().st_size for e in os.scandir(cache._dir(key)) if e.is_file())
+
+
+def _entries(cache):
+    return sorted(name for name in os.listdir(cache.root))
+
+
+def test_get_put(tmp_path):
+    rng = np.random.default_rng(0)
+    cache = ResultCache(root=str(tmp_path))
+    tracks, detections = _tracks(rng), _detections(rng)
+    assert cache.get("k") is None
+
+    overlay = tmp_path / "overlay_src.mp4"
+    overlay.write_bytes(b"video")
+    cache.put("k", tracks, detections, meta={"conf": 0.25}, overlay_path=str(overlay))
+    hit = cache.get("k")
+    assert hit["meta"]["conf"] == 0.25
+    assert "created_at" in hit["meta"]
+    for name in ("track_id", "frame", "cx", "cy"):
+        np.testing.assert_array_equal(getattr(hit["tracks"], name), getattr(tracks, name))
+    # no acerto só as colunas das trilhas são lidas; as detecções ficam para quando forem pedidas
+    assert not any(name.startswith("detections.") for name in hit["artifacts"]._columns)
+    np.testing.assert_array_equal(hit["artifacts"].detections, detections)
+    with open(hit["overlay_path"], "rb") as f:
+        assert f.read() == b"video"
+    assert cache.stats() == {"hits": 1, "misses": 1, "max_bytes": cache.max_bytes}
+
+
+def test_put_without_detections_or_overlay(tmp_path):
+    cache = ResultCache(root=str(tmp_path))
+    cache.put("k", TrackTable.empty())
+    hit = cache.get("k")
+    assert len(hit["tracks"]) == 0
+    assert hit["artifacts"].detections.shape == (0, 6)
+    assert hit["overlay_path"] is None
+
+
+def test_lru_eviction_by_size(tmp_path):
+    rng = np.random.default_rng(1)
+    tracks, detections = _tracks(rng), _detections(rng)
+    cache = ResultCache(root=str(tmp_path), max_bytes=10 ** 9)
+    cache.put("a", tracks, detections)
+    size = _entry_bytes(cache, "a")
+    # cabem duas entradas, não três
+    cache.max_bytes = int(2.5 * size)
+    cache.put("b", tracks, detections)
+    os.utime(cache._dir("a"), (1000, 1000))
+    os.utime(cache._dir("b"), (2000, 2000))
+    # ler "a" a torna a mais recente: quem sai ao gravar "c" é "b"
+    assert cache.get("a") is not None
+    cache.put("c", tracks, detections)
+    assert _entries(cache) == ["a", "c"]
+    assert cache.get("b") is None
+
+    # limite zero: sobra nada
+    cache.max_bytes = 0
+    cache.evict()
+    assert _entries(cache) == []
+
+
+def test_writer_commit_is_atomic(tmp_path):
+    rng = np.random.default_rng(2)
+    tracks, detections = _tracks(rng), _detections(rng)
+    cache = ResultCache(root=str(tmp_path), max_bytes=1)
+    writer = cache.writer("k", meta={"tracker": "centroid"})
+    writer.add_detections(detections)
+    writer.add_tracks(tracks)
+    # em gravação: só o diretório temporário existe, invisível para get() e para evict()
+    tmp = os.path.basename(writer.tmp)
+    assert _entries(cache) == [tmp] and tmp.startswith(".tmp_k_")
+    assert cache.get("k") is None
+    cache.evict()
+    assert _entries(cache) == [tmp]
+
+    cache.max_bytes = 10 ** 9
+    writer.commit()
+    assert _entries(cache) == ["k"]
+    hit = cache.get("k")
+    assert hit["meta"]["tracker"] == "centroid"
+    np.testing.assert_array_equal(hit["artifacts"].detections, detections)
+
+
+def test_writer_abort_and_concurrent_commit(tmp_path):
+    rng = np.random.default_rng(3)
+    cache = ResultCache(root=str(tmp_path))
+    aborted = cache.writer("k")
+    aborted.add_tracks(_tracks(rng))
+    aborted.abort()
+    assert _entries(cache) == []
+
+    # duas análises do mesmo vídeo: a primeira a publicar fica, a outra é descartada
+    first, second = cache.writer("k", meta={"n": 1}), cache.writer("k", meta={"n": 2})
+    first.add_tracks(_tracks(rng))
+    second.add_tracks(_tracks(rng))
+    first.commit()
+    second.commit()
+    assert _entries(cache) == ["k"]
+    assert cache.get("k")["meta"]["n"] == 1
+
+
+def test_failed_commit_leaves_no_entry(tmp_path):
+    cache = ResultCache(root=str(tmp_path))
+    writer = cache.writer("k", meta={"bad": object()})
+    writer.add_tracks(_tracks(np.random.default_rng(4)))
+    with pytest.raises(TypeError):
+        writer.commit()
+    assert _entries(cache) == []
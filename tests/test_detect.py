@@ -0,0 +1,65 @@
+"""
+Inferência em lotes (SpermDetector.iter_detections, batch_size > 1): as mesmas detecções,
+na mesma ordem, que frame a frame — inclusive com frames pulados (None) no meio do lote.
+Backend simulado (benchmarks/stub_detector.py), cujas caixas dependem só do frame.
+"""
+
+import numpy as np
+import pytest
+
+from benchmarks.stub_detector import BACKEND as STUB_BACKEND, write_stub_weights
+from benchmarks.synthetic import Scenario, render_video, simulate
+from src.detect import SpermDetector
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("detect")
+    # 37 frames: o último lote fica incompleto para qualquer batch_size abaixo
+    scenario = Scenario(n_cells=12, speed=3.0, width=192, height=144, n_frames=37, seed=3)
+    video = render_video(scenario, simulate(scenario), str(workdir / "clip.mp4"))
+    return video, write_stub_weights(str(workdir), jitter=0.5, miss_rate=0.1, seed=3)
+
+
+def _detections(clip, batch_size, return_frames=False, **kwargs):
+    video, weights = clip
+    detector = SpermDetector(weights=weights, backend=STUB_BACKEND, batch_size=batch_size, **kwargs)
+    return list(detector.iter_detections(video, return_frames=return_frames))
+
+
+def _assert_same(batched, single):
+    assert [item[0] for item in batched] == [item[0] for item in single]
+    for b, s in zip(batched, single):
+        if s[1] is None:
+            assert b[1] is None
+        else:
+            np.testing.assert_array_equal(b[1], s[1])
+        for extra_b, extra_s in zip(b[2:], s[2:]):
+            np.testing.assert_array_equal(extra_b, extra_s)
+
+
+@pytest.mark.parametrize("batch_size", [3, 4, 8])
+@pytest.mark.parametrize("options", [
+    {},
+    {"skip_frames": 1},
+    {"skip_frames": 4},  # com batch_size 3, há lotes só de frames pulados
+    {"adaptive": True, "motion_threshold": 5.0, "max_skip": 3},
+], ids=["full", "skip1", "skip4", "adaptive"])
+def test_batched_matches_single(clip, batch_size, options):
+    single = _detections(clip, 1, **options)
+    batched = _detections(clip, batch_size, **options)
+    assert len(single) == 37
+    _assert_same(batched, single)
+    if options:
+        skipped = [boxes is None for _, boxes in single]
+        assert any(skipped) and not all(skipped)
+        # algum lote mistura frames pulados e inferidos
+        lots = [skipped[i:i + batch_size] for i in range(0, len(skipped), batch_size)]
+        assert any(any(lot) and not all(lot) for lot in lots)
+    assert sum(len(boxes) for _, boxes in single if boxes is not None) > 0
+
+
+def test_batched_return_frames(clip):
+    single = _detections(clip, 1, return_frames=True, skip_frames=2)
+    batched = _detections(clip, 4, return_frames=True, skip_frames=2)
+    _assert_same(batched, single)
@@ -0,0 +1,106 @@
+"""
+Codificação do vídeo processado (src/encoder.py): fallback para o cv2.VideoWriter sem
+ffmpeg e erros da thread do encoder chegando a quem escreve, à pipeline e ao job.
+O ffmpeg com defeito é simulado por um script que sai com erro.
+"""
+
+import stat
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.stub_detector import BACKEND as STUB_BACKEND, write_stub_weights
+from benchmarks.synthetic import Scenario, render_video, simulate
+from src import encoder
+from src.detect import SpermDetector
+from src.jobs import CANCELLED, ERROR, FINISHED_STATES, JobManager
+from src.pipeline import analyze_video
+from src.track import SpermTracker
+
+
+@pytest.fixture
+def broken_ffmpeg(tmp_path, monkeypatch):
+    script = tmp_path / "ffmpeg"
+    script.write_text("#!/bin/sh\necho 'Unknown encoder libx264' >&2\nexit 1\n")
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("SPERMAI_FFMPEG", str(script))
+    return str(script)
+
+
+def _frames(n, h=240, w=320):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, size=(h, w, 3), dtype=np.uint8) for _ in range(n)]
+
+
+def test_cv2_fallback_writes_readable_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(encoder, "find_ffmpeg", lambda: None)
+    out = str(tmp_path / "out.mp4")
+    enc = encoder.VideoEncoder(out, fps=10, preview_width=160, queue_size=2)
+    assert not enc.streamable
+    for frame in _frames(20):
+        enc.write(frame)
+    assert enc.close() == out
+    assert enc.frames_written == 20 and enc.size == (160, 120)
+
+    cap = cv2.VideoCapture(out)
+    try:
+        assert cap.isOpened()
+        sizes = []
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            sizes.append(frame.shape)
+    finally:
+        cap.release()
+    assert sizes == [(120, 160, 3)] * 20
+
+
+def test_encoder_error_reaches_writer(tmp_path, broken_ffmpeg):
+    enc = encoder.VideoEncoder(str(tmp_path / "out.mp4"), fps=10, queue_size=2)
+    assert enc.ffmpeg == broken_ffmpeg and enc.streamable
+    with pytest.raises(RuntimeError, match="Unknown encoder libx264"):
+        for frame in _frames(50):
+            enc.write(frame)
+        enc.close()
+    # o erro continua visível em chamadas seguintes
+    with pytest.raises(RuntimeError, match="ffmpeg"):
+        enc.close()
+
+
+def _run_job(tmp_path, cancel_at=None):
+    scenario = Scenario(n_cells=5, speed=2.0, width=160, height=120, n_frames=40, seed=0)
+    video = render_video(scenario, simulate(scenario), str(tmp_path / "clip.mp4"))
+    weights = write_stub_weights(str(tmp_path))
+
+    def analysis(job):
+        def progress(stage=None, frame=None, total_frames=None):
+            if cancel_at is not None and (frame or 0) >= cancel_at:
+                job.cancel()
+            job.report(stage, frame, total_frames)
+
+        detector = SpermDetector(weights=weights, backend=STUB_BACKEND)
+        return analyze_video(detector, SpermTracker(backend="centroid"), video, fps=25.0, microns_per_pixel=0.5,
+                             drop_volume_ul=2.0, progress=progress, overlay_path=str(tmp_path / "overlay.mp4"))
+
+    job = JobManager(max_workers=1).submit(analysis)
+    deadline = time.monotonic() + 60
+    version = -1
+    while job.status not in FINISHED_STATES and time.monotonic() < deadline:
+        version = job.wait_for_change(version, timeout=1)
+    return job
+
+
+def test_encoder_error_reaches_job(tmp_path, broken_ffmpeg):
+    job = _run_job(tmp_path)
+    assert job.status == ERROR
+    assert "ffmpeg" in job.error and "Unknown encoder libx264" in job.error
+
+
+def test_cancel_not_masked_by_encoder_error(tmp_path, broken_ffmpeg):
+    # cancelado logo no início: a falha do encoder só aparece ao descarregar os frames
+    # pendentes no close(), e não pode trocar o cancelamento por um erro
+    job = _run_job(tmp_path, cancel_at=1)
+    assert job.status == CANCELLED and job.error is None
@@ -0,0 +1,143 @@
+"""Índice SQLite do histórico (src/history.py) e o registro feito por report.generate_report_json."""
+
+import datetime
+import json
+import logging
+import os
+import sqlite3
+
+import pytest
+
+from src.history import HistoryIndex
+from src.report import generate_report_json
+
+PARAMS = {"weights": "yolov8n.pt", "backend": "torch", "tracker": "centroid", "conf": 0.25,
+          "microns_per_pixel": 0.5, "fps": 25.0, "drop_volume_ul": 2.0}
+
+
+def _summary(motility, n_tracks=10):
+    return {"motilidade_progressiva_%": motility, "vigor_medio": 1.5, "n_trajetorias": n_tracks}
+
+
+def _tracks():
+    return [{"track_id": 1, "velocity_um_s": 30.0, "vsl_um_s": 20.0, "vap_um_s": 25.0, "linearity": 0.6,
+             "vigor_class": "Alto"},
+            {"track_id": 2, "velocity_um_s": 10.0, "vsl_um_s": 4.0, "vap_um_s": 6.0, "linearity": 0.4,
+             "vigor_class": "Baixo"}]
+
+
+def _epoch(day, hour=12):
+    return datetime.datetime.fromisoformat(f"{day}T{hour:02d}:00").timestamp()
+
+
+@pytest.fixture
+def index(tmp_path):
+    return HistoryIndex(str(tmp_path / "history.sqlite"))
+
+
+def _record(index, tmp_path, name, motility, day, tracker="centroid", n_tracks=10):
+    report = {"summary": _summary(motility, n_tracks), "tracks": _tracks(), "concentration": 1e7,
+              "params": dict(PARAMS, tracker=tracker)}
+    index.record(str(tmp_path / f"{name}.json"), report, sample=name, created_at=_epoch(day))
+
+
+def test_record_and_query(index, tmp_path):
+    _record(index, tmp_path, "carneiro_01", 40.0, "2024-05-06")
+    _record(index, tmp_path, "carneiro_02", 60.0, "2024-05-07", tracker="deepsort")
+    _record(index, tmp_path, "touro_01", 80.0, "2024-05-08", n_tracks=3)
+
+    item = index.query(sample="carneiro_01")["items"][0]
+    assert item["progressive_motility"] == 40.0
+    assert item["day"] == "2024-05-06"
+    assert item["vcl_mean"] == 20.0 and item["vcl_median"] == 20.0
+    assert item["vsl_mean"] == 12.0 and item["linearity_mean"] == pytest.approx(0.5)
+    assert (item["vigor_alto"], item["vigor_medio"], item["vigor_baixo"]) == (1, 0, 1)
+    assert item["params"] == PARAMS
+
+    assert [i["sample"] for i in index.query()["items"]] == ["touro_01", "carneiro_02", "carneiro_01"]
+    assert [i["sample"] for i in index.query(sort="progressive_motility", order="asc")["items"]] == \
+        ["carneiro_01", "carneiro_02", "touro_01"]
+    assert index.query(sample="CARNEIRO")["total"] == 2
+    assert index.query(since="2024-05-07")["total"] == 2
+    assert index.query(until="2024-05-07")["total"] == 2
+    assert index.query(tracker="deepsort")["total"] == 1
+    assert index.query(min_motility=50, min_tracks=5)["total"] == 1
+    page = index.query(limit=1, offset=1)
+    assert page["total"] == 3 and [i["sample"] for i in page["items"]] == ["carneiro_02"]
+    with pytest.raises(ValueError):
+        index.query(sort="params")
+
+    # o mesmo relatório gravado de novo atualiza a linha
+    _record(index, tmp_path, "touro_01", 70.0, "2024-05-08")
+    assert index.count() == 3
+    assert index.query(sample="touro")["items"][0]["progressive_motility"] == 70.0
+
+
+def test_trend(index, tmp_path):
+    _record(index, tmp_path, "a", 40.0, "2024-05-06")
+    _record(index, tmp_path, "b", 60.0, "2024-05-06")
+    _record(index, tmp_path, "c", 90.0, "2024-05-07")
+    _record(index, tmp_path, "d", 30.0, "2024-06-03")
+
+    days = index.trend("day")["buckets"]
+    assert [b["bucket"] for b in days] == ["2024-05-06", "2024-05-07", "2024-06-03"]
+    assert [b["n_samples"] for b in days] == [2, 1, 1]
+    assert days[0]["progressive_motility"] == 50.0
+    assert (days[0]["min_motility"], days[0]["max_motility"]) == (40.0, 60.0)
+
+    # médias do mês ponderadas pelas amostras de cada dia, não média das médias diárias
+    months = index.trend("month")["buckets"]
+    assert [b["bucket"] for b in months] == ["2024-05", "2024-06"]
+    assert months[0]["n_samples"] == 3
+    assert months[0]["progressive_motility"] == pytest.approx(190.0 / 3)
+    assert months[0]["n_tracks"] == 30
+    assert index.trend("week", since="2024-06-01")["buckets"][0]["n_samples"] == 1
+    with pytest.raises(ValueError):
+        index.trend("year")
+
+
+def test_rebuild_recovers_sample_names(index, tmp_path):
+    reports = tmp_path / "reports"
+    # servidor: reports/<uid>/report.json; batch.py: <lote>/<amostra>/report.json; main.py: <saída>.json
+    generate_report_json(str(reports / "3f2a9c" / "report.json"), _summary(40.0), _tracks(), 1e7, PARAMS,
+                         sample="carneiro_01.mp4")
+    generate_report_json(str(reports / "lote" / "touro_01" / "report.json"), _summary(60.0), _tracks(), 1e7,
+                         PARAMS, sample="touro_01")
+    generate_report_json(str(reports / "sample_report.json"), _summary(80.0), _tracks(), 1e7, PARAMS,
+                         sample="ovelha_07")
+    # relatórios antigos, sem o nome gravado
+    generate_report_json(str(reports / "antigo.json"), _summary(20.0), _tracks(), 1e7, PARAMS)
+    generate_report_json(str(reports / "lote" / "bode_02" / "report.json"), _summary(30.0), _tracks(), 1e7, PARAMS)
+    # outros JSON não são relatórios
+    (reports / "lote" / "touro_01" / "artifacts").mkdir()
+    (reports / "lote" / "touro_01" / "artifacts" / "manifest.json").write_text(json.dumps({"version": 1}))
+    (reports / "quebrado.json").write_text("{")
+
+    assert index.rebuild(str(reports)) == 5
+    by_path = {os.path.relpath(i["report_path"], reports): i["sample"] for i in index.query()["items"]}
+    assert by_path == {
+        os.path.join("3f2a9c", "report.json"): "carneiro_01.mp4",
+        os.path.join("lote", "touro_01", "report.json"): "touro_01",
+        "sample_report.json": "ovelha_07",
+        "antigo.json": "antigo",
+        os.path.join("lote", "bode_02", "report.json"): "bode_02",
+    }
+    # refazer não duplica
+    assert index.rebuild(str(reports)) == 5
+    assert index.count() == 5
+
+
+def test_report_survives_history_failure(tmp_path, caplog):
+    class BrokenIndex:
+        path = "broken.sqlite"
+
+        def record(self, *args, **kwargs):
+            raise sqlite3.OperationalError("database is locked")
+
+    out = str(tmp_path / "report.json")
+    with caplog.at_level(logging.ERROR, logger="src.report"):
+        assert generate_report_json(out, _summary(40.0), _tracks(), 1e7, PARAMS, history=BrokenIndex(),
+                                    sample="a") == out
+    with open(out, encoding="utf-8") as f:
+        assert json.load(f)["sample"] == "a"
+    assert "database is locked" in caplog.text
@@ -0,0 +1,106 @@
+"""
+Pré e pós-processamento do backend ONNX (src/inference.py), só com NumPy/OpenCV:
+um tensor de saída sintético no lugar do modelo, com as caixas voltando pelo letterbox.
+"""
+
+import numpy as np
+import pytest
+
+from src.inference import letterbox_shape, postprocess, preprocess
+
+
+def _frame(h, w, rect):
+    """Frame BGR cinza com um retângulo claro (x1, y1, x2, y2) e canais distintos."""
+    img = np.full((h, w, 3), (10, 20, 30), dtype=np.uint8)
+    x1, y1, x2, y2 = rect
+    img[y1:y2, x1:x2] = (250, 240, 230)
+    return img
+
+
+def _prediction(boxes_in, scores, n_classes=1, n_anchors=50):
+    """Saída do YOLOv8 (4 + n_classes, n_âncoras): caixas [x1, y1, x2, y2] da entrada + score por classe."""
+    pred = np.zeros((4 + n_classes, n_anchors), dtype=np.float32)
+    pred[:4] = [[32], [32], [8], [8]]  # âncoras vazias: score 0
+    for k, ((x1, y1, x2, y2), s) in enumerate(zip(boxes_in, scores)):
+        pred[:4, k] = [(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1]
+        if np.ndim(s) == 0:
+            pred[4, k] = s
+        else:
+            pred[4:, k] = s
+    return pred
+
+
+@pytest.mark.parametrize("h, w", [(500, 900), (900, 500), (120, 160), (640, 640)])
+def test_preprocess_letterbox(h, w):
+    r, (in_h, in_w), (top, left) = letterbox_shape(h, w)
+    new_h, new_w = int(round(h * r)), int(round(w * r))
+    assert max(in_h, in_w) == 640 and in_h % 32 == 0 and in_w % 32 == 0
+    images = [_frame(h, w, (w // 4, h // 4, w // 2, h // 2)), np.zeros((h, w, 3), dtype=np.uint8)]
+    batch, shape = preprocess(images)
+    assert shape == (in_h, in_w)
+    assert batch.shape == (2, 3, in_h, in_w) and batch.dtype == np.float32
+    assert batch.flags["C_CONTIGUOUS"]
+    # BGR -> RGB: o canal 0 da entrada é o R (30 no fundo do frame)
+    np.testing.assert_allclose(batch[0, :, top + 1, left + 1], np.array([30, 20, 10]) / 255.0, atol=1e-6)
+    # faixas do letterbox com o cinza 114 do ultralytics, imagem no meio
+    pad = np.ones((in_h, in_w), dtype=bool)
+    pad[top:top + new_h, left:left + new_w] = False
+    assert np.allclose(batch[:, :, pad], 114 / 255.0)
+    assert not np.allclose(batch[1, :, top:top + new_h, left:left + new_w], 114 / 255.0)
+
+
+@pytest.mark.parametrize("h, w", [(500, 900), (900, 500), (120, 160)])
+def test_boxes_map_back_through_letterbox(h, w):
+    rect = (w // 3, h // 5, w // 3 + w // 10, h // 5 + h // 8)
+    batch, shape = preprocess([_frame(h, w, rect)])
+    # o "modelo" acha o retângulo claro na entrada e devolve a caixa em coordenadas da entrada
+    ys, xs = np.nonzero(batch[0, 0] > 0.5)
+    found = (xs.min(), ys.min(), xs.max() + 1, ys.max() + 1)
+    boxes = postprocess(_prediction([found], [0.9]), 0.25, 0.7, 300, shape, (h, w))
+    assert boxes.shape == (1, 5) and boxes.dtype == np.float32
+    # erro de no máximo ~1 px da entrada (interpolação do resize), em px do frame
+    r = letterbox_shape(h, w)[0]
+    np.testing.assert_allclose(boxes[0, :4], rect, atol=1.0 / r + 0.5)
+    assert boxes[0, 4] == pytest.approx(0.9)
+
+
+def test_postprocess_exact_inverse():
+    h, w = 500, 900
+    r, shape, (top, left) = letterbox_shape(h, w)
+    frame_boxes = np.array([[10, 20, 40, 60], [300, 200, 330, 230], [880, 480, 900, 500]], dtype=np.float32)
+    boxes_in = frame_boxes * r + [left, top, left, top]
+    boxes = postprocess(_prediction(boxes_in, [0.9, 0.8, 0.7]), 0.25, 0.7, 300, shape, (h, w))
+    np.testing.assert_allclose(boxes[:, :4], frame_boxes, atol=1e-3)
+    np.testing.assert_allclose(boxes[:, 4], [0.9, 0.8, 0.7])
+
+
+def test_postprocess_conf_nms_and_clipping():
+    h, w = 500, 900
+    r, shape, (top, left) = letterbox_shape(h, w)
+    boxes_in = [
+        (100, 100, 120, 120),   # mantida
+        (101, 101, 121, 121),   # sobrepõe a anterior com score menor: suprimida
+        (300, 100, 320, 120),   # abaixo de conf
+        (-10, top - 5, 15, top + 20),  # passa da borda do frame: recortada
+    ]
+    pred = _prediction(boxes_in, [0.9, 0.8, 0.1, 0.6])
+    boxes = postprocess(pred, 0.25, 0.5, 300, shape, (h, w))
+    assert len(boxes) == 2
+    np.testing.assert_allclose(boxes[:, 4], [0.9, 0.6])
+    assert boxes[1, 0] == 0 and boxes[1, 1] == 0
+    assert (boxes[:, [0, 2]] <= w).all() and (boxes[:, [1, 3]] <= h).all()
+    # max_det: só as de maior score
+    assert len(postprocess(pred, 0.25, 0.5, 1, shape, (h, w))) == 1
+    # nada acima de conf
+    assert postprocess(pred, 0.95, 0.5, 300, shape, (h, w)).shape == (0, 5)
+
+
+def test_postprocess_nms_per_class():
+    h, w = 500, 900
+    _, shape, _ = letterbox_shape(h, w)
+    same = [(100, 100, 120, 120), (101, 101, 121, 121)]
+    # mesma caixa em classes diferentes: as duas ficam
+    pred = _prediction(same, [[0.9, 0.0], [0.0, 0.8]], n_classes=2)
+    assert len(postprocess(pred, 0.25, 0.5, 300, shape, (h, w))) == 2
+    pred = _prediction(same, [[0.9, 0.0], [0.8, 0.0]], n_classes=2)
+    assert len(postprocess(pred, 0.25, 0.5, 300, shape, (h, w))) == 1
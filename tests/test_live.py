@@ -0,0 +1,60 @@
+"""Registro das sessões ao vivo do servidor (src/live.py, LiveSessionRegistry)."""
+
+import threading
+import time
+
+import pytest
+
+from src import live
+
+
+class FakeSession:
+    def __init__(self, session_id):
+        self.id = session_id
+        self.status = live.STARTING
+
+    def to_dict(self):
+        # leitura lenta: alarga a janela entre a contagem e o registro, se não houver lock
+        time.sleep(0.001)
+        return {"status": self.status}
+
+    def start(self):
+        self.status = live.RUNNING
+        return self
+
+
+def test_limit_and_pruning():
+    sessions = live.LiveSessionRegistry(max_running=1, keep_finished=2)
+    first = sessions.start(FakeSession("a"))
+    assert sessions.get("a") is first and sessions.full()
+    with pytest.raises(live.SessionLimit):
+        sessions.start(FakeSession("b"))
+    assert sessions.get("b") is None
+
+    for i, status in enumerate((live.DONE, live.STOPPED, live.ERROR, live.DONE)):
+        previous = sessions.get("a" if i == 0 else f"s{i - 1}")
+        previous.status = status
+        assert not sessions.full()
+        sessions.start(FakeSession(f"s{i}"))
+    # ficam a sessão em andamento e as 2 encerradas mais recentes
+    assert [k for k in ("a", "s0", "s1", "s2", "s3") if sessions.get(k)] == ["s1", "s2", "s3"]
+
+
+def test_concurrent_starts_respect_limit():
+    sessions = live.LiveSessionRegistry(max_running=2)
+    started, refused = [], []
+    barrier = threading.Barrier(16)
+
+    def request(i):
+        barrier.wait()
+        try:
+            started.append(sessions.start(FakeSession(f"s{i}")))
+        except live.SessionLimit:
+            refused.append(i)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(started) == 2 and len(refused) == 14
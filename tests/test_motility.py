@@ -0,0 +1,81 @@
+"""
+trajectory_metrics (vetorizado, arrays "ragged") contra as funções escalares
+por trilha de motility.py / vigor.py.
+"""
+
+import numpy as np
+import pytest
+
+from src.motility import distance_pixels, linearity, ragged_from_tracks, trajectory_metrics, velocity_um_s
+from src.vigor import vigor_class, vigor_classes, vigor_index
+
+FPS = 25.0
+MICRONS_PER_PIXEL = 0.5
+
+
+def _random_tracks(rng, n_tracks=40):
+    tracks = []
+    for _ in range(n_tracks):
+        n = int(rng.integers(2, 60))
+        # frames crescentes com buracos (frames sem detecção)
+        frames = np.cumsum(rng.integers(1, 4, size=n))
+        xy = np.cumsum(rng.normal(0, 2.0, size=(n, 2)), axis=0) + rng.uniform(0, 500, size=2)
+        tracks.append([(int(f), float(x), float(y)) for f, (x, y) in zip(frames, xy)])
+    return tracks
+
+
+def _legacy(tracks):
+    vel = np.array([velocity_um_s(t, FPS, MICRONS_PER_PIXEL) for t in tracks])
+    lin = np.array([linearity(t) for t in tracks])
+    dist = np.array([distance_pixels(t) for t in tracks])
+    return vel, lin, dist
+
+
+def _assert_matches_legacy(tracks, sorted_tracks=None):
+    points, offsets = ragged_from_tracks(tracks)
+    m = trajectory_metrics(points, offsets, FPS, MICRONS_PER_PIXEL)
+    vel, lin, dist = _legacy(sorted_tracks if sorted_tracks is not None else tracks)
+    np.testing.assert_allclose(m["vcl_um_s"], vel, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(m["linearity"], lin, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(m["distance_px"], dist, rtol=1e-12, atol=1e-12)
+    np.testing.assert_array_equal(m["n_points"], [len(t) for t in tracks])
+    vigor = vigor_index(m["vcl_um_s"], m["linearity"])
+    np.testing.assert_allclose(vigor, vel * lin, rtol=1e-12, atol=1e-12)
+    assert vigor_classes(vigor).tolist() == [vigor_class(v) for v in vel * lin]
+    return m
+
+
+def test_matches_scalar_functions():
+    _assert_matches_legacy(_random_tracks(np.random.default_rng(0)))
+
+
+def test_unsorted_tracks_are_sorted_by_frame():
+    tracks = _random_tracks(np.random.default_rng(1), n_tracks=10)
+    rng = np.random.default_rng(2)
+    shuffled = [[t[i] for i in rng.permutation(len(t))] for t in tracks]
+    # as funções escalares assumem a trilha em ordem de frame; o motor vetorizado ordena
+    _assert_matches_legacy(shuffled, sorted_tracks=tracks)
+
+
+def test_single_point_and_empty_tracks():
+    tracks = [[(3, 10.0, 10.0)], [], [(0, 0.0, 0.0), (2, 3.0, 4.0)], [(5, 1.0, 1.0)]]
+    m = _assert_matches_legacy(tracks)
+    for key in ("vcl_um_s", "vsl_um_s", "vap_um_s", "linearity", "distance_px"):
+        assert m[key][[0, 1, 3]].tolist() == [0.0, 0.0, 0.0]
+    # 5 px em 2 frames a 25 fps
+    assert m["vcl_um_s"][2] == pytest.approx(5 * MICRONS_PER_PIXEL / (2 / FPS))
+    assert m["linearity"][2] == pytest.approx(1.0)
+
+
+def test_repeated_frame_uses_point_count_for_time():
+    # duração zero: as duas implementações usam n_pontos / fps
+    tracks = [[(4, 0.0, 0.0), (4, 3.0, 4.0)]]
+    _assert_matches_legacy(tracks)
+
+
+def test_empty_input():
+    points, offsets = ragged_from_tracks([])
+    assert points.shape == (0, 3) and offsets.tolist() == [0]
+    m = trajectory_metrics(points, offsets, FPS, MICRONS_PER_PIXEL)
+    for values in m.values():
+        assert len(values) == 0
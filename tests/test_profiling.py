@@ -0,0 +1,27 @@
+"""Exposição das métricas no formato do Prometheus (src/profiling.py, MetricsRegistry)."""
+
+from src.profiling import MetricsRegistry
+
+
+def _types(text):
+    return {line.split()[2]: line.split()[3] for line in text.splitlines() if line.startswith("# TYPE")}
+
+
+def test_render_counters_and_gauges():
+    metrics = MetricsRegistry(prefix="t")
+    metrics.inc("analyses_total", help="Análises concluídas")
+    metrics.observe("analysis_seconds", 0.3, buckets=(0.1, 1))
+    text = metrics.render({"jobs_running": 2, "peak_rss_bytes": None},
+                          counters={"result_cache_hits_total": 5, "result_cache_misses_total": 1})
+    assert _types(text) == {"t_analyses_total": "counter", "t_analysis_seconds": "histogram",
+                            "t_result_cache_hits_total": "counter", "t_result_cache_misses_total": "counter",
+                            "t_jobs_running": "gauge"}
+    lines = text.splitlines()
+    assert "# HELP t_analyses_total Análises concluídas" in lines
+    assert "t_analyses_total 1.0" in lines
+    assert "t_result_cache_hits_total 5" in lines
+    assert "t_jobs_running 2" in lines
+    assert 't_analysis_seconds_bucket{le="0.1"} 0' in lines
+    assert 't_analysis_seconds_bucket{le="+Inf"} 1' in lines
+    # valores None ficam de fora
+    assert not any("peak_rss_bytes" in line for line in lines)
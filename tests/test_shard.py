@@ -0,0 +1,101 @@
+"""
+Análise com shards (src/shard.py) contra a pipeline num único processo, num vídeo
+sintético curto com o backend de inferência simulado (sem pesos do YOLO).
+
+Uso (a partir da raiz do repositório): python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+
+from benchmarks.stub_detector import BACKEND as STUB_BACKEND, write_stub_weights
+from benchmarks.synthetic import Scenario, render_video, simulate
+from src.detect import SpermDetector
+from src.pipeline import analyze_track_table, analyze_video
+from src.shard import compare_summaries, plan_shards, stitch_tracks, track_video_sharded
+from src.track import SpermTracker, TrackTable
+
+CALIBRATION = {"fps": 25.0, "microns_per_pixel": 0.5, "drop_volume_ul": 2.0}
+# diferença relativa tolerada em cada métrica do resumo
+TOLERANCE = 0.05
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("shard")
+    scenario = Scenario(n_cells=40, speed=2.0, width=320, height=240, n_frames=120, seed=3)
+    video = render_video(scenario, simulate(scenario), str(workdir / "clip.mp4"))
+    return video, write_stub_weights(str(workdir), seed=scenario.seed)
+
+
+def test_sharded_matches_single_process(clip):
+    video, weights = clip
+    single = analyze_video(SpermDetector(weights=weights, backend=STUB_BACKEND), SpermTracker(backend="centroid"),
+                           video, **CALIBRATION, keep_detections=True)
+
+    table, detections = track_video_sharded(video, 2, overlap=30, workers=2,
+                                            detector_options={"weights": weights, "backend": STUB_BACKEND},
+                                            tracker_options={"backend": "centroid"})
+    sharded = analyze_track_table(table, **CALIBRATION)
+
+    # o backend simulado é determinístico por frame: as detecções costuradas são as mesmas
+    assert np.array_equal(detections, single["detections"])
+    diff = compare_summaries(single["summary"], sharded["summary"])
+    assert diff.keys() == single["summary"].keys()
+    assert max(diff.values()) <= TOLERANCE, diff
+
+
+def _truth(frames):
+    """Trajetórias verdadeiras {nome: (cx, cy)} nos frames dados."""
+    f = frames.astype(np.float64)
+    return {
+        "a": (10 + f, np.full_like(f, 50.0)),
+        # paralela a "a", a 4 px: dentro de max_distance em toda a sobreposição
+        "b": (10 + f, np.full_like(f, 54.0)),
+        # cruza "a" no meio da sobreposição (frame 50)
+        "c": (10 + f, 50 + (f - 50) * 2),
+        # termina antes do corte / começa depois da sobreposição, perto de "a"
+        "d": (200 - f, np.full_like(f, 30.0)),
+        "e": (10 + f, np.full_like(f, 47.0)),
+    }
+
+
+def _shard_table(shard, spans, local_ids, rng):
+    """TrackTable de um shard com ids locais próprios e ruído de detecção."""
+    ids, frames, cx, cy = [], [], [], []
+    for name, (first, last) in spans.items():
+        f = np.arange(max(first, shard[0]), min(last, shard[1]))
+        if len(f) == 0:
+            continue
+        x, y = _truth(f)[name]
+        ids.append(np.full(len(f), local_ids[name]))
+        frames.append(f)
+        cx.append(x + rng.normal(0, 0.3, len(f)))
+        cy.append(y + rng.normal(0, 0.3, len(f)))
+    return TrackTable(np.concatenate(ids), np.concatenate(frames), np.concatenate(cx), np.concatenate(cy)).sorted()
+
+
+def test_stitch_tracks_across_boundary():
+    rng = np.random.default_rng(0)
+    shards = plan_shards(100, 2, 20)
+    assert shards == [(0, 60), (40, 100)]  # sobreposição [40, 60), corte no frame 50
+    spans = {"a": (0, 100), "b": (0, 100), "c": (0, 100), "d": (0, 45), "e": (70, 100)}
+    # ids locais diferentes em cada shard: a costura é pela posição, não pelo id
+    tables = [_shard_table(shards[0], spans, {"a": 1, "b": 2, "c": 3, "d": 4}, rng),
+              _shard_table(shards[1], spans, {"c": 1, "b": 2, "a": 3, "e": 4, "d": 5}, rng)]
+    table = stitch_tracks(tables, shards, overlap=20)
+
+    names = {}
+    for tid in np.unique(table.track_id).tolist():
+        t = table.take(table.track_id == tid)
+        # cada trilha costurada segue uma única trajetória verdadeira, sem frames repetidos
+        matches = [name for name, (x, y) in _truth(t.frame).items()
+                   if np.all(np.hypot(t.cx - x, t.cy - y) < 2.0)]
+        assert len(matches) == 1, (tid, matches)
+        assert len(np.unique(t.frame)) == len(t)
+        names[matches[0]] = t
+    # uma trilha por trajetória verdadeira: as que cruzam a fronteira saem com um único id
+    assert len(np.unique(table.track_id)) == 5
+    assert sorted(names) == ["a", "b", "c", "d", "e"]
+    for name, (first, last) in spans.items():
+        np.testing.assert_array_equal(names[name].frame, np.arange(first, last))
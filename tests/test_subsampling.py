@@ -0,0 +1,52 @@
+"""
+Subamostragem adaptativa (src/motion.py + interpolação do SpermTracker) contra a
+análise de todos os frames, em cenas sintéticas lentas, em que o MotionGate de fato
+pula frames.
+
+Uso (a partir da raiz do repositório): python -m pytest tests
+"""
+
+import pytest
+
+from benchmarks.stub_detector import BACKEND as STUB_BACKEND, write_stub_weights
+from benchmarks.synthetic import Scenario, render_video, simulate
+from src.detect import SpermDetector
+from src.pipeline import PER_FRAME_METRICS, analyze_video
+from src.track import SpermTracker
+
+CALIBRATION = {"fps": 25.0, "microns_per_pixel": 0.5, "drop_volume_ul": 2.0}
+# tolerâncias das métricas que continuam comparáveis com frames pulados
+CONCENTRATION_TOLERANCE = 0.05   # relativa
+TRACKS_TOLERANCE = 0.10          # relativa, nº de trajetórias
+VSL_TOLERANCE_UM_S = 0.5         # absoluta, média da VSL (ruído das pontas da trilha)
+
+
+def _analyze(video, weights, adaptive):
+    detector = SpermDetector(weights=weights, backend=STUB_BACKEND, adaptive=adaptive)
+    result = analyze_video(detector, SpermTracker(backend="centroid"), video, **CALIBRATION)
+    return result, detector.last_gate
+
+
+@pytest.mark.parametrize("speed", [0.05, 0.3])
+def test_adaptive_matches_full_rate(tmp_path, speed):
+    scenario = Scenario(n_cells=30, speed=speed, width=320, height=240, n_frames=150, seed=1)
+    video = render_video(scenario, simulate(scenario), str(tmp_path / "clip.mp4"))
+    weights = write_stub_weights(str(tmp_path), seed=scenario.seed)
+
+    full, _ = _analyze(video, weights, adaptive=False)
+    adaptive, gate = _analyze(video, weights, adaptive=True)
+    # a cena precisa ser lenta o bastante para o gate pular frames
+    assert gate.skipped_total > scenario.n_frames // 4
+
+    rel = abs(adaptive["concentration"] - full["concentration"]) / full["concentration"]
+    assert rel <= CONCENTRATION_TOLERANCE
+    n_full, n_adaptive = full["summary"]["n_trajetorias"], adaptive["summary"]["n_trajetorias"]
+    assert abs(n_adaptive - n_full) / n_full <= TRACKS_TOLERANCE
+    assert abs(adaptive["df"]["vsl_um_s"].mean() - full["df"]["vsl_um_s"].mean()) <= VSL_TOLERANCE_UM_S
+
+    # VCL, VAP e linearidade não são comparáveis: ficam fora do resultado subamostrado
+    assert set(PER_FRAME_METRICS) <= set(full["df"].columns)
+    assert not set(PER_FRAME_METRICS) & set(adaptive["df"].columns)
+    assert adaptive["summary"]["motilidade_progressiva_%"] is None
+    assert adaptive["summary"]["vigor_medio"] is None
+    assert adaptive["velocities"] == []
@@ -0,0 +1,98 @@
+"""Inferência em tiles (src/tiling.py): NMS em grade contra o NMS guloso O(n²) e as emendas entre tiles."""
+
+import numpy as np
+import pytest
+
+from src.tiling import merge_tile_boxes, nms, plan_tiles
+
+
+def _greedy_nms(boxes, iou_threshold):
+    """NMS clássico: percorre as caixas por score decrescente, comparando com todas as mantidas."""
+    kept = []
+    for k in np.argsort(-boxes[:, 4], kind="stable"):
+        x1, y1, x2, y2 = boxes[k, :4]
+        ok = True
+        for m in kept:
+            iw = min(x2, boxes[m, 2]) - max(x1, boxes[m, 0])
+            ih = min(y2, boxes[m, 3]) - max(y1, boxes[m, 1])
+            inter = max(iw, 0.0) * max(ih, 0.0)
+            union = (x2 - x1) * (y2 - y1) + (boxes[m, 2] - boxes[m, 0]) * (boxes[m, 3] - boxes[m, 1]) - inter
+            if inter / max(union, 1e-9) > iou_threshold:
+                ok = False
+                break
+        if ok:
+            kept.append(k)
+    return np.sort(np.array(kept, dtype=np.int64))
+
+
+def _random_boxes(rng, n, extent=200.0):
+    xy = rng.uniform(0, extent, size=(n, 2))
+    wh = rng.uniform(2.0, 30.0, size=(n, 2))
+    return np.column_stack([xy, xy + wh, rng.uniform(0.1, 1.0, n)]).astype(np.float32)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("iou_threshold", [0.3, 0.5, 0.7])
+def test_nms_matches_greedy(seed, iou_threshold):
+    rng = np.random.default_rng(seed)
+    # caixas densas (muitas sobreposições e cadeias de supressão) e de tamanhos variados
+    boxes = _random_boxes(rng, 300)
+    np.testing.assert_array_equal(nms(boxes, iou_threshold), _greedy_nms(boxes, iou_threshold))
+
+
+def test_nms_small_inputs():
+    assert len(nms(np.empty((0, 5), dtype=np.float32))) == 0
+    np.testing.assert_array_equal(nms(np.array([[0, 0, 5, 5, 0.9]], dtype=np.float32)), [0])
+    # caixas idênticas: fica a de maior score
+    same = np.array([[0, 0, 5, 5, 0.5], [0, 0, 5, 5, 0.9]], dtype=np.float32)
+    np.testing.assert_array_equal(nms(same), [1])
+
+
+def test_plan_tiles_covers_frame():
+    tiles = plan_tiles(1000, 600, 640, 64)
+    np.testing.assert_array_equal(tiles, [[0, 0, 640, 600], [360, 0, 1000, 600]])
+    tiles = plan_tiles(1920, 1080, 640, 64)
+    covered = np.zeros((1080, 1920), dtype=bool)
+    for x0, y0, x1, y1 in tiles:
+        assert x1 - x0 == 640 and y1 - y0 == 640
+        covered[y0:y1, x0:x1] = True
+    assert covered.all()
+    # tiles vizinhos se sobrepõem em pelo menos `overlap` px
+    xs, ys = np.unique(tiles[:, 0]), np.unique(tiles[:, 1])
+    assert (np.diff(xs) <= 640 - 64).all() and (np.diff(ys) <= 640 - 64).all()
+    # frame menor que o tile: um tile só, do tamanho do frame
+    np.testing.assert_array_equal(plan_tiles(320, 240, 640, 64), [[0, 0, 320, 240]])
+
+
+def test_merge_drops_boxes_cut_at_interior_edges():
+    tiles = plan_tiles(1000, 600, 640, 64)  # [0, 640) e [360, 1000): emenda interna em x = 640 e x = 360
+    # célula em x 632..642 do frame: cortada na borda direita do tile 0, inteira no tile 1
+    cut_in_left = np.array([[632, 100, 639.5, 110, 0.6]], dtype=np.float32)
+    whole_in_right = np.array([[632 - 360, 100, 642 - 360, 110, 0.8]], dtype=np.float32)
+    merged = merge_tile_boxes([cut_in_left, whole_in_right], tiles, 1000, 600)
+    np.testing.assert_allclose(merged, [[632, 100, 642, 110, 0.8]])
+
+    # célula em x 355..365: cortada na borda esquerda do tile 1, inteira no tile 0
+    whole_in_left = np.array([[355, 200, 365, 210, 0.7]], dtype=np.float32)
+    cut_in_right = np.array([[0.5, 200, 5, 210, 0.9]], dtype=np.float32)
+    merged = merge_tile_boxes([whole_in_left, cut_in_right], tiles, 1000, 600)
+    np.testing.assert_allclose(merged, [[355, 200, 365, 210, 0.7]])
+
+
+def test_merge_keeps_boxes_at_frame_border():
+    tiles = plan_tiles(1000, 600, 640, 64)
+    # encostadas nas bordas do frame (esquerda, topo, base, direita): nada no vizinho, ficam
+    left = np.array([[0, 0, 8, 8, 0.9], [0, 592, 8, 600, 0.9]], dtype=np.float32)
+    right = np.array([[632, 300, 640, 308, 0.9]], dtype=np.float32)  # x 992..1000 no frame
+    merged = merge_tile_boxes([left, right], tiles, 1000, 600)
+    np.testing.assert_allclose(merged, [[0, 0, 8, 8, 0.9], [0, 592, 8, 600, 0.9], [992, 300, 1000, 308, 0.9]])
+
+
+def test_merge_removes_duplicates_in_overlap():
+    tiles = plan_tiles(1000, 600, 640, 64)
+    # célula inteira nos dois tiles (x 400..410 fica na sobreposição 360..640)
+    a = np.array([[400, 50, 410, 60, 0.6]], dtype=np.float32)
+    b = np.array([[400.5 - 360, 50.5, 410.5 - 360, 60.5, 0.9]], dtype=np.float32)
+    merged = merge_tile_boxes([a, b], tiles, 1000, 600)
+    np.testing.assert_allclose(merged, [[400.5, 50.5, 410.5, 60.5, 0.9]])
+    assert merge_tile_boxes([np.empty((0, 5)), np.empty((0, 5))], tiles, 1000, 600).shape == (0, 5)
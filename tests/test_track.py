@@ -0,0 +1,97 @@
+"""
+SpermTracker (modo streaming e run) e TrackTable, com o backend "centroid"
+(determinístico, sem dependências opcionais).
+"""
+
+import numpy as np
+
+from src.track import SpermTracker, TrackTable, frames_from_detections
+
+
+def _boxes(*centers):
+    return np.array([[x - 2, y - 2, x + 2, y + 2, 0.9] for x, y in centers], dtype=np.float64).reshape(-1, 5)
+
+
+def _tracker(**kwargs):
+    return SpermTracker(backend="centroid", **kwargs)
+
+
+def test_empty_frames_age_tracks():
+    # 4 frames vazios depois da última detecção: com max_age=3 a trilha já foi descartada
+    for max_age, same_track in ((3, False), (10, True)):
+        tracker = _tracker(max_age=max_age)
+        frames = [(f, _boxes((50 + f, 50))) for f in range(5)]
+        frames += [(f, _boxes()) for f in range(5, 9)]
+        frames += [(9, _boxes((54, 50)))]
+        table = tracker.run(frames)
+        ids = np.unique(table.track_id)
+        assert len(ids) == (1 if same_track else 2)
+
+
+def test_legacy_flat_list_treats_missing_frames_as_empty():
+    # frames 5..8 ausentes da lista antiga: contam como frames vazios e envelhecem a trilha
+    detections = [[f, 48 + f, 48, 52 + f, 52, 0.9] for f in range(5)] + [[9, 52, 48, 56, 52, 0.9]]
+    assert [f for f, _ in frames_from_detections(detections)] == list(range(10))
+    table = _tracker(max_age=3).run(detections)
+    assert len(np.unique(table.track_id)) == 2
+    table = _tracker(max_age=10).run(detections)
+    assert len(np.unique(table.track_id)) == 1
+    assert table.frame.tolist() == [0, 1, 2, 3, 4, 9]
+
+
+def test_points_only_for_matched_tracks():
+    tracker = _tracker(max_age=5)
+    assert len(tracker.update(0, _boxes((10, 10), (100, 100)))) == 2
+    # a trilha em (100, 100) não é detectada no frame 1: continua viva, mas sem ponto
+    points = tracker.update(1, _boxes((11, 10)))
+    assert len(points) == 1 and points[0][1:] == (11.0, 10.0)
+    tracker.update(2, _boxes((12, 10), (100, 100)))
+    table = tracker.flush()
+    assert len(np.unique(table.track_id)) == 2
+    by_id = table.to_dict()
+    assert [f for f, _, _ in by_id[1]] == [0, 1, 2]
+    assert [f for f, _, _ in by_id[2]] == [0, 2]
+
+
+def test_pop_finished_every_pop_every_frames():
+    tracker = _tracker(max_age=1, pop_every=4)
+    popped = []
+    for f in range(12):
+        # trilha A só nos frames 0..1; trilha B em todos
+        boxes = _boxes((10 + f, 10), (200, 200)) if f < 2 else _boxes((200, 200))
+        tracker.update(f, boxes)
+        popped.append(tracker.pop_finished(f))
+    sizes = [len(t) for t in popped]
+    # A é descartada no frame 3 e liberada no primeiro lote depois disso (frame 3, 4º update)
+    assert sizes == [0, 0, 0, 2, 0, 0, 0, 0, 0, 0, 0, 0]
+    assert popped[3].frame.tolist() == [0, 1]
+    rest = tracker.flush()
+    assert np.unique(rest.track_id).tolist() == [2]
+    assert len(rest) == 12
+    assert len(tracker.flush()) == 0
+
+
+def test_skipped_frames_are_interpolated():
+    tracker = _tracker(max_age=10)
+    tracker.update(0, _boxes((10, 10)))
+    assert tracker.update(1, None) == []
+    tracker.update(2, None)
+    tracker.update(3, _boxes((16, 13)))
+    table = tracker.flush()
+    assert table.frame.tolist() == [0, 1, 2, 3]
+    np.testing.assert_allclose(table.cx, [10, 12, 14, 16])
+    np.testing.assert_allclose(table.cy, [10, 11, 12, 13])
+
+
+def test_track_table_dict_round_trip():
+    tracks = {3: [(0, 1.0, 2.0), (1, 1.5, 2.5)], 1: [(4, 9.0, 9.0)], 7: [(2, 0.0, 0.0), (5, 3.0, 4.0)]}
+    table = TrackTable.from_dict(tracks)
+    assert len(table) == 5
+    out = table.to_dict()
+    assert list(out) == [1, 3, 7]
+    assert out == {k: tracks[k] for k in (1, 3, 7)}
+    again = TrackTable.from_dict(out).sorted()
+    for name in ("track_id", "frame", "cx", "cy"):
+        np.testing.assert_array_equal(getattr(again, name), getattr(table.sorted(), name))
+    assert TrackTable.from_dict({}).to_dict() == {}
+    assert TrackTable.concat([TrackTable.empty(), table]).to_dict() == out